@@ -0,0 +1,103 @@
+"""
+Per-request user loading without a database round trip.
+
+AuthenticationMiddleware resolves request.user through the backend that
+logged the user in, calling its get_user(). With a shared cache
+(settings.SHARED_CACHE) CachedModelBackend answers that from the cache with
+a trimmed record (the fields below; anything else loads on first access like
+any deferred field), so together with the cached_db session engine a warm
+authenticated request reads neither django_session nor auth_user. Without a
+shared cache a logout or role change in one process would go unseen by the
+others, so the user is read from the database as ModelBackend does.
+
+The password hash itself is not cached. The record carries the session auth
+hash derived from it instead, which is all Django needs to check the session,
+so a password change still logs other sessions out.
+
+ModelBackend stays in AUTHENTICATION_BACKENDS after this backend so that
+sessions logged in through it keep resolving. A failed password check here
+raises PermissionDenied, which ends authenticate() there, so a failed login
+runs the password hasher once rather than once per backend.
+
+The record is dropped whenever the user row is saved or deleted (login
+stamps last_login, set_password + save, manage_staff role edits, admin
+edits) and on login/logout. Queryset .update() calls on users bypass this;
+call forget_user() after them.
+"""
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.conf import settings
+from django.contrib.auth.signals import user_logged_in, user_logged_out
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db.models.signals import post_delete, post_save
+
+USER_CACHE_TIMEOUT = 60 * 60
+USER_FIELDS = ("id", "username", "is_active", "is_staff", "is_superuser", "last_login")
+
+
+def _user_key(user_id):
+    return f"auth:user:{user_id}"
+
+
+def forget_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+def _session_auth_hash(user, cached_hash):
+    """get_session_auth_hash() for a user built without its password"""
+    def get_session_auth_hash():
+        # once the password is loaded or set, hash the real one
+        if "password" in user.__dict__:
+            return type(user).get_session_auth_hash(user)
+        return cached_hash
+    return get_session_auth_hash
+
+
+class CachedModelBackend(ModelBackend):
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        user = super().authenticate(request, username=username, password=password, **kwargs)
+        if user is None and password is not None:
+            # final: stops django.contrib.auth.authenticate() before the
+            # ModelBackend listed after this one hashes the password again
+            raise PermissionDenied
+        return user
+
+    def get_user(self, user_id):
+        if not settings.SHARED_CACHE:
+            return super().get_user(user_id)
+        User = get_user_model()
+        # from_db wants the values in model field order
+        fields = [f.attname for f in User._meta.concrete_fields if f.attname in USER_FIELDS]
+        key = _user_key(user_id)
+        cached = cache.get(key)
+        if cached is None:
+            row = User._default_manager.filter(pk=user_id).values_list("password", *fields).first()
+            if row is None:
+                return None
+            password, *values = row
+            session_hash = User(password=password).get_session_auth_hash()
+            cached = (values, session_hash)
+            cache.set(key, cached, USER_CACHE_TIMEOUT)
+        values, session_hash = cached
+        # the other fields come back deferred, so save() only writes these
+        user = User.from_db(User._default_manager.db, fields, values)
+        user.get_session_auth_hash = _session_auth_hash(user, session_hash)
+        return user if self.user_can_authenticate(user) else None
+
+
+def _forget_saved_user(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+def _forget_session_user(sender, user=None, **kwargs):
+    if user is not None:
+        forget_user(user.pk)
+
+
+def connect_signals():
+    User = get_user_model()
+    post_save.connect(_forget_saved_user, sender=User, dispatch_uid="auth-user-cache-save")
+    post_delete.connect(_forget_saved_user, sender=User, dispatch_uid="auth-user-cache-delete")
+    user_logged_in.connect(_forget_session_user, dispatch_uid="auth-user-cache-login")
+    user_logged_out.connect(_forget_session_user, dispatch_uid="auth-user-cache-logout")
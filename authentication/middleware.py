@@ -0,0 +1,32 @@
+from django.http import JsonResponse
+
+from authentication.tokens import InvalidToken, authenticate
+
+
+class BearerTokenMiddleware:
+    """
+    Authenticates requests carrying "Authorization: Bearer <access token>".
+
+    The user is set straight on the request, so the session is never loaded
+    and no cookie is needed. Requests without the header fall through to the
+    session set up by AuthenticationMiddleware; a bad or expired token gets a
+    401 instead of quietly becoming an anonymous request.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.auth_token = None
+        header = request.META.get("HTTP_AUTHORIZATION", "")
+        scheme, _, token = header.partition(" ")
+        if scheme.lower() == "bearer":
+            try:
+                request.user, request.auth_token = authenticate(token.strip())
+            except InvalidToken:
+                return JsonResponse(
+                    {"status": False, "message": "Invalid or expired token."},
+                    status=401,
+                    headers={"WWW-Authenticate": 'Bearer error="invalid_token"'},
+                )
+        return self.get_response(request)
@@ -1,3 +1,168 @@
-from django.test import TestCase
+import io
+import logging
+from unittest.mock import patch
+
+from django.contrib.auth.hashers import check_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from authentication import tokens
+from velp.cache import tiered
+
+
+class QuietRequestLogTestCase(TestCase):
+    """
+    Logins hash a password and run over REQUEST_TIME_BUDGET_MS; keep the
+    over-budget lines velp.requests writes for them out of the test output.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        logger = logging.getLogger("velp.requests")
+        cls.addClassCleanup(logger.setLevel, logger.level)
+        logger.setLevel(logging.CRITICAL)
+
+
+@override_settings(SHARED_CACHE=True, SESSION_ENGINE="django.contrib.sessions.backends.cached_db")
+class CachedRequestUserTests(QuietRequestLogTestCase):
+    def setUp(self):
+        cache.clear()
+        tiered.clear()
+        self.user = User.objects.create_user(username="budi", password="pw")
+        self.client.post(reverse("authentication:login"), {"username": "budi", "password": "pw"})
+        self.url = reverse("reports:options")
+        self.user_key = f"auth:user:{self.user.pk}"
+
+    def session_key(self):
+        return f"django.contrib.sessions.cached_db{self.client.session.session_key}"
+
+    def test_warm_request_reads_neither_session_nor_user(self):
+        self.client.get(self.url)
+        cache.delete(self.session_key())
+        cache.delete(self.user_key)
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_manage_staff_is_seen_on_the_next_request(self):
+        queue = reverse("reports:mod_list")
+        self.assertEqual(self.client.get(queue).status_code, 403)
+        call_command("manage_staff", "budi", stdout=io.StringIO())
+        self.assertEqual(self.client.get(queue).status_code, 200)
+
+    def test_password_hash_is_not_cached(self):
+        self.client.get(self.url)
+        self.user.refresh_from_db()
+        self.assertNotIn(self.user.password, repr(cache.get(self.user_key)))
+
+    def test_password_change_drops_cached_user_and_session(self):
+        self.client.get(self.url)
+        session_key = self.session_key()
+        self.assertIsNotNone(cache.get(session_key))
+        self.user.set_password("new")
+        self.user.save()
+        self.assertIsNone(cache.get(self.user_key))
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+        self.assertIsNone(cache.get(session_key))
+
+    def test_logout_drops_cached_user_and_session(self):
+        self.client.get(self.url)
+        session_key = self.session_key()
+        self.assertIsNotNone(cache.get(session_key))
+        self.assertIsNotNone(cache.get(self.user_key))
+        self.client.post(reverse("authentication:logout"))
+        self.assertIsNone(cache.get(session_key))
+        self.assertIsNone(cache.get(self.user_key))
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+    def test_sessions_from_model_backend_still_resolve(self):
+        client = self.client_class()
+        client.force_login(self.user, backend="django.contrib.auth.backends.ModelBackend")
+        self.assertEqual(client.get(self.url).status_code, 200)
+
+    def test_failed_login_hashes_the_password_once(self):
+        with patch("django.contrib.auth.base_user.check_password", wraps=check_password) as check:
+            resp = self.client_class().post(reverse("authentication:login"), {"username": "budi", "password": "no"})
+        self.assertEqual(resp.status_code, 401)
+        self.assertEqual(check.call_count, 1)
+
+    @override_settings(SHARED_CACHE=False)
+    def test_no_user_cache_without_shared_cache(self):
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertIsNone(cache.get(self.user_key))
+
+
+@override_settings(SHARED_CACHE=True)
+class BearerTokenTests(QuietRequestLogTestCase):
+    def setUp(self):
+        cache.clear()
+        tiered.clear()
+        self.user = User.objects.create_user(username="sari", password="pw")
+        self.url = reverse("reports:options")
+
+    def obtain(self):
+        resp = self.client.post(reverse("authentication:token"), {"username": "sari", "password": "pw"})
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def get(self, access):
+        return self.client.get(self.url, HTTP_AUTHORIZATION=f"Bearer {access}")
+
+    def test_token_authenticates_without_session_or_queries(self):
+        access = self.obtain()["access"]
+        self.assertNotIn("sessionid", self.client.cookies)
+        self.assertEqual(self.get(access).status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get(access).status_code, 200)
+
+    def test_bad_and_expired_tokens_are_rejected(self):
+        self.assertEqual(self.get("nonsense").status_code, 401)
+        access = self.obtain()["access"]
+        with override_settings(AUTH_TOKEN_ACCESS_TTL=-1):
+            self.assertEqual(self.get(access).status_code, 401)
+        refresh = self.obtain()["refresh"]
+        self.assertEqual(self.get(refresh).status_code, 401)
+
+    def test_refresh_rotates(self):
+        refresh = self.obtain()["refresh"]
+        url = reverse("authentication:token_refresh")
+        resp = self.client.post(url, {"refresh": refresh})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.get(resp.json()["access"]).status_code, 200)
+        self.assertEqual(self.client.post(url, {"refresh": refresh}).status_code, 401)
+
+    def test_concurrent_refresh_gets_one_pair(self):
+        refresh = self.obtain()["refresh"]
+        url = reverse("authentication:token_refresh")
+        read = tokens.read
+
+        def read_then_race(token, kind):
+            # another request claims the token after this one has read it
+            payload = read(token, kind)
+            self.assertTrue(tokens.claim(payload))
+            return payload
+
+        with patch("authentication.tokens.read", side_effect=read_then_race):
+            self.assertEqual(self.client.post(url, {"refresh": refresh}).status_code, 401)
+
+    def test_revoke_and_password_change(self):
+        pair = self.obtain()
+        resp = self.client.post(
+            reverse("authentication:token_revoke"), {"refresh": pair["refresh"]},
+            HTTP_AUTHORIZATION=f"Bearer {pair['access']}",
+        )
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.get(pair["access"]).status_code, 401)
+        resp = self.client.post(reverse("authentication:token_refresh"), {"refresh": pair["refresh"]})
+        self.assertEqual(resp.status_code, 401)
+
+        access = self.obtain()["access"]
+        self.user.set_password("new")
+        self.user.save()
+        self.assertEqual(self.get(access).status_code, 401)
 
-# Create your tests here.
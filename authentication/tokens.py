@@ -0,0 +1,99 @@
+"""
+Signed bearer tokens for the Flutter client.
+
+A token is a django.core.signing payload (HMAC with SECRET_KEY, timestamped)
+holding the user id, the token type, a random id and a prefix of the user's
+session auth hash. Checking one costs no database query: the signature and
+age are checked locally, the revocation list is a cache lookup, and the
+user comes from CachedModelBackend's cache (with settings.SHARED_CACHE). Changing the password changes the hash,
+so it ends every token issued before it, like it ends sessions.
+
+Access tokens are short-lived and sent as "Authorization: Bearer <token>".
+Refresh tokens live longer, are only accepted by the refresh endpoint, and
+are rotated there: each one can be used once. The refresh claims it with an
+atomic cache.add(), so of two concurrent refreshes with the same token only
+one gets a new pair. Revocations are only seen by every worker through the
+shared cache, which production requires (settings.SHARED_CACHE).
+"""
+import secrets
+import time
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+from authentication.backends import CachedModelBackend
+
+ACCESS, REFRESH = "access", "refresh"
+SALT = "authentication.tokens"
+# enough of the session auth hash to notice a password change
+HASH_PREFIX = 16
+
+
+class InvalidToken(Exception):
+    pass
+
+
+def _lifetime(kind):
+    return settings.AUTH_TOKEN_ACCESS_TTL if kind == ACCESS else settings.AUTH_TOKEN_REFRESH_TTL
+
+
+def _revoked_key(jti):
+    return f"auth:revoked:{jti}"
+
+
+def issue(user, kind=ACCESS):
+    payload = {
+        "uid": user.pk,
+        "typ": kind,
+        "jti": secrets.token_urlsafe(12),
+        "iat": int(time.time()),
+        "ph": user.get_session_auth_hash()[:HASH_PREFIX],
+    }
+    return signing.dumps(payload, salt=SALT, compress=True)
+
+
+def issue_pair(user):
+    """The response body of the token and refresh endpoints"""
+    return {
+        "access": issue(user, ACCESS),
+        "refresh": issue(user, REFRESH),
+        "expires_in": settings.AUTH_TOKEN_ACCESS_TTL,
+    }
+
+
+def read(token, kind=ACCESS):
+    """The payload of a valid, unexpired, unrevoked ``kind`` token; raises InvalidToken otherwise"""
+    try:
+        payload = signing.loads(token, salt=SALT, max_age=_lifetime(kind))
+    except signing.BadSignature:  # SignatureExpired included
+        raise InvalidToken
+    if payload.get("typ") != kind or cache.get(_revoked_key(payload["jti"])):
+        raise InvalidToken
+    return payload
+
+
+def authenticate(token, kind=ACCESS):
+    """The active user ``token`` was issued to, with the payload; raises InvalidToken"""
+    payload = read(token, kind)
+    user = CachedModelBackend().get_user(payload["uid"])
+    if user is None or user.get_session_auth_hash()[:HASH_PREFIX] != payload["ph"]:
+        raise InvalidToken
+    user.backend = "authentication.backends.CachedModelBackend"
+    return user, payload
+
+
+def _remaining(payload):
+    return payload["iat"] + _lifetime(payload["typ"]) - int(time.time())
+
+
+def revoke(payload):
+    """Reject this token from now until it would have expired anyway"""
+    remaining = _remaining(payload)
+    if remaining > 0:
+        cache.set(_revoked_key(payload["jti"]), True, remaining + 1)
+
+
+def claim(payload):
+    """Revoke a single-use token; False if it was revoked (used) already"""
+    return cache.add(_revoked_key(payload["jti"]), True, max(_remaining(payload), 0) + 1)
@@ -1,10 +1,13 @@
 from django.urls import path
-from authentication.views import login, register, logout
+from authentication.views import login, register, logout, token, token_refresh, token_revoke
 
 app_name = 'authentication'
 
 urlpatterns = [
     path('login/', login, name='login'),
     path('register/', register, name='register'),
-    path('logout/', logout, name='logout')
+    path('logout/', logout, name='logout'),
+    path('token/', token, name='token'),
+    path('token/refresh/', token_refresh, name='token_refresh'),
+    path('token/revoke/', token_revoke, name='token_revoke'),
 ]
\ No newline at end of file
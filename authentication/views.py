@@ -7,6 +7,9 @@ from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth import logout as auth_logout
 from django.views.decorators.csrf import csrf_exempt
 from django.http import JsonResponse
+from django.views.decorators.http import require_POST
+
+from authentication import tokens
 
 
 @csrf_exempt
@@ -90,4 +93,59 @@ def logout(request):
         return JsonResponse({
             "status": False,
             "message": "Logout failed."
-        }, status=401)
\ No newline at end of file
+        }, status=401)
+
+
+@csrf_exempt
+@require_POST
+def token(request):
+    """Exchange username and password for an access/refresh token pair; no session is created"""
+    user = authenticate(username=request.POST.get('username'), password=request.POST.get('password'))
+    if user is None or not user.is_active:
+        return JsonResponse({
+            "status": False,
+            "message": "Login failed, please check your username or password."
+        }, status=401)
+    return JsonResponse({
+        "username": user.username,
+        "status": True,
+        "is_superuser": user.is_superuser,
+        **tokens.issue_pair(user),
+    }, status=200)
+
+
+@csrf_exempt
+@require_POST
+def token_refresh(request):
+    """Trade a refresh token for a new pair; the old refresh token stops working"""
+    try:
+        user, payload = tokens.authenticate(request.POST.get('refresh', ''), tokens.REFRESH)
+        # a concurrent refresh with the same token may have claimed it since
+        if not tokens.claim(payload):
+            raise tokens.InvalidToken
+    except tokens.InvalidToken:
+        return JsonResponse({
+            "status": False,
+            "message": "Invalid or expired refresh token."
+        }, status=401)
+    return JsonResponse({"status": True, **tokens.issue_pair(user)}, status=200)
+
+
+@csrf_exempt
+@require_POST
+def token_revoke(request):
+    """Token logout: revoke the bearer access token and, if posted, its refresh token"""
+    if request.auth_token is None:
+        return JsonResponse({
+            "status": False,
+            "message": "No bearer token."
+        }, status=401)
+    tokens.revoke(request.auth_token)
+    try:
+        tokens.revoke(tokens.read(request.POST.get('refresh', ''), tokens.REFRESH))
+    except tokens.InvalidToken:
+        pass
+    return JsonResponse({
+        "status": True,
+        "message": "Token revoked."
+    }, status=200)
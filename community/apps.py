@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class CommunityConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'community'
+
+    def ready(self):
+        from velp.cache import invalidate_on
+        # memberships, posts and comments move the group counters through UPDATEs
+        invalidate_on(self.get_model('Group'), 'community-group')
+        invalidate_on(self.get_model('Post'), 'community-group')
+        invalidate_on(self.get_model('Comment'), 'community-group')
+        invalidate_on(self.get_model('Membership'), 'community-group')
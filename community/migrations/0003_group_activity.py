@@ -0,0 +1,65 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:14
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, DateTimeField, IntegerField, Max, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+
+def backfill_activity(apps, schema_editor):
+    Group = apps.get_model('community', 'Group')
+    Membership = apps.get_model('community', 'Membership')
+    Post = apps.get_model('community', 'Post')
+    Comment = apps.get_model('community', 'Comment')
+
+    def aggregate(model, path, value, output_field):
+        rows = model.objects.filter(**{path: OuterRef('pk')}).order_by().values(path)
+        return Subquery(rows.annotate(v=value).values('v'), output_field=output_field)
+
+    last_post = aggregate(Post, 'group', Max('created_at'), DateTimeField())
+    last_comment = aggregate(Comment, 'post__group', Max('created_at'), DateTimeField())
+    Group.objects.update(
+        member_count=Coalesce(aggregate(Membership, 'group', Count('*'), IntegerField()), 0),
+        post_count=Coalesce(aggregate(Post, 'group', Count('*'), IntegerField()), 0),
+        # Greatest() is NULL on SQLite as soon as one side is, so coalesce each
+        # side first; groups with neither were last active when created
+        last_activity_at=Coalesce(
+            Greatest(Coalesce(last_post, last_comment), Coalesce(last_comment, last_post)), F('created_at'),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('community', '0002_post_comment_page_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='group',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='member_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='group',
+            name='post_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['last_activity_at', 'id'], name='community_group_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(fields=['member_count', 'id'], name='community_group_size_idx'),
+        ),
+        migrations.RunPython(backfill_activity, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,16 @@
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import F, QuerySet
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.utils.text import slugify
 from django.utils import timezone
 from django.conf import settings
 
 User = settings.AUTH_USER_MODEL
 
+MEMBERSHIP_CACHE_TIMEOUT = 15 * 60
+
 
 class Group(models.Model):
     name = models.CharField(max_length=100, unique=True)
@@ -21,11 +27,39 @@ class Group(models.Model):
     description = models.TextField(blank=True)
     created_at = models.DateTimeField(default=timezone.now, editable=False)
 
+    # denormalized activity, moved by Membership/Post/Comment saves and deletes
+    member_count = models.PositiveIntegerField(default=0, editable=False)
+    post_count = models.PositiveIntegerField(default=0, editable=False)
+    # starts at creation so the "active" sort never meets a NULL
+    last_activity_at = models.DateTimeField(default=timezone.now, editable=False)
+    ACTIVITY_FIELDS = ('member_count', 'post_count', 'last_activity_at')
+
+    class Meta:
+        indexes = [
+            # "most active" and "largest" listings
+            models.Index(fields=['last_activity_at', 'id'], name='community_group_active_idx'),
+            models.Index(fields=['member_count', 'id'], name='community_group_size_idx'),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.slug:
             self.slug = slugify(self.name)
+        # an edit must not write back activity that bump() has moved since it was read
+        if kwargs.get('update_fields') is None and not self._state.adding and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.ACTIVITY_FIELDS
+            ]
         super().save(*args, **kwargs)
 
+    @staticmethod
+    def bump(group_id, active_at=None, **deltas):
+        """Add ``deltas`` to counter fields (and stamp activity) in one UPDATE"""
+        changes = {field: F(field) + delta for field, delta in deltas.items()}
+        if active_at is not None:
+            changes['last_activity_at'] = active_at
+        Group.objects.filter(pk=group_id).update(**changes)
+
   #Difrrentiate owner and member
     def is_owner(self, user):
         return bool(self.owner_id and user and user.is_authenticated and user.id == self.owner_id)
@@ -35,7 +69,7 @@ class Group(models.Model):
             return False
         if self.is_owner(user):
             return True
-        return self.memberships.filter(user=user).exists()
+        return self.pk in member_group_ids(user)
 
     def __str__(self):
         return self.name
@@ -53,6 +87,49 @@ class Membership(models.Model):
     def __str__(self):
         return f"{self.user} in {self.group}"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            adding = self._state.adding
+            super().save(*args, **kwargs)
+            if adding:
+                Group.bump(self.group_id, member_count=1)
+
+
+def _member_groups_key(user_id):
+    return f"community:member-groups:{user_id}"
+
+
+def member_group_ids(user):
+    """
+    Ids of the groups ``user`` has joined. Kept on the user object for the rest
+    of the request and, with a shared cache (settings.SHARED_CACHE), in the
+    cache across requests; the receivers below drop the cached set whenever
+    one of the user's memberships is added or removed. A per-process cache
+    would miss drops made by other processes, so without one the set is read
+    from the database on every request.
+    """
+    if not user or not user.is_authenticated:
+        return frozenset()
+    ids = getattr(user, "_member_group_ids", None)
+    if ids is None:
+        key = _member_groups_key(user.pk)
+        ids = cache.get(key) if settings.SHARED_CACHE else None
+        if ids is None:
+            ids = frozenset(Membership.objects.filter(user_id=user.pk).values_list("group_id", flat=True))
+            if settings.SHARED_CACHE:
+                cache.set(key, ids, MEMBERSHIP_CACHE_TIMEOUT)
+        user._member_group_ids = ids
+    return ids
+
+
+@receiver(post_save, sender=Membership)
+@receiver(post_delete, sender=Membership)
+def forget_member_groups(sender, instance, **kwargs):
+    # join/leave (web and API) and group deletes all land here
+    cache.delete(_member_groups_key(instance.user_id))
+    if Membership.user.is_cached(instance):
+        instance.user.__dict__.pop("_member_group_ids", None)
+
 
 class Post(models.Model):
     group = models.ForeignKey(Group, on_delete=models.CASCADE, related_name='posts')
@@ -64,6 +141,17 @@ class Post(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # keyset pages of a group's posts, newest first
+            models.Index(fields=['group', 'created_at', 'id'], name='community_post_page_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            adding = self._state.adding
+            super().save(*args, **kwargs)
+            if adding:
+                Group.bump(self.group_id, active_at=self.created_at, post_count=1)
 
     def can_delete(self, user):
         if not user or not getattr(user, "is_authenticated", False):
@@ -81,11 +169,40 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # latest comments per post and keyset pages of a post's comments
+            models.Index(fields=['post', 'created_at', 'id'], name='community_comment_page_idx'),
+        ]
 
     def __str__(self):
         return f'Comment by {self.author} on Post#{self.post_id}'
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            adding = self._state.adding
+            super().save(*args, **kwargs)
+            if adding:
+                group_id = Post.objects.filter(pk=self.post_id).values('group_id')[:1]
+                Group.bump(group_id, active_at=self.created_at)
     # Determine if a user can delete this comment/ Owner of post or author of comment
     def can_delete(self, user):
         if not user or not user.is_authenticated:
             return False
         return user.id == self.author_id or user.id == self.post.group.owner_id
+
+
+def _deleting_groups(origin):
+    # rows cascading from a group delete don't need to touch the dying group
+    return isinstance(origin, Group) or (isinstance(origin, QuerySet) and origin.model is Group)
+
+
+@receiver(post_delete, sender=Membership)
+def remove_member_from_group(sender, instance, origin=None, **kwargs):
+    if not _deleting_groups(origin):
+        Group.bump(instance.group_id, member_count=-1)
+
+
+@receiver(post_delete, sender=Post)
+def remove_post_from_group(sender, instance, origin=None, **kwargs):
+    if not _deleting_groups(origin):
+        Group.bump(instance.group_id, post_count=-1)
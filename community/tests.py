@@ -1,3 +1,227 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .models import Comment, Group, Membership, Post, member_group_ids
+from velp.cache import tiered
+
+from .views import LATEST_COMMENTS, _with_joined
+
+
+class GroupDetailPagingTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="owner", password="pw")
+        self.group = Group.objects.create(name="Futsal Depok", owner=self.owner)
+
+    def make_posts(self, n, comments=0):
+        posts = []
+        for i in range(n):
+            post = Post.objects.create(group=self.group, author=self.owner, headline=f"post {i}", content="...")
+            for j in range(comments):
+                Comment.objects.create(post=post, author=self.owner, content=f"comment {j}")
+            posts.append(post)
+        return posts
+
+    def get(self, name, *args, **params):
+        resp = self.client.get(reverse(f"community:{name}", args=[self.group.slug, *args]), params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_group_detail_pages_posts_with_latest_comments(self):
+        self.make_posts(5, comments=LATEST_COMMENTS + 2)
+
+        first = self.get("api_group_detail", size=3)
+        self.assertEqual([p["headline"] for p in first["posts"]], ["post 4", "post 3", "post 2"])
+        second = self.get("api_group_detail", size=3, cursor=first["next"])
+        self.assertEqual([p["headline"] for p in second["posts"]], ["post 1", "post 0"])
+        self.assertIsNone(second["next"])
+
+        post = first["posts"][0]
+        self.assertEqual(post["comment_count"], LATEST_COMMENTS + 2)
+        self.assertEqual([c["content"] for c in post["comments"]], ["comment 2", "comment 3", "comment 4"])
+
+        older = self.get("api_post_comments", post["id"], cursor=post["comments_next"])
+        self.assertEqual([c["content"] for c in older["comments"]], ["comment 1", "comment 0"])
+        self.assertIsNone(older["next"])
+
+    def test_post_detail_keeps_every_comment(self):
+        [post] = self.make_posts(1, comments=LATEST_COMMENTS + 2)
+        detail = self.get("api_post_detail", post.pk)["post"]
+        self.assertEqual(detail["comment_count"], LATEST_COMMENTS + 2)
+        self.assertEqual([c["content"] for c in detail["comments"]],
+                         [c.content for c in post.comments.all()])
+
+    def test_group_detail_query_count_is_flat(self):
+        self.make_posts(2, comments=1)
+        with CaptureQueriesContext(connection) as small:
+            self.get("api_group_detail")
+        self.make_posts(10, comments=8)
+        with CaptureQueriesContext(connection) as large:
+            self.get("api_group_detail")
+        self.assertEqual(len(small), len(large))
+
+    def test_html_pages(self):
+        [post] = self.make_posts(1, comments=25)
+        self.make_posts(14)
+
+        resp = self.client.get(reverse("community:group_detail", args=[self.group.slug]))
+        self.assertContains(resp, "15 posts")
+        self.assertIsNotNone(resp.context["next_cursor"])
+
+        resp = self.client.get(reverse("community:post_detail", args=[self.group.slug, post.pk]))
+        self.assertEqual(resp.context["comments"][-1].content, "comment 24")
+        self.assertEqual(len(resp.context["comments"]), 20)
+        resp = self.client.get(
+            reverse("community:post_detail", args=[self.group.slug, post.pk]),
+            {"cursor": resp.context["older_cursor"]},
+        )
+        self.assertEqual([c.content for c in resp.context["comments"]], [f"comment {i}" for i in range(5)])
+
+
+@override_settings(SHARED_CACHE=True)
+class MembershipCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(username="captain", password="pw")
+        self.user = User.objects.create_user(username="striker", password="pw")
+        self.groups = [Group.objects.create(name=f"Group {i}", owner=self.owner) for i in range(3)]
+        Membership.objects.create(group=self.groups[0], user=self.user)
+        self.client.force_login(self.user)
+
+    def fresh_user(self):
+        # a new object per "request", like request.user
+        return User.objects.get(pk=self.user.pk)
+
+    def test_membership_is_read_once_per_request_and_cached_across(self):
+        user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertEqual([g.is_member(user) for g in self.groups], [True, False, False])
+            self.assertTrue(self.groups[0].is_member(user))
+        next_request_user = self.fresh_user()
+        with self.assertNumQueries(0):
+            self.assertTrue(self.groups[0].is_member(next_request_user))
+
+    def test_join_leave_and_delete_invalidate(self):
+        self.assertFalse(self.groups[1].is_member(self.fresh_user()))
+
+        self.client.post(reverse("community:api_join_group", args=[self.groups[1].slug]))
+        self.assertTrue(self.groups[1].is_member(self.fresh_user()))
+
+        self.client.get(reverse("community:leave_group", args=[self.groups[0].slug]))
+        self.assertFalse(self.groups[0].is_member(self.fresh_user()))
+
+        self.groups[1].delete()
+        self.assertEqual(member_group_ids(self.fresh_user()), frozenset())
+
+    def test_access_follows_join_and_leave_at_once(self):
+        def is_member(slug):
+            return self.client.get(reverse("community:group_detail", args=[slug])).context["is_member"]
+
+        for shared in (True, False):
+            with self.subTest(shared=shared), override_settings(SHARED_CACHE=shared):
+                slug = self.groups[2].slug
+                self.assertFalse(is_member(slug))
+                self.client.post(reverse("community:api_join_group", args=[slug]))
+                self.assertTrue(is_member(slug))
+                self.client.post(reverse("community:api_leave_group", args=[slug]))
+                self.assertFalse(is_member(slug))
+
+    @override_settings(SHARED_CACHE=False)
+    def test_not_cached_without_shared_cache(self):
+        member_group_ids(self.fresh_user())
+        next_request_user = self.fresh_user()
+        with self.assertNumQueries(1):
+            self.assertTrue(self.groups[0].is_member(next_request_user))
+
+    def test_group_list_annotates_joined_in_one_query(self):
+        with CaptureQueriesContext(connection) as ctx:
+            groups = list(_with_joined(Group.objects.order_by("name"), self.user))
+        self.assertEqual(len(ctx), 1)
+        self.assertEqual([g.joined for g in groups], [True, False, False])
+
+        resp = self.client.get(reverse("community:api_group_list"))
+        self.assertEqual([g["joined"] for g in resp.json()["groups"]], [True, False, False])
+
+
+class GroupActivityTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="host", password="pw")
+        self.fans = [User.objects.create_user(username=f"fan{i}", password="pw") for i in range(3)]
+        self.quiet = Group.objects.create(name="Quiet", owner=self.owner)
+        self.busy = Group.objects.create(name="Busy", owner=self.owner)
+
+    def test_counters_follow_views(self):
+        for fan in self.fans:
+            self.client.force_login(fan)
+            self.client.post(reverse("community:api_join_group", args=[self.busy.slug]))
+        self.client.post(reverse("community:api_join_group", args=[self.busy.slug]))
+        resp = self.client.post(
+            reverse("community:api_create_post", args=[self.busy.slug]), {"headline": "Main?", "content": "Sabtu"}
+        )
+        post_id = resp.json()["post"]["id"]
+        self.client.get(reverse("community:leave_group", args=[self.busy.slug]))
+
+        self.busy.refresh_from_db()
+        self.assertEqual((self.busy.member_count, self.busy.post_count), (2, 1))
+        self.assertIsNotNone(self.busy.last_activity_at)
+
+        self.client.force_login(self.owner)
+        self.client.post(reverse("community:api_delete_post", args=[self.busy.slug, post_id]))
+        self.busy.refresh_from_db()
+        self.assertEqual(self.busy.post_count, 0)
+
+    def test_listings_order_by_maintained_columns(self):
+        Membership.objects.create(group=self.busy, user=self.fans[0])
+        Membership.objects.create(group=self.busy, user=self.fans[1])
+        Membership.objects.create(group=self.quiet, user=self.fans[2])
+        post = Post.objects.create(group=self.quiet, author=self.fans[2], content="first")
+        Comment.objects.create(post=post, author=self.fans[2], content="bump")
+
+        def names(sort):
+            resp = self.client.get(reverse("community:api_group_list"), {"sort": sort})
+            return [g["name"] for g in resp.json()["groups"]]
+
+        self.assertEqual(names("largest"), ["Busy", "Quiet"])
+        self.assertEqual(names("active"), ["Quiet", "Busy"])
+        self.assertEqual(names("name"), ["Busy", "Quiet"])
+
+    def test_group_edit_keeps_activity(self):
+        stale = Group.objects.get(pk=self.busy.pk)
+        Membership.objects.create(group=self.busy, user=self.fans[0])
+        Post.objects.create(group=self.busy, author=self.fans[0], content="hi")
+        stale.description = "edited"
+        stale.save()
+        self.busy.refresh_from_db()
+        self.assertEqual((self.busy.member_count, self.busy.post_count, self.busy.description), (1, 1, "edited"))
+
+
+class GroupListCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tiered.clear()
+        self.owner = User.objects.create_user(username="host", password="pw")
+        self.fan = User.objects.create_user(username="fan", password="pw")
+        self.group = Group.objects.create(name="Futsal", owner=self.owner)
+
+    def test_page_shared_but_joined_per_user(self):
+        url = reverse("community:api_group_list")
+        self.client.force_login(self.owner)
+        self.assertTrue(self.client.get(url).json()["groups"][0]["joined"])
+
+        self.client.force_login(self.fan)
+        before = tiered.stats()
+        resp = self.client.get(url)
+        self.assertFalse(resp.json()["groups"][0]["joined"])
+        self.assertEqual(tiered.stats()["local_hits"], before["local_hits"] + 1)
+
+    def test_writes_invalidate_the_page(self):
+        url = reverse("community:api_group_list")
+        self.client.get(url)
+        Membership.objects.create(group=self.group, user=self.fan)
+        self.assertEqual(self.client.get(url).json()["groups"][0]["member_count"], 1)
+        Group.objects.create(name="Basket", owner=self.owner)
+        self.assertEqual(len(self.client.get(url).json()["groups"]), 2)
 
-# Create your tests here.
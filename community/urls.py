@@ -31,6 +31,7 @@ urlpatterns = [
     path("api/groups/<slug:slug>/posts/create/", views.api_create_post, name="api_create_post"),
     path("api/groups/<slug:slug>/posts/<int:pk>/", views.api_post_detail, name="api_post_detail"),
     path("api/groups/<slug:slug>/posts/<int:pk>/delete/", views.api_delete_post, name="api_delete_post"),
+    path("api/groups/<slug:slug>/posts/<int:pk>/comments/", views.api_post_comments, name="api_post_comments"),
     path("api/groups/<slug:slug>/posts/<int:pk>/comments/create/", views.api_create_comment, name="api_create_comment"),
     path("api/groups/<slug:slug>/posts/<int:pk>/comments/<int:cpk>/delete/", views.api_delete_comment, name="api_delete_comment"),
 
@@ -5,16 +5,37 @@ from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
 from django.urls import reverse
 
+from django.db.models import BooleanField, Count, Exists, IntegerField, OuterRef, Prefetch, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.http import HttpResponseForbidden, JsonResponse
 from django.template.loader import render_to_string
 
 from django.views.decorators.http import require_GET, require_POST
 
-from .models import Group, Post, Comment, Membership
+from velp.cache import tiered
+from velp.pagination import keyset_page, encode_cursor
+
+from .models import Group, Post, Comment, Membership, member_group_ids
 from .forms import PostForm, GroupForm, CommentForm
 
 User = get_user_model()
 
+# posts and comments are both paged newest first
+PAGE_KEYS = [("created_at", True), ("id", True)]
+POST_PAGE_SIZE = 12
+COMMENT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 50
+# comments shown inline under each post of a group page
+LATEST_COMMENTS = 3
+
+# group listings, each served by an index on (sort key, id)
+GROUP_SORTS = {
+    "name": [("name", False), ("id", False)],
+    "active": [("last_activity_at", True), ("id", True)],
+    "largest": [("member_count", True), ("id", True)],
+}
+GROUP_PAGE_SIZE = 20
+
 
 
 def is_ajax(request):
@@ -37,22 +58,72 @@ def api_login_required(view_func):
     return _wrapped
 
 
+def _page_size(request, default):
+    """?size= clamped to 1..MAX_PAGE_SIZE; raises ValueError when not a number"""
+    return min(max(int(request.GET.get("size", default)), 1), MAX_PAGE_SIZE)
+
+
+def _comment_count():
+    comments = Comment.objects.filter(post=OuterRef("pk")).order_by().values("post")
+    return Coalesce(Subquery(comments.annotate(n=Count("*")).values("n"), output_field=IntegerField()), 0)
+
+
+def _with_joined(groups, user):
+    """Annotate ``joined`` (member or owner) on every group in the same query"""
+    if not user.is_authenticated:
+        return groups.annotate(joined=Value(False, output_field=BooleanField()))
+    member = Exists(Membership.objects.filter(group=OuterRef("pk"), user=user))
+    return groups.annotate(joined=member | Q(owner=user))
+
+
+def _group_posts(group, latest_comments=0):
+    """A group's posts with author and comment count, plus the newest comments if asked"""
+    posts = group.posts.select_related("author").annotate(comment_count=_comment_count())
+    if latest_comments:
+        latest = Comment.objects.select_related("author").order_by("-created_at", "-id")[:latest_comments]
+        posts = posts.prefetch_related(Prefetch("comments", queryset=latest, to_attr="latest_comments"))
+    return posts
+
+
 # HTML / WEB VIEWS (templates)
 
 
+def _group_page(request, size, joined=True):
+    """One keyset page of groups in the ?sort= order; raises ValueError on a bad cursor"""
+    keys = GROUP_SORTS.get(request.GET.get("sort"), GROUP_SORTS["name"])
+    groups = Group.objects.select_related("owner")
+    if joined:
+        groups = _with_joined(groups, request.user)
+    return keyset_page(groups, keys, request.GET.get("cursor"), size)
+
+
 def group_list(request):
-    groups = Group.objects.all().order_by('name')
-    return render(request, 'group_list.html', {'groups': groups})
+    try:
+        page = _group_page(request, GROUP_PAGE_SIZE)
+    except ValueError:
+        return redirect('community:group_list')
+    return render(request, 'group_list.html', {
+        'groups': page.items,
+        'sort': request.GET.get('sort', 'name'),
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+    })
 
 
 def group_detail(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author').prefetch_related('comments__author')
+    try:
+        page = keyset_page(_group_posts(group), PAGE_KEYS, request.GET.get('cursor'), POST_PAGE_SIZE)
+    except ValueError:
+        return redirect('community:group_detail', slug=slug)
     form = PostForm()
     comment_form = CommentForm()
     return render(request, 'group_detail.html', {
         'group': group,
-        'posts': posts,
+        'is_member': group.is_member(request.user),
+        'posts': page.items,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
         'form': form,
         'comment_form': comment_form,
     })
@@ -184,7 +255,7 @@ def delete_post(request, slug, pk):
 def post_detail(request, slug, pk):
     group = get_object_or_404(Group, slug=slug)
     post = get_object_or_404(
-        Post.objects.select_related("author", "group").prefetch_related("comments__author"),
+        Post.objects.select_related("author", "group").annotate(comment_count=_comment_count()),
         pk=pk,
         group=group
     )
@@ -195,7 +266,21 @@ def post_detail(request, slug, pk):
             Comment.objects.create(post=post, author=request.user, content=content)
         return redirect("community:post_detail", slug=slug, pk=pk)
 
-    return render(request, "post_detail.html", {"group": group, "post": post})
+    try:
+        page = keyset_page(
+            post.comments.select_related("author"), PAGE_KEYS, request.GET.get("cursor"), COMMENT_PAGE_SIZE
+        )
+    except ValueError:
+        return redirect("community:post_detail", slug=slug, pk=pk)
+
+    return render(request, "post_detail.html", {
+        "group": group,
+        "post": post,
+        # pages run newest first; each one reads oldest first
+        "comments": page.items[::-1],
+        "older_cursor": page.next_cursor,
+        "newer_cursor": page.prev_cursor,
+    })
 
 
 @login_required
@@ -242,13 +327,19 @@ def _serialize_user(user):
 
 
 def _serialize_group(group):
-    return {
+    data = {
         "id": group.id,
         "name": group.name,
         "slug": group.slug,
         "description": group.description,
         "owner": _serialize_user(group.owner),
+        "member_count": group.member_count,
+        "post_count": group.post_count,
+        "last_activity_at": group.last_activity_at.isoformat(),
     }
+    if hasattr(group, "joined"):
+        data["joined"] = group.joined
+    return data
 
 
 def _serialize_comment(comment):
@@ -270,7 +361,16 @@ def _serialize_post(post, include_comments=False):
         "author": _serialize_user(post.author),
         "group_id": post.group_id,
     }
-    if include_comments:
+    if hasattr(post, "latest_comments"):
+        # prefetched newest first; listed oldest first, with a cursor into the older ones
+        latest = post.latest_comments[::-1]
+        data["comment_count"] = post.comment_count
+        data["comments"] = [_serialize_comment(c) for c in latest]
+        data["comments_next"] = (
+            encode_cursor([latest[0].created_at, latest[0].id])
+            if post.comment_count > len(latest) else None
+        )
+    elif include_comments:
         data["comments"] = [_serialize_comment(c) for c in post.comments.all()]
     return data
 
@@ -278,21 +378,65 @@ def _serialize_post(post, include_comments=False):
 @csrf_exempt
 @require_GET
 def api_group_list(request):
-    groups = Group.objects.select_related("owner").all().order_by("name")
-    return JsonResponse({
-        "ok": True,
-        "groups": [_serialize_group(g) for g in groups],
-    })
+    """
+    Groups with their counters: ?sort=name|active|largest&cursor=&size=
+
+    "active" orders by last post or comment, "largest" by member count; both
+    read the maintained columns through their indexes.
+
+    The page itself is the same for everyone and is cached in the
+    "community-group" namespace (bumped by any group, post, comment or
+    membership write); only ``joined`` is filled in per user.
+    """
+    def build():
+        page = _group_page(request, size, joined=False)
+        return {
+            "groups": [_serialize_group(g) for g in page.items],
+            "next": page.next_cursor,
+            "prev": page.prev_cursor,
+        }
+
+    try:
+        size = _page_size(request, GROUP_PAGE_SIZE)
+        key = f"list:{request.GET.get('sort', 'name')}:{size}:{request.GET.get('cursor', '')}"
+        payload = tiered.get_or_set("community-group", key, build)
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Invalid cursor or size"}, status=400)
+
+    joined = member_group_ids(request.user)
+    user_id = request.user.pk
+    groups = [
+        {**g, "joined": g["id"] in joined or bool(user_id and g["owner"] and g["owner"]["id"] == user_id)}
+        for g in payload["groups"]
+    ]
+    return JsonResponse({"ok": True, **payload, "groups": groups})
 
 @csrf_exempt
 @require_GET
 def api_group_detail(request, slug):
-    group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related("author").prefetch_related("comments__author").all()
+    """
+    One window of a group's posts, newest first: ?cursor=&size=
+
+    Each post carries its comment_count and only its LATEST_COMMENTS newest
+    comments; ``comments_next`` continues into the older ones through
+    api_post_comments.
+    """
+    group = get_object_or_404(Group.objects.select_related("owner"), slug=slug)
+    try:
+        page = keyset_page(
+            _group_posts(group, LATEST_COMMENTS),
+            PAGE_KEYS,
+            request.GET.get("cursor"),
+            _page_size(request, POST_PAGE_SIZE),
+        )
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Invalid cursor or size"}, status=400)
     return JsonResponse({
         "ok": True,
         "group": _serialize_group(group),
-        "posts": [_serialize_post(p, include_comments=True) for p in posts],
+        "posts": [_serialize_post(p) for p in page.items],
+        "next": page.next_cursor,
+        "prev": page.prev_cursor,
     })
 
 @csrf_exempt
@@ -378,16 +522,35 @@ def api_create_post(request, slug):
 @csrf_exempt
 @require_GET
 def api_post_detail(request, slug, pk):
-    group = get_object_or_404(Group, slug=slug)
-    post = get_object_or_404(
-        Post.objects.select_related("author", "group").prefetch_related("comments__author"),
-        pk=pk,
-        group=group,
-    )
+    """A post with all of its comments, as clients of this endpoint expect; api_post_comments pages them"""
+    group = get_object_or_404(Group.objects.select_related("owner"), slug=slug)
+    post = get_object_or_404(_group_posts(group).prefetch_related("comments__author"), pk=pk)
     return JsonResponse({
         "ok": True,
         "group": _serialize_group(group),
-        "post": _serialize_post(post, include_comments=True),
+        "post": {**_serialize_post(post, include_comments=True), "comment_count": post.comment_count},
+    })
+
+
+@csrf_exempt
+@require_GET
+def api_post_comments(request, slug, pk):
+    """A post's comments, newest first: ?cursor=&size=; ``next`` pages to older ones"""
+    post = get_object_or_404(Post, pk=pk, group__slug=slug)
+    try:
+        page = keyset_page(
+            post.comments.select_related("author"),
+            PAGE_KEYS,
+            request.GET.get("cursor"),
+            _page_size(request, COMMENT_PAGE_SIZE),
+        )
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Invalid cursor or size"}, status=400)
+    return JsonResponse({
+        "ok": True,
+        "comments": [_serialize_comment(c) for c in page.items],
+        "next": page.next_cursor,
+        "prev": page.prev_cursor,
     })
 
 @csrf_exempt
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class MainConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'main'
+
+    def ready(self):
+        from main.search import install_search_index
+        post_migrate.connect(install_search_index, sender=self)
+
+        from velp.cache import invalidate_on
+        invalidate_on(self.get_model('Venue'), 'venue')
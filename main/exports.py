@@ -0,0 +1,146 @@
+from itertools import islice
+
+from django.core import serializers
+from django.core.exceptions import ValidationError
+from django.http import HttpResponse, StreamingHttpResponse, JsonResponse
+
+from velp.cache import tiered
+
+EXPORT_CHUNK_SIZE = 500
+EXPORT_MAX_LIMIT = 10000
+# exports larger than this are streamed every time rather than cached
+EXPORT_CACHE_MAX_CHARS = 2 * 1024 * 1024
+
+CONTENT_TYPES = {
+    "json": "application/json",
+    "xml": "application/xml",
+}
+
+# text between objects of two consecutive chunks
+CHUNK_SEPARATORS = {
+    "json": ", ",
+    "xml": "",
+}
+
+
+def _batches(iterable, size):
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def stream_serialized(fmt, queryset, fields=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield the same document serializers.serialize(fmt, queryset) would build,
+    one chunk of objects at a time, reading rows with .iterator() so memory
+    stays flat however large the table is.
+    """
+    options = {"fields": fields} if fields else {}
+    empty = serializers.serialize(fmt, [])
+    split = 1 if fmt == "json" else empty.rindex("</")
+    head, tail = empty[:split], empty[split:]
+
+    yield head
+    first = True
+    for batch in _batches(queryset.iterator(chunk_size=chunk_size), chunk_size):
+        text = serializers.serialize(fmt, batch, **options)
+        if not first:
+            yield CHUNK_SEPARATORS[fmt]
+        yield text[len(head):len(text) - len(tail)]
+        first = False
+    yield tail
+
+
+def _export_response(body, fmt, next_cursor):
+    response = HttpResponse(body, content_type=CONTENT_TYPES[fmt])
+    if next_cursor:
+        response["X-Next-Cursor"] = next_cursor
+    return response
+
+
+def _tee_to_cache(chunks, full_key, next_cursor):
+    # pass the stream through, keeping a copy until it grows past the cap
+    parts, size = [], 0
+    for chunk in chunks:
+        yield chunk
+        if parts is not None:
+            size += len(chunk)
+            if size > EXPORT_CACHE_MAX_CHARS:
+                parts = None
+            else:
+                parts.append(chunk)
+    if parts is not None:
+        tiered.set(full_key, ("".join(parts), next_cursor))
+
+
+def _export_params(request, model):
+    """
+    (fields, after, limit) from the query string, normalized: fields sorted,
+    ``after`` as the pk's canonical string, ``limit`` clamped. ``after`` and
+    ``limit`` are None without pagination. Raises ValueError with the message
+    for the 400 response.
+    """
+    fields = None
+    if request.GET.get("fields"):
+        fields = sorted({f for f in request.GET["fields"].split(",") if f})
+        allowed = {f.name for f in model._meta.concrete_fields if not f.primary_key}
+        unknown = sorted(set(fields) - allowed)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+
+    after, limit = request.GET.get("after"), request.GET.get("limit")
+    if not (after or limit):
+        return fields, None, None
+    try:
+        limit = min(int(limit or EXPORT_MAX_LIMIT), EXPORT_MAX_LIMIT)
+        if limit < 1:
+            raise ValueError
+        after = str(model._meta.pk.to_python(after)) if after else ""
+    except (ValueError, ValidationError):
+        raise ValueError("Invalid after or limit parameter.")
+    return fields, after, limit
+
+
+def stream_export(request, queryset, fmt, cache_namespace=None):
+    """
+    Streaming serializer response with two optional query parameters:
+    - ?fields=a,b       only serialize these model fields
+    - ?after=<pk>&limit=N   cursor pagination on pk; the next cursor is sent
+                            in the X-Next-Cursor header while rows remain
+
+    With ``cache_namespace`` the finished document (if small enough) is kept
+    in velp.cache under the format and the normalized parameters (other
+    query parameters do not make new entries), and served from there until
+    the namespace is invalidated.
+    """
+    try:
+        fields, after, limit = _export_params(request, queryset.model)
+    except ValueError as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=400)
+
+    full_key = None
+    if cache_namespace:
+        key = f"export:{fmt}:{','.join(fields or [])}:{after}:{limit}"
+        full_key = tiered.key(cache_namespace, key)
+        cached = tiered.get(full_key)
+        if cached is not None:
+            body, next_cursor = cached
+            return _export_response(body, fmt, next_cursor)
+
+    next_cursor = None
+    if limit is not None:
+        queryset = queryset.order_by("pk")
+        if after:
+            queryset = queryset.filter(pk__gt=after)
+        boundary = list(queryset.values_list("pk", flat=True)[limit - 1:limit + 1])
+        if len(boundary) == 2:
+            next_cursor = str(boundary[0])
+        queryset = queryset[:limit]
+
+    chunks = stream_serialized(fmt, queryset, fields)
+    if full_key:
+        chunks = _tee_to_cache(chunks, full_key, next_cursor)
+    response = StreamingHttpResponse(chunks, content_type=CONTENT_TYPES[fmt])
+    if next_cursor:
+        response["X-Next-Cursor"] = next_cursor
+    return response
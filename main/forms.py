@@ -7,7 +7,7 @@ from datetime import date, time, datetime
 class VenueForm(ModelForm):
     class Meta:
         model = Venue
-        fields = ["CityName", "StreetName", "leisure", "name"]
+        fields = ["CityName", "StreetName", "leisure", "name", "latitude", "longitude"]
 
 PAYMENT_CHOICES = [
     ("CASH", "Cash"),
@@ -0,0 +1,58 @@
+"""
+Grid buckets for nearest-venue queries without PostGIS.
+
+The globe is cut into GRID_DEGREES x GRID_DEGREES cells and each venue
+stores the integer id of its cell (Venue.geo_cell, indexed). Cells of one
+latitude row have consecutive ids, so the cells covering a search circle
+become one indexed range per row. Exact distances are then computed in
+Python on that small candidate set.
+"""
+import math
+
+GRID_DEGREES = 0.01  # about 1.1 km north-south
+LAT_ROWS = round(180 / GRID_DEGREES)
+LON_COLS = round(360 / GRID_DEGREES)
+EARTH_RADIUS_KM = 6371.0088
+
+
+def _row(lat):
+    return min(int(math.floor((lat + 90) / GRID_DEGREES)), LAT_ROWS - 1)
+
+
+def _col(lon):
+    return int(math.floor((lon + 180) / GRID_DEGREES)) % LON_COLS
+
+
+def cell_for(lat, lon):
+    if lat is None or lon is None:
+        return None
+    # model fields are only cast on the way to the database; accept "-6.2"
+    return _row(float(lat)) * LON_COLS + _col(float(lon))
+
+
+def cell_ranges(lat, lon, radius_km):
+    """(first, last) cell id ranges that together cover the circle"""
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    coslat = max(math.cos(math.radians(min(abs(lat) + dlat, 90))), 1e-6)
+    dlon = min(math.degrees(radius_km / EARTH_RADIUS_KM) / coslat, 180)
+
+    first_col, last_col = _col(lon - dlon), _col(lon + dlon)
+    ranges = []
+    for row in range(_row(max(lat - dlat, -90)), _row(min(lat + dlat, 90)) + 1):
+        base = row * LON_COLS
+        if dlon >= 180:
+            ranges.append((base, base + LON_COLS - 1))
+        elif first_col <= last_col:
+            ranges.append((base + first_col, base + last_col))
+        else:  # the circle crosses the antimeridian
+            ranges.append((base + first_col, base + LON_COLS - 1))
+            ranges.append((base, base + last_col))
+    return ranges
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
@@ -0,0 +1,315 @@
+"""
+Disk cache behind proxy_image.
+
+Layout under settings.IMAGE_CACHE_DIR:
+- blobs/<h[:2]>/<h>  image bytes, named by their sha256 (content-addressed,
+  so the same picture behind several URLs is stored once);
+- meta/<k[:2]>/<k>.json  per (url, width) record pointing at a blob, with the
+  upstream ETag / Last-Modified used for revalidation;
+- refs/<h[:2]>/<h>  the records written for a blob, one path per line, so
+  eviction can delete them with it;
+- size  running total of the blob bytes, updated on every store and eviction
+  under a file lock.
+
+A blob's mtime is bumped on every hit. A store only reads the running total;
+the blob tree is walked when that total passes IMAGE_CACHE_MAX_BYTES: the
+least recently used blobs are evicted down to EVICT_TO of the limit, each
+with its records, and the total is reset to what the walk counted (two
+processes storing the same blob at once count it twice until then). A record
+whose blob disappears in between is simply a miss.
+"""
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+try:
+    from PIL import Image
+except ImportError:  # thumbnails are optional
+    Image = None
+
+try:
+    import fcntl
+except ImportError:  # Windows: the size file is then only locked within the process
+    fcntl = None
+
+# one pooled session per process: keep-alive connections are reused across requests.
+# No retries: a failed fetch falls back to the cached copy, and retrying would
+# hold the worker several timeouts long.
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32, max_retries=0)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
+_evict_lock = threading.Lock()
+_size_lock = threading.Lock()
+# eviction stops at this share of IMAGE_CACHE_MAX_BYTES, so it does not run on every store
+EVICT_TO = 0.9
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+class CachedImage:
+    def __init__(self, path, content_type, digest):
+        self.path = path
+        self.content_type = content_type
+        self.digest = digest
+
+
+def _root():
+    return str(settings.IMAGE_CACHE_DIR)
+
+
+def _blob_path(digest):
+    return os.path.join(_root(), "blobs", digest[:2], digest)
+
+
+def _refs_path(digest):
+    return os.path.join(_root(), "refs", digest[:2], digest)
+
+
+def _meta_path(url, width):
+    key = hashlib.sha256(f"{url}\n{width or ''}".encode()).hexdigest()
+    return os.path.join(_root(), "meta", key[:2], key + ".json")
+
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path))
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _read_meta(url, width):
+    try:
+        with open(_meta_path(url, width)) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if os.path.exists(_blob_path(meta["digest"])) else None
+
+
+def _write_meta(url, width, meta, previous=None):
+    """Write the record; unless it points at the same blob as ``previous``, list it in the blob's refs"""
+    path = _meta_path(url, width)
+    _write_atomic(path, json.dumps(meta).encode())
+    if previous is None or previous["digest"] != meta["digest"]:
+        refs = _refs_path(meta["digest"])
+        os.makedirs(os.path.dirname(refs), exist_ok=True)
+        with open(refs, "a") as f:
+            f.write(os.path.relpath(path, _root()) + "\n")
+
+
+def _touch(path):
+    """Mark a blob as recently used; False if it is gone (evicted meanwhile)"""
+    try:
+        os.utime(path)
+    except OSError:
+        return False
+    return True
+
+
+def _walk_blobs():
+    """(mtime, size, path) of every stored blob"""
+    blobs = []
+    for dirpath, _, filenames in os.walk(os.path.join(_root(), "blobs")):
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            blobs.append((st.st_mtime, st.st_size, path))
+    return blobs
+
+
+def _update_size(change):
+    """Replace the running total of blob bytes with ``change(total)`` and return it"""
+    os.makedirs(_root(), exist_ok=True)
+    fd = os.open(os.path.join(_root(), "size"), os.O_RDWR | os.O_CREAT)
+    with _size_lock, os.fdopen(fd, "r+") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)  # released when the file closes
+        text = f.read().strip()
+        # a new (or damaged) size file starts from what is on disk
+        total = int(text) if text.isdigit() else sum(size for _, size, _ in _walk_blobs())
+        total = max(change(total), 0)
+        f.seek(0)
+        f.truncate()
+        f.write(str(total))
+    return total
+
+
+def _store_blob(data):
+    digest = hashlib.sha256(data).hexdigest()
+    path = _blob_path(digest)
+    if not _touch(path):
+        # counted before writing: a size file started here must not count it twice
+        total = _update_size(lambda total: total + len(data))
+        _write_atomic(path, data)
+        if total > settings.IMAGE_CACHE_MAX_BYTES:
+            _evict(keep=path)
+    return digest
+
+
+def _forget_records(digest):
+    """Delete the records of an evicted blob, except those since rewritten to point elsewhere"""
+    refs = _refs_path(digest)
+    try:
+        with open(refs) as f:
+            records = f.read().split()
+        os.remove(refs)
+    except OSError:
+        return
+    for record in records:
+        path = os.path.join(_root(), record)
+        try:
+            with open(path) as f:
+                if json.load(f)["digest"] == digest:
+                    os.remove(path)
+        except (OSError, ValueError, KeyError):
+            continue
+
+
+def _evict(keep):
+    """Delete least recently used blobs (never ``keep``) until the store fits its size limit"""
+    if not _evict_lock.acquire(blocking=False):
+        return
+    try:
+        blobs = _walk_blobs()
+        total = sum(size for _, size, _ in blobs)
+        # the walk is exact: drop whatever the running total drifted by
+        _update_size(lambda _: total)
+        if total <= settings.IMAGE_CACHE_MAX_BYTES:
+            return
+        target = settings.IMAGE_CACHE_MAX_BYTES * EVICT_TO
+        evicted = 0
+        for _, size, path in sorted(blobs):
+            if path == keep:
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            _forget_records(os.path.basename(path))
+            evicted += size
+            if total - evicted <= target:
+                break
+        _update_size(lambda total: total - evicted)
+    finally:
+        _evict_lock.release()
+
+
+def _download(url, meta=None):
+    """
+    GET the image, conditionally when we hold a cached copy. Returns None on
+    304. IMAGE_PROXY_TIMEOUT bounds each connect and read; the whole
+    download is cut off after IMAGE_PROXY_DEADLINE seconds.
+    """
+    deadline = time.monotonic() + settings.IMAGE_PROXY_DEADLINE
+    headers = {}
+    if meta:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    try:
+        with _session.get(url, headers=headers, timeout=settings.IMAGE_PROXY_TIMEOUT, stream=True) as resp:
+            if resp.status_code == 304 and meta:
+                return None
+            resp.raise_for_status()
+            body = io.BytesIO()
+            for chunk in resp.iter_content(64 * 1024):
+                body.write(chunk)
+                if body.tell() > settings.IMAGE_PROXY_MAX_BYTES:
+                    raise ImageFetchError("image is too large")
+                if time.monotonic() > deadline:
+                    raise ImageFetchError("image took too long to download")
+            return {
+                "data": body.getvalue(),
+                "content_type": resp.headers.get("Content-Type", "image/jpeg"),
+                "etag": resp.headers.get("ETag"),
+                "last_modified": resp.headers.get("Last-Modified"),
+            }
+    except requests.RequestException as e:
+        raise ImageFetchError(str(e))
+
+
+def _original(url):
+    meta = _read_meta(url, None)
+    if meta and time.time() - meta["fetched_at"] < settings.IMAGE_CACHE_MAX_AGE:
+        return meta
+
+    try:
+        fetched = _download(url, meta)
+    except ImageFetchError:
+        if meta:  # upstream is down: serve what we have
+            return meta
+        raise
+
+    previous = meta
+    if fetched is None:  # 304 Not Modified
+        meta = {**meta, "fetched_at": time.time()}
+    else:
+        meta = {
+            "digest": _store_blob(fetched["data"]),
+            "content_type": fetched["content_type"],
+            "etag": fetched["etag"],
+            "last_modified": fetched["last_modified"],
+            "fetched_at": time.time(),
+        }
+    _write_meta(url, None, meta, previous)
+    return meta
+
+
+def _thumbnail(url, width, original):
+    meta = _read_meta(url, width)
+    if meta and meta["source"] == original["digest"]:
+        return meta
+
+    with Image.open(_blob_path(original["digest"])) as img:
+        # Image.open() only refuses twice MAX_IMAGE_PIXELS; do not decode anything above it
+        if img.width * img.height > Image.MAX_IMAGE_PIXELS:
+            raise ValueError("image is too large to resize")
+        img.thumbnail((width, width * 10))
+        fmt = img.format or "JPEG"
+        out = io.BytesIO()
+        img.save(out, format=fmt)
+    previous = meta
+    meta = {
+        "digest": _store_blob(out.getvalue()),
+        "content_type": Image.MIME.get(fmt, original["content_type"]),
+        "source": original["digest"],
+    }
+    _write_meta(url, width, meta, previous)
+    return meta
+
+
+def get_image(url, width=None):
+    """
+    Cached image for ``url``, optionally scaled down to ``width`` pixels
+    (ignored when Pillow is not installed). Raises ImageFetchError when the
+    image is neither cached nor fetchable.
+    """
+    # a blob evicted between reading its record and touching it is a miss: go again
+    for _ in range(2):
+        meta = _original(url)
+        if width and Image is not None:
+            try:
+                meta = _thumbnail(url, width, meta)
+            except (OSError, ValueError, Image.DecompressionBombError):
+                pass  # not something Pillow can (or should) resize: serve the original
+        path = _blob_path(meta["digest"])
+        if _touch(path):
+            return CachedImage(path, meta["content_type"], meta["digest"])
+    raise ImageFetchError("image was evicted while being served")
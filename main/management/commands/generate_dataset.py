@@ -0,0 +1,498 @@
+"""
+Seeded synthetic data for load testing the venue list, the feeds and the
+moderation queue at realistic sizes.
+
+Every count scales with --users (PER_THOUSAND_USERS below); about 12,000
+users gives a million rows (983k measured at 12,000). Activity is skewed the way real traffic is: a
+few venues, posts, groups and users get most of the bookings, likes, members
+and comments (Zipf weights, exponents in SKEW). The same --seed and
+--end-date always give the same data.
+
+Rows are written with bulk_create in batches, so model save() methods and
+signals do not run. The command fills in what they would have maintained
+itself, from the numbers it generated:
+- venue rating aggregates and geo cells;
+- booking occupancy bitmaps;
+- post like and comment counters;
+- group member, post and activity columns;
+- report rollups.
+Afterwards it rebuilds the search documents and invalidates velp.cache.
+"""
+import datetime
+import random
+import uuid
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from itertools import accumulate, islice
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from community.models import Comment as GroupComment, Group, Membership, Post as GroupPost
+from main.geo import cell_for
+from main.models import Booking, Venue, VenueOccupancy
+from posts.models import Comment, Post
+from reports.models import Report, ReportTarget
+from review.models import Review
+from search.index import rebuild
+from velp.cache import tiered
+
+# rows of each kind per 1000 users
+PER_THOUSAND_USERS = {
+    'venues': 150,
+    'bookings': 12000,
+    'reviews': 4000,
+    'posts': 6000,
+    'likes': 40000,
+    'comments': 9000,
+    'groups': 40,
+    'memberships': 8000,
+    'group_posts': 5000,
+    'group_comments': 12000,
+    'reports': 400,
+}
+
+# Zipf exponent of each "who gets the activity" distribution; higher is more skewed
+SKEW = {
+    'users': 1.0,      # authors, reviewers, bookers
+    'venues': 1.1,     # bookings and reviews per venue
+    'posts': 1.3,      # likes, comments and reports per feed post
+    'groups': 1.1,     # members per group
+    'group_posts': 1.2,  # comments per community post
+}
+
+CITIES = {
+    'Jakarta': (-6.2088, 106.8456),
+    'Depok': (-6.4025, 106.7942),
+    'Bandung': (-6.9175, 107.6191),
+    'Surabaya': (-7.2575, 112.7521),
+    'Yogyakarta': (-7.7956, 110.3695),
+    'Medan': (3.5952, 98.6722),
+    'Semarang': (-6.9667, 110.4167),
+    'Makassar': (-5.1477, 119.4327),
+}
+STREETS = ['Jl. Margonda', 'Jl. Sudirman', 'Jl. Thamrin', 'Jl. Gatot Subroto', 'Jl. Kebon Jeruk',
+           'Jl. Asia Afrika', 'Jl. Malioboro', 'Jl. Diponegoro', 'Jl. Pemuda', 'Jl. Juanda']
+VENUE_WORDS = ['Garuda', 'Rajawali', 'Merdeka', 'Cendrawasih', 'Bintang', 'Pelita', 'Nusantara',
+               'Harmoni', 'Cempaka', 'Mawar', 'Senayan', 'Kenari']
+LEISURE_WORDS = {'pitch': 'Futsal', 'stadium': 'Stadium', 'sports_centre': 'Sport Centre'}
+SPORTS = ['futsal', 'badminton', 'basket', 'voli', 'tenis', 'mini soccer']
+WORDS = ('main bareng yuk sabtu pagi lapangan bagus banget kurang satu orang siapa mau ikut '
+         'harga murah parkir luas rumput sintetis lampu terang kamar mandi bersih seru').split()
+PAYMENT_METHODS = [choice for choice, _ in Booking.PAYMENT_CHOICES]
+REPORT_TYPES = {'post': 5, 'comment': 3, 'review': 2, 'venue': 1, 'community': 1}
+REPORT_REASONS = {'spam': 5, 'inappropriate': 3, 'false_info': 2, 'scam': 1, 'other': 2}
+REPORT_STATUSES = {'open': 6, 'under_review': 1, 'resolved': 2, 'rejected': 1}
+
+
+def _batches(iterable, size):
+    it = iter(iterable)
+    while batch := list(islice(it, size)):
+        yield batch
+
+
+def _cum_weights(n, exponent):
+    return list(accumulate((rank ** -exponent for rank in range(1, n + 1))))
+
+
+@contextmanager
+def _explicit_timestamps(*models):
+    """Let generated created_at/updated_at values through auto_now(_add) fields"""
+    fields = [
+        (f, f.auto_now, f.auto_now_add) for model in models for f in model._meta.concrete_fields
+        if getattr(f, 'auto_now', False) or getattr(f, 'auto_now_add', False)
+    ]
+    for f, _, _ in fields:
+        f.auto_now = f.auto_now_add = False
+    try:
+        yield
+    finally:
+        for f, auto_now, auto_now_add in fields:
+            f.auto_now, f.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = (
+        'Generates a seeded synthetic dataset (users, venues, bookings, reviews, feed and community '
+        'posts, likes, groups, comments, reports) with realistic skew, for load testing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help='Scale of the dataset (default 1000)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--months', type=int, default=6, help='History covered by bookings and posts')
+        parser.add_argument('--end-date', type=datetime.date.fromisoformat, default=None,
+                            help='Last day of generated history (default today)')
+        parser.add_argument('--prefix', default='seed', help='Username prefix of generated users')
+        parser.add_argument('--password', default='password', help='Password of every generated user')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--skip-search-index', action='store_true',
+                            help='Do not rebuild the search documents afterwards')
+
+    def handle(self, *args, **options):
+        if options['users'] < 10:
+            raise CommandError('--users must be at least 10.')
+        if User.objects.filter(username__startswith=f"{options['prefix']}_").exists():
+            raise CommandError(f"Users named {options['prefix']}_* already exist; pick another --prefix.")
+
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        end_date = options['end_date'] or timezone.localdate()
+        tz = timezone.get_current_timezone()
+        self.end = datetime.datetime.combine(end_date, datetime.time(23, 59), tzinfo=tz)
+        self.start = self.end - datetime.timedelta(days=30 * options['months'])
+        self.counts = {
+            kind: max(1, per_thousand * options['users'] // 1000)
+            for kind, per_thousand in PER_THOUSAND_USERS.items()
+        }
+        self.written = Counter()
+
+        with transaction.atomic(), _explicit_timestamps(Booking, Review, Post, Comment, Report):
+            self.make_users()
+            self.make_venues_and_reviews()
+            self.make_bookings()
+            self.make_posts()
+            self.make_groups()
+            self.make_reports()
+        if not options['skip_search_index']:
+            rebuild(batch_size=self.batch_size)
+        tiered.invalidate('venue', 'community-group')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Wrote {sum(self.written.values())} rows: "
+            + ', '.join(f'{n} {kind}' for kind, n in self.written.items()) + '.'
+        ))
+
+    # helpers
+
+    def insert(self, model, rows, label=None):
+        """bulk_create ``rows`` (any iterable) in batches; returns nothing, counts the rows"""
+        for batch in _batches(rows, self.batch_size):
+            model.objects.bulk_create(batch, batch_size=self.batch_size)
+            self.written[label or model._meta.verbose_name_plural] += len(batch)
+
+    def uuid(self):
+        return uuid.UUID(int=self.rng.getrandbits(128), version=4)
+
+    def moment(self, after=None):
+        """A random datetime between ``after`` (default the start of history) and the end"""
+        after = after or self.start
+        return after + (self.end - after) * self.rng.random()
+
+    def text(self, low, high):
+        return ' '.join(self.rng.choices(WORDS, k=self.rng.randint(low, high))).capitalize()
+
+    def skewed(self, items, exponent, k):
+        """``k`` picks from ``items``, with a random few of them taking most picks"""
+        order = list(items)
+        self.rng.shuffle(order)
+        return self.rng.choices(order, cum_weights=_cum_weights(len(order), exponent), k=k)
+
+    def allocate(self, n, total, exponent):
+        """Split ``total`` events over ``n`` items with Zipf skew; returns per-item counts"""
+        counts = Counter(self.skewed(range(n), exponent, total))
+        return [counts[i] for i in range(n)]
+
+    def distinct_users(self, k, exclude=None):
+        k = min(k, len(self.user_ids) - (exclude is not None))
+        picked = set()
+        while len(picked) < k:
+            user_id = self.user_ids[self.rng.randrange(len(self.user_ids))]
+            if user_id != exclude:
+                picked.add(user_id)
+        return picked
+
+    def weighted(self, choices):
+        return self.rng.choices(list(choices), weights=list(choices.values()))[0]
+
+    # generators
+
+    def make_users(self):
+        n = self.options['users']
+        password = make_password(self.options['password'])
+        prefix = self.options['prefix']
+        self.insert(User, (
+            User(
+                username=f'{prefix}_{i:06d}',
+                password=password,
+                # a few moderators for the report queue
+                is_staff=i < 3,
+                date_joined=self.moment() - datetime.timedelta(days=365),
+            )
+            for i in range(n)
+        ))
+        self.user_ids = list(
+            User.objects.filter(username__startswith=f'{prefix}_').order_by('username').values_list('id', flat=True)
+        )
+        self.staff_ids = self.user_ids[:3]
+        # who is active: the same few users write most reviews, posts and comments
+        self.active_user_weights = _cum_weights(len(self.user_ids), SKEW['users'])
+
+    def active_users(self, k):
+        return self.rng.choices(self.user_ids, cum_weights=self.active_user_weights, k=k)
+
+    def make_venues_and_reviews(self):
+        n = self.counts['venues']
+        review_counts = self.allocate(n, self.counts['reviews'], SKEW['venues'])
+        reviewers = iter(self.active_users(self.counts['reviews']))
+        prior_mean = float(settings.VENUE_RATING_PRIOR_MEAN)
+        prior_weight = float(settings.VENUE_RATING_PRIOR_WEIGHT)
+
+        venues, reviews = [], []
+        for i in range(n):
+            city = self.rng.choice(list(CITIES))
+            lat, lon = CITIES[city]
+            lat, lon = round(lat + self.rng.uniform(-0.15, 0.15), 6), round(lon + self.rng.uniform(-0.15, 0.15), 6)
+            leisure = self.weighted({'pitch': 6, 'sports_centre': 3, 'stadium': 1})
+            venue = Venue(
+                id=self.uuid(),
+                user_id=self.rng.choice(self.user_ids),
+                name=f'{self.rng.choice(VENUE_WORDS)} {LEISURE_WORDS[leisure]} {i + 1}',
+                CityName=city,
+                StreetName=f'{self.rng.choice(STREETS)} No. {self.rng.randint(1, 250)}',
+                leisure=leisure,
+                price_per_hour=self.rng.randrange(100000, 800001, 25000),
+                latitude=lat,
+                longitude=lon,
+                geo_cell=cell_for(lat, lon),
+            )
+
+            # each venue has a "true" quality its reviews scatter around
+            quality = self.rng.uniform(1.8, 4.7)
+            sums = dict.fromkeys(Venue.RATING_CRITERIA, 0)
+            for _ in range(review_counts[i]):
+                ratings = {c: min(5, max(1, round(self.rng.gauss(quality, 0.9)))) for c in Venue.RATING_CRITERIA}
+                for c, r in ratings.items():
+                    sums[c] += r
+                reviews.append(Review(
+                    user_id=next(reviewers), venue_id=venue.id, comment=self.text(3, 15),
+                    created_at=self.moment(), **ratings,
+                ))
+
+            count = review_counts[i]
+            total = sum(sums.values())
+            venue.review_count = count
+            for c in Venue.RATING_CRITERIA:
+                setattr(venue, f'{c}_sum', sums[c])
+                setattr(venue, f'{c}_avg', sums[c] / count if count else 0.0)
+            venue.rating_avg = total / (3 * count) if count else 0.0
+            venue.rating_score = (prior_weight * prior_mean + total / 3) / (prior_weight + count)
+            venues.append(venue)
+
+        self.insert(Venue, venues)
+        self.insert(Review, reviews)
+        self.venues = venues
+        self.review_ids = list(Review.objects.filter(venue__in=[v.id for v in venues]).values_list('id', flat=True))
+
+    def make_bookings(self):
+        days = (self.end.date() - self.start.date()).days
+        today = timezone.localdate()
+        taken = defaultdict(int)  # (venue id, date) -> hour bits held by active bookings
+
+        def bookings():
+            for venue in self.skewed(self.venues, SKEW['venues'], self.counts['bookings']):
+                # a few tries at a free slot; a full day just gets fewer bookings
+                for _ in range(4):
+                    date = self.start.date() + datetime.timedelta(days=self.rng.randrange(days + 14))
+                    start_hour = self.rng.randint(6, 21)
+                    duration = self.rng.randint(1, min(3, 24 - start_hour))
+                    mask = VenueOccupancy.hours_mask(start_hour, duration)
+                    if not taken[venue.id, date] & mask:
+                        break
+                else:
+                    continue
+                if date < today:
+                    status = self.weighted({'CONFIRMED': 17, 'CANCELLED': 3})
+                else:
+                    status = self.weighted({'PENDING': 6, 'CONFIRMED': 3, 'CANCELLED': 1})
+                if status != 'CANCELLED':
+                    taken[venue.id, date] |= mask
+                booked = datetime.datetime.combine(date, datetime.time(start_hour), tzinfo=self.end.tzinfo)
+                yield Booking(
+                    user_id=self.rng.choice(self.user_ids),
+                    venue_id=venue.id,
+                    date=date,
+                    start_time=datetime.time(start_hour),
+                    end_time=datetime.time((start_hour + duration) % 24),
+                    duration_hours=duration,
+                    total_price=venue.price_per_hour * duration,
+                    payment_method=self.rng.choice(PAYMENT_METHODS),
+                    status=status,
+                    created_at=booked - datetime.timedelta(hours=self.rng.uniform(1, 24 * 21)),
+                )
+
+        self.insert(Booking, bookings())
+        self.insert(VenueOccupancy, (
+            VenueOccupancy(venue_id=venue_id, date=date, mask=mask)
+            for (venue_id, date), mask in taken.items() if mask
+        ), label='occupancy days')
+
+    def make_posts(self):
+        n = self.counts['posts']
+        # a handful of viral posts collect most likes and comments
+        like_counts = self.allocate(n, self.counts['likes'], SKEW['posts'])
+        comment_counts = self.allocate(n, self.counts['comments'], SKEW['posts'])
+        authors = self.active_users(n)
+
+        posts = []
+        for i in range(n):
+            created = self.moment()
+            posts.append(Post(
+                id=self.uuid(), author_id=authors[i], content=self.text(4, 40),
+                venue_hint=self.rng.choice(self.venues).name if self.rng.random() < 0.4 else '',
+                created_at=created, updated_at=created,
+                like_count=min(like_counts[i], len(self.user_ids)), comment_count=comment_counts[i],
+            ))
+        self.insert(Post, posts)
+
+        Like = Post.likes.through
+        self.insert(Like, (
+            Like(post_id=post.id, user_id=user_id)
+            for post in posts for user_id in self.distinct_users(post.like_count)
+        ), label='likes')
+        commenters = iter(self.active_users(self.counts['comments']))
+        self.comment_ids = []
+
+        def comments():
+            for post in posts:
+                for _ in range(post.comment_count):
+                    comment = Comment(id=self.uuid(), post_id=post.id, author_id=next(commenters),
+                                      body=self.text(2, 20), created_at=self.moment(post.created_at))
+                    self.comment_ids.append(comment.id)
+                    yield comment
+
+        self.insert(Comment, comments())
+        self.posts = posts
+
+    def make_groups(self):
+        n = self.counts['groups']
+        member_counts = self.allocate(n, self.counts['memberships'], SKEW['groups'])
+        owners = self.active_users(n)
+
+        groups, members = [], {}
+        for i in range(n):
+            name = f'{self.rng.choice(SPORTS).title()} {self.rng.choice(list(CITIES))} {i + 1}'
+            group = Group(
+                name=name, slug=slugify(name), owner_id=owners[i], description=self.text(5, 25),
+                created_at=self.start - datetime.timedelta(days=self.rng.randrange(365)),
+            )
+            members[name] = self.distinct_users(member_counts[i], exclude=owners[i])
+            group.member_count = len(members[name])
+            groups.append(group)
+        # ids are needed below, so the groups go in first and get their counters after
+        self.insert(Group, groups)
+        groups = list(Group.objects.filter(name__in=members).order_by('id'))
+        self.insert(Membership, (
+            Membership(group_id=group.id, user_id=user_id, joined_at=self.moment(group.created_at))
+            for group in groups for user_id in members[group.name]
+        ))
+
+        # members write in proportion to the group's size
+        weights = [group.member_count + 1 for group in groups]
+        post_groups = self.rng.choices(groups, weights=weights, k=self.counts['group_posts'])
+        group_posts = []
+        for group in post_groups:
+            pool = members[group.name]
+            author = self.rng.choice(tuple(pool)) if pool else group.owner_id
+            group_posts.append(GroupPost(
+                group_id=group.id, author_id=author, headline=self.text(2, 6), content=self.text(5, 40),
+                created_at=self.moment(max(group.created_at, self.start)),
+            ))
+        self.insert(GroupPost, group_posts, label='community posts')
+        group_posts = list(GroupPost.objects.filter(group__in=groups).order_by('id'))
+
+        comment_counts = self.allocate(len(group_posts), self.counts['group_comments'], SKEW['group_posts'])
+        commenters = iter(self.active_users(self.counts['group_comments']))
+        last_activity = {}
+        post_count = Counter()
+
+        def comments():
+            for post, count in zip(group_posts, comment_counts):
+                post_count[post.group_id] += 1
+                latest = post.created_at
+                for _ in range(count):
+                    created = self.moment(post.created_at)
+                    latest = max(latest, created)
+                    yield GroupComment(post_id=post.id, author_id=next(commenters),
+                                       content=self.text(2, 20), created_at=created)
+                last_activity[post.group_id] = max(last_activity.get(post.group_id, latest), latest)
+
+        self.insert(GroupComment, comments(), label='community comments')
+        for group in groups:
+            group.post_count = post_count[group.id]
+            group.last_activity_at = last_activity.get(group.id, group.created_at)
+        Group.objects.bulk_update(groups, ['member_count', 'post_count', 'last_activity_at'],
+                                  batch_size=self.batch_size)
+        self.groups = groups
+
+    def make_reports(self):
+        # viral posts and busy groups draw most reports
+        targets = {
+            'post': (Post, [p.id for p in self.posts], [p.like_count + p.comment_count + 1 for p in self.posts]),
+            'comment': (Comment, self.comment_ids, None),
+            'review': (Review, self.review_ids, None),
+            'venue': (Venue, [v.id for v in self.venues], [v.review_count + 1 for v in self.venues]),
+            'community': (Group, [g.id for g in self.groups], [g.member_count + 1 for g in self.groups]),
+        }
+        content_types = {
+            kind: ContentType.objects.get_for_model(model).id for kind, (model, _, _) in targets.items()
+        }
+        open_reports = set()
+        rollups = {}
+
+        def reports():
+            for _ in range(self.counts['reports']):
+                kind = self.weighted(REPORT_TYPES)
+                _, ids, weights = targets[kind]
+                if not ids:
+                    continue
+                object_id = str(self.rng.choices(ids, weights=weights)[0])
+                reporter = self.rng.choice(self.user_ids)
+                status = self.weighted(REPORT_STATUSES)
+                key = (content_types[kind], object_id)
+                if status == 'open':
+                    # one open report per reporter and target
+                    if (reporter, key) in open_reports:
+                        continue
+                    open_reports.add((reporter, key))
+                reason = self.weighted(REPORT_REASONS)
+                created = self.moment()
+                handled = status != 'open'
+                self.roll_up(rollups, key, kind, reporter, reason, status, created)
+                yield Report(
+                    reporter_id=reporter, content_type_id=key[0], object_id=object_id, target_type=kind,
+                    reason=reason, details=self.text(0, 15), status=status, created_at=created,
+                    handled_by_id=self.rng.choice(self.staff_ids) if handled else None,
+                    resolved_at=self.moment(created) if status in ('resolved', 'rejected') else None,
+                )
+
+        self.insert(Report, reports())
+        self.insert(ReportTarget, rollups.values(), label='report targets')
+
+    def roll_up(self, rollups, key, kind, reporter, reason, status, created):
+        """Fold one report into its target's rollup, as reports.models.rebuild_rollup would"""
+        rollup = rollups.get(key)
+        if rollup is None:
+            rollup = rollups[key] = ReportTarget(
+                content_type_id=key[0], object_id=key[1], target_type=kind,
+                first_reported_at=created, last_reported_at=created, reason_counts={},
+            )
+            rollup.reporters = set()
+        rollup.reporters.add(reporter)
+        rollup.reporter_count = len(rollup.reporters)
+        rollup.first_reported_at = min(rollup.first_reported_at, created)
+        rollup.last_reported_at = max(rollup.last_reported_at, created)
+        if status == 'open':
+            rollup.open_count += 1
+            rollup.reason_counts[reason] = rollup.reason_counts.get(reason, 0) + 1
+            rollup.severity += ReportTarget.REASON_WEIGHTS[reason]
+            if rollup.escalated_at is None and rollup.severity >= settings.REPORT_ESCALATION_SEVERITY:
+                rollup.escalated_at = rollup.last_reported_at
+
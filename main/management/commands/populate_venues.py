@@ -1,68 +1,158 @@
 import csv
 import os
-from django.core.management.base import BaseCommand
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
 from django.conf import settings
+from django.db import transaction
 from main.models import Venue  # Import your Venue model
+from main.geo import cell_for
+from velp.cache import tiered
 from django.contrib.auth.models import User
 
+# CSV column -> Venue field, refreshed on every import
+IMPORT_FIELDS = {
+    'name': 'name',
+    'StreetName': 'StreetName',
+    'CityName': 'CityName',
+    'leisure': 'leisure',
+}
+# optional coordinate columns; only refreshed when the CSV has them
+LATITUDE_COLUMNS = ('@lat', 'lat', 'latitude')
+LONGITUDE_COLUMNS = ('@lon', 'lon', 'lng', 'longitude')
+COORDINATE_FIELDS = ['latitude', 'longitude', 'geo_cell']
+VALID_LEISURE = {choice for choice, _ in Venue.LEISURE_CHOICES}
+
+
 class Command(BaseCommand):
-    help = 'Populates the Venue model from a venues.csv file'
+    help = (
+        'Imports venues from an OSM CSV export, upserting on the @id column. '
+        'Safe to re-run: existing venues (and their bookings and reviews) are kept.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            default=os.path.join(settings.BASE_DIR, 'jakarta_soccer_minimal_no_duplicate.csv'),
+            help='CSV file with @id, CityName, StreetName, leisure and name columns (optionally lat and lon)',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Count changes without writing them')
+        parser.add_argument('--diff', action='store_true', help='Print every inserted or changed venue')
 
     def handle(self, *args, **options):
-        self.stdout.write(self.style.SUCCESS('Starting to populate venues...'))
-
-        # --- 1. Find the default user to assign ---
-        default_user = None
-        try:
-            default_user = User.objects.get(username="ADMIN") # Using the user from your log
-        except User.DoesNotExist:
-            default_user = User.objects.first() # Fallback
-        
-        if not default_user:
-            self.stdout.write(self.style.ERROR('No users found. Please create a superuser first.'))
-            self.stdout.write(self.style.ERROR('Run: python manage.py createsuperuser'))
-            return
+        csv_file_path = options['file']
+        if not os.path.exists(csv_file_path):
+            raise CommandError(f'File not found at {csv_file_path}')
 
-        self.stdout.write(f'All new venues will be assigned to user: {default_user.username}')
+        # --- new venues are assigned to ADMIN, or the first user as a fallback ---
+        default_user = User.objects.filter(username="ADMIN").first() or User.objects.first()
+        if not default_user and not options['dry_run']:
+            raise CommandError('No users found. Please create a superuser first: python manage.py createsuperuser')
 
-        # --- 2. Define the path to the CSV file ---
-        # Using the filename from your last error
-        csv_file_path = os.path.join(settings.BASE_DIR, 'jakarta_soccer_minimal_no_duplicate.csv') 
+        self.options = options
+        self.default_user = default_user
+        self.counts = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
 
-        if not os.path.exists(csv_file_path):
-            self.stdout.write(self.style.ERROR(f'Error: File not found at {csv_file_path}'))
+        with open(csv_file_path, mode='r', encoding='utf-8', newline='') as file:
+            reader = csv.DictReader(file)
+            header = reader.fieldnames or []
+            self.lat_column = next((c for c in LATITUDE_COLUMNS if c in header), None)
+            self.lon_column = next((c for c in LONGITUDE_COLUMNS if c in header), None)
+            self.fields = list(IMPORT_FIELDS.values())
+            if self.lat_column and self.lon_column:
+                self.fields += COORDINATE_FIELDS
+            while batch := list(islice(reader, options['batch_size'])):
+                self.import_batch(batch)
+
+        prefix = '[dry run] ' if options['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            '{}Inserted {inserted}, updated {updated}, unchanged {unchanged}, skipped {skipped}.'.format(
+                prefix, **self.counts)
+        ))
+
+    def parse_row(self, row):
+        osm_id = (row.get('@id') or '').strip()
+        if not osm_id:
+            return None, None
+        values = {field: (row.get(column) or '').strip() for column, field in IMPORT_FIELDS.items()}
+        if values['leisure'] not in VALID_LEISURE:
+            values['leisure'] = 'pitch'
+        if 'geo_cell' in self.fields:
+            try:
+                values['latitude'] = float(row[self.lat_column])
+                values['longitude'] = float(row[self.lon_column])
+            except (TypeError, ValueError):
+                values['latitude'] = values['longitude'] = None
+            values['geo_cell'] = cell_for(values['latitude'], values['longitude'])
+        return osm_id, values
+
+    def import_batch(self, batch):
+        rows = {}
+        for row in batch:
+            osm_id, values = self.parse_row(row)
+            if osm_id is None:
+                self.counts['skipped'] += 1
+            else:
+                rows[osm_id] = values  # a repeated @id in one batch: last row wins
+
+        fields = self.fields
+        existing = {
+            v['osm_id']: v
+            for v in Venue.objects.filter(osm_id__in=rows).values('osm_id', *fields)
+        }
+        # venues loaded by the old name-keyed importer have no osm_id yet: adopt them by name
+        missing_names = {values['name'] for osm_id, values in rows.items() if osm_id not in existing}
+        orphans = {}
+        if missing_names:
+            for venue in Venue.objects.filter(osm_id__isnull=True, name__in=missing_names).order_by('name', 'id'):
+                orphans.setdefault(venue.name, venue)
+
+        upserts, adopted = [], []
+        for osm_id, values in rows.items():
+            current = existing.get(osm_id)
+            if current is None and values['name'] in orphans:
+                venue = orphans.pop(values['name'])
+                current = {f: getattr(venue, f) for f in fields}
+                venue.osm_id = osm_id
+                for field, value in values.items():
+                    setattr(venue, field, value)
+                adopted.append(venue)
+                self.record(osm_id, current, values)
+                continue
+
+            self.record(osm_id, current, values)
+            if current is None or any(current[f] != values[f] for f in fields):
+                upserts.append(Venue(osm_id=osm_id, user=self.default_user, **values))
+
+        if self.options['dry_run']:
+            return
+        with transaction.atomic():
+            if upserts:
+                Venue.objects.bulk_create(
+                    upserts,
+                    update_conflicts=True,
+                    unique_fields=['osm_id'],
+                    update_fields=fields,
+                )
+            if adopted:
+                Venue.objects.bulk_update(adopted, ['osm_id', *fields])
+        tiered.invalidate('venue')
+
+    def record(self, osm_id, current, values):
+        if current is None:
+            self.counts['inserted'] += 1
+            if self.options['diff']:
+                self.stdout.write(self.style.SUCCESS(f'+ {osm_id} {values["name"]}'))
             return
 
-        # --- 3. Open and read the CSV ---
-        self.stdout.write('Clearing old venue data...')
-        Venue.objects.all().delete()
-        
-        venue_count = 0
-        try:
-            with open(csv_file_path, mode='r', encoding='utf-8') as file:
-                reader = csv.DictReader(file) 
-
-                for row in reader:
-                    # --- 4. Map CSV columns to your model fields ---
-                    # We use 'name' as the unique key for get_or_create
-                    venue, created = Venue.objects.get_or_create(
-                        name=row['name'],
-                        defaults={
-                            # This is the fix:
-                            'StreetName': row['StreetName'], # Was 'address'
-                            
-                            # Adding the other fields from your model/CSV:
-                            'CityName': row['CityName'],
-                            'leisure': row['leisure'],
-                            'user': default_user,
-                        }
-                    )
-                    
-                    if created:
-                        venue_count += 1
-
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'An error occurred: {e}'))
+        changes = {f: (current[f], v) for f, v in values.items() if current[f] != v}
+        if not changes:
+            self.counts['unchanged'] += 1
             return
 
-        self.stdout.write(self.style.SUCCESS(f'Successfully created {venue_count} new venues! ✅'))
\ No newline at end of file
+        self.counts['updated'] += 1
+        if self.options['diff']:
+            self.stdout.write(self.style.WARNING(f'~ {osm_id} {values["name"]}'))
+            for field, (old, new) in changes.items():
+                self.stdout.write(f'    {field}: {old!r} -> {new!r}')
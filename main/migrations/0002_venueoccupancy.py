@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_occupancy(apps, schema_editor):
+    Booking = apps.get_model('main', 'Booking')
+    VenueOccupancy = apps.get_model('main', 'VenueOccupancy')
+    masks = {}
+    active = Booking.objects.exclude(status='CANCELLED').values_list('venue_id', 'date', 'start_time', 'duration_hours')
+    for venue_id, date, start_time, duration in active.iterator():
+        key = (venue_id, date)
+        for h in range(start_time.hour, start_time.hour + duration):
+            masks[key] = masks.get(key, 0) | 1 << (h % 24)
+    VenueOccupancy.objects.bulk_create(
+        [VenueOccupancy(venue_id=v, date=d, mask=m) for (v, d), m in masks.items()],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VenueOccupancy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('mask', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='booking',
+            unique_together=set(),
+        ),
+        migrations.AddConstraint(
+            model_name='booking',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'CANCELLED'), _negated=True), fields=('venue', 'date', 'start_time', 'end_time'), name='uq_active_booking_slot'),
+        ),
+        migrations.AddField(
+            model_name='venueoccupancy',
+            name='venue',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='occupancy', to='main.venue'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='venueoccupancy',
+            unique_together={('venue', 'date')},
+        ),
+        migrations.RunPython(build_occupancy, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0003_venue_list_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venue',
+            name='accessibility_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='venue',
+            name='accessibility_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='venue',
+            name='facility_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='venue',
+            name='facility_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='venue',
+            name='rating_avg',
+            field=models.FloatField(default=0, help_text='Mean of the three criteria over all reviews'),
+        ),
+        migrations.AddField(
+            model_name='venue',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='venue',
+            name='value_for_money_avg',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='venue',
+            name='value_for_money_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:58
+
+import main.models
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast
+
+
+def compute_scores(apps, schema_editor):
+    Venue = apps.get_model('main', 'Venue')
+    prior_mean = float(settings.VENUE_RATING_PRIOR_MEAN)
+    prior_weight = float(settings.VENUE_RATING_PRIOR_WEIGHT)
+    total = F('accessibility_sum') + F('facility_sum') + F('value_for_money_sum')
+    Venue.objects.update(rating_score=(
+        (Value(prior_weight * prior_mean) + Cast(total, FloatField()) / Value(3.0))
+        / (Value(prior_weight) + F('review_count'))
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0004_venue_rating_aggregates'),
+        # scores are computed from the sums that migration backfills
+        ('review', '0002_backfill_venue_ratings'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venue',
+            name='rating_score',
+            field=models.FloatField(default=main.models.prior_rating_score, help_text='Bayesian-weighted rating used for rankings'),
+        ),
+        migrations.AddIndex(
+            model_name='venue',
+            index=models.Index(fields=['rating_score', 'id'], name='main_venue_score_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venue',
+            index=models.Index(fields=['rating_avg', 'id'], name='main_venue_rating_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venue',
+            index=models.Index(fields=['review_count', 'id'], name='main_venue_reviews_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venue',
+            index=models.Index(fields=['price_per_hour', 'id'], name='main_venue_price_id_idx'),
+        ),
+        migrations.RunPython(compute_scores, migrations.RunPython.noop),
+    ]
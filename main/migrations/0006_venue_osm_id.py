@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('main', '0005_venue_rating_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venue',
+            name='osm_id',
+            field=models.CharField(blank=True, max_length=32, null=True, unique=True),
+        ),
+    ]
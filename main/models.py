@@ -2,10 +2,23 @@ import uuid
 import datetime
 from django.db import models
 from django.contrib.auth.models import User
-from django.db import models
+from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db import models, transaction
+from django.db.models import F, Q, Case, When, Value, FloatField
+from django.db.models.functions import Cast
+from django.db.models.lookups import Exact
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.utils.text import slugify
 from django.conf import settings  # for AUTH_USER_MODEL
 
+from main.geo import cell_for
+
+def prior_rating_score():
+    """Ranking score of a venue without reviews (see Venue.rating_aggregate_expressions)"""
+    return float(settings.VENUE_RATING_PRIOR_MEAN)
+
+
 # Venue
 class Venue(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True)
@@ -17,6 +30,8 @@ class Venue(models.Model):
 
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # OpenStreetMap "@id" of imported venues; the upsert key of populate_venues
+    osm_id = models.CharField(max_length=32, unique=True, null=True, blank=True)
     CityName = models.CharField(max_length=255)
     StreetName = models.TextField()
     leisure = models.CharField(max_length=20, choices=LEISURE_CHOICES, default='pitch')
@@ -24,9 +39,168 @@ class Venue(models.Model):
    
     price_per_hour = models.IntegerField(default=250000, help_text="Price per hour in IDR (e.g. 250000)")
 
+    latitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)])
+    longitude = models.FloatField(null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)])
+    # grid bucket of (latitude, longitude) for nearby queries, see main/geo.py
+    geo_cell = models.IntegerField(null=True, blank=True, editable=False, db_index=True)
+
+    # Review aggregates, kept in step by review.models.Review on create/edit/delete.
+    # Rebuild with `python manage.py rebuild_venue_ratings`.
+    review_count = models.PositiveIntegerField(default=0)
+    accessibility_sum = models.PositiveIntegerField(default=0)
+    facility_sum = models.PositiveIntegerField(default=0)
+    value_for_money_sum = models.PositiveIntegerField(default=0)
+    accessibility_avg = models.FloatField(default=0)
+    facility_avg = models.FloatField(default=0)
+    value_for_money_avg = models.FloatField(default=0)
+    rating_avg = models.FloatField(default=0, help_text="Mean of the three criteria over all reviews")
+    rating_score = models.FloatField(default=prior_rating_score, help_text="Bayesian-weighted rating used for rankings")
+
+    RATING_CRITERIA = ("accessibility", "facility", "value_for_money")
+    # moved only by apply_review_delta and rebuild_venue_ratings; save() of a
+    # loaded venue leaves them alone so it cannot undo a concurrent review
+    AGGREGATE_FIELDS = frozenset({
+        "review_count", "accessibility_sum", "facility_sum", "value_for_money_sum",
+        "accessibility_avg", "facility_avg", "value_for_money_avg", "rating_avg", "rating_score",
+    })
+
+    class Meta:
+        indexes = [
+            # keyset pagination of the venue list, one per sort order
+            models.Index(fields=["name", "id"], name="main_venue_name_id_idx"),
+            models.Index(fields=["rating_score", "id"], name="main_venue_score_id_idx"),
+            models.Index(fields=["rating_avg", "id"], name="main_venue_rating_id_idx"),
+            models.Index(fields=["review_count", "id"], name="main_venue_reviews_id_idx"),
+            models.Index(fields=["price_per_hour", "id"], name="main_venue_price_id_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.geo_cell = cell_for(self.latitude, self.longitude)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"latitude", "longitude"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "geo_cell"}
+        elif update_fields is None and not self._state.adding and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.AGGREGATE_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def rating_aggregate_expressions():
+        """
+        Update kwargs recomputing every *_avg column and rating_score from the
+        stored sums. rating_score is the Bayesian average
+            (m * C + n * rating_avg) / (m + n)
+        with prior mean C and weight m from settings, so a venue with a couple
+        of perfect reviews does not outrank one with hundreds of good ones.
+        """
+        def mean(total, divisor=1):
+            return Case(
+                When(review_count=0, then=Value(0.0)),
+                default=Cast(total, FloatField()) / (F("review_count") * divisor),
+                output_field=FloatField(),
+            )
+
+        total = F("accessibility_sum") + F("facility_sum") + F("value_for_money_sum")
+        prior_mean = float(settings.VENUE_RATING_PRIOR_MEAN)
+        prior_weight = float(settings.VENUE_RATING_PRIOR_WEIGHT)
+
+        values = {f"{c}_avg": mean(F(f"{c}_sum")) for c in Venue.RATING_CRITERIA}
+        values["rating_avg"] = mean(total, 3)
+        values["rating_score"] = (
+            (Value(prior_weight * prior_mean) + Cast(total, FloatField()) / Value(3.0))
+            / (Value(prior_weight) + F("review_count"))
+        )
+        return values
+
+    @classmethod
+    def apply_review_delta(cls, venue_id, count, accessibility, facility, value_for_money):
+        """Add (or with negative numbers, remove) reviews from the aggregates"""
+        rows = cls.objects.filter(pk=venue_id)
+        with transaction.atomic():
+            rows.update(
+                review_count=F("review_count") + count,
+                accessibility_sum=F("accessibility_sum") + accessibility,
+                facility_sum=F("facility_sum") + facility,
+                value_for_money_sum=F("value_for_money_sum") + value_for_money,
+            )
+            rows.update(**cls.rating_aggregate_expressions())
+
+
+# Hourly occupancy bitmap
+class VenueOccupancy(models.Model):
+    """
+    One row per (venue, date). Bit h of ``mask`` is set while the slot
+    h:00-(h+1):00 is held by an active booking, so checking any duration
+    is one indexed read plus a bitwise AND.
+    """
+    FULL_DAY = (1 << 24) - 1
+
+    venue = models.ForeignKey(Venue, on_delete=models.CASCADE, related_name='occupancy')
+    date = models.DateField()
+    mask = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ("venue", "date")
+
+    def __str__(self):
+        return f"{self.venue_id} {self.date} {self.mask:024b}"
+
+    @staticmethod
+    def hours_mask(start_hour, duration):
+        """Bitmask of the hours start_hour .. start_hour+duration-1 (mod 24)"""
+        mask = 0
+        for h in range(start_hour, start_hour + duration):
+            mask |= 1 << (h % 24)
+        return mask
+
+    @staticmethod
+    def mask_hours(mask):
+        return [h for h in range(24) if mask >> h & 1]
+
+    @classmethod
+    def busy_mask(cls, venue, date):
+        return cls.objects.filter(venue=venue, date=date).values_list("mask", flat=True).first() or 0
+
+    @classmethod
+    def blocked_hours(cls, venue, date, start_hour, duration):
+        """Hours of the requested range that are already taken"""
+        return cls.mask_hours(cls.busy_mask(venue, date) & cls.hours_mask(start_hour, duration))
+
+    @classmethod
+    def occupy(cls, venue_id, date, mask):
+        if not mask:
+            return
+        rows = cls.objects.filter(venue_id=venue_id, date=date)
+        if rows.update(mask=F("mask").bitor(mask)):
+            return
+        _, created = cls.objects.get_or_create(venue_id=venue_id, date=date, defaults={"mask": mask})
+        if not created:
+            rows.update(mask=F("mask").bitor(mask))
+
+    @classmethod
+    def claim(cls, venue_id, date, mask):
+        """
+        Set ``mask`` only if none of its hours are taken yet. The check and the
+        write are one conditional UPDATE, so concurrent claims cannot both win.
+        Returns False on conflict.
+        """
+        free = cls.objects.filter(Exact(F("mask").bitand(mask), 0), venue_id=venue_id, date=date)
+        if free.update(mask=F("mask").bitor(mask)):
+            return True
+        _, created = cls.objects.get_or_create(venue_id=venue_id, date=date, defaults={"mask": mask})
+        return created or bool(free.update(mask=F("mask").bitor(mask)))
+
+    @classmethod
+    def release(cls, venue_id, date, mask):
+        if not mask:
+            return
+        cls.objects.filter(venue_id=venue_id, date=date).update(mask=F("mask").bitand(cls.FULL_DAY ^ mask))
+
 
 # Booking
 class Booking(models.Model):
@@ -57,9 +231,19 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
 
 
+    # fields that decide which hour bits a booking holds
+    SLOT_FIELDS = {"venue_id", "date", "start_time", "duration_hours", "status"}
+
     class Meta:
-        unique_together = ("venue", "date", "start_time", "end_time")
         ordering = ['-date', 'start_time']
+        constraints = [
+            # cancelled bookings free their slot, so only active ones must be unique
+            models.UniqueConstraint(
+                fields=["venue", "date", "start_time", "end_time"],
+                condition=~Q(status="CANCELLED"),
+                name="uq_active_booking_slot",
+            ),
+        ]
 
     def __str__(self):
         return f"{self.venue.name} - {self.date} {self.start_time}-{self.end_time} by {self.user.username}"
@@ -69,6 +253,31 @@ class Booking(models.Model):
         price = getattr(self.venue, 'price_per_hour', 0) or 0
         return int(price * self.duration_hours)
 
+    def occupancy_mask(self):
+        """Hour bits held by this booking; cancelled bookings hold none"""
+        if self.status == "CANCELLED" or self.start_time is None:
+            return 0
+        return VenueOccupancy.hours_mask(self.start_time.hour, self.duration_hours)
+
+    def _slot(self):
+        return (self.venue_id, self.date, self.occupancy_mask())
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember what is stored so save()/delete can move the occupancy bits
+        if not instance.get_deferred_fields() & cls.SLOT_FIELDS:
+            instance._stored_slot = instance._slot()
+        return instance
+
+    def _load_stored_slot(self):
+        if self._state.adding:
+            return None
+        if not hasattr(self, "_stored_slot"):
+            stored = Booking.objects.only("venue", "date", "start_time", "duration_hours", "status").get(pk=self.pk)
+            self._stored_slot = stored._slot()
+        return self._stored_slot
+
     def save(self, *args, **kwargs):
         # ensure total_price and end_time will be set if start_time and duration present
         if self.start_time and self.duration_hours:
@@ -80,4 +289,19 @@ class Booking(models.Model):
         # compute price
         if self.venue:
             self.total_price = self.compute_total_price()
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            old = self._load_stored_slot()
+            super().save(*args, **kwargs)
+            new = self._slot()
+            if old != new:
+                if old:
+                    VenueOccupancy.release(*old)
+                VenueOccupancy.occupy(*new)
+            self._stored_slot = new
+
+
+@receiver(post_delete, sender=Booking)
+def release_booking_hours(sender, instance, **kwargs):
+    """Free the hour bits of deleted bookings, including cascaded deletes"""
+    slot = getattr(instance, "_stored_slot", None) or instance._slot()
+    VenueOccupancy.release(*slot)
@@ -0,0 +1,34 @@
+from django.db import IntegrityError, transaction
+
+from main.models import VenueOccupancy
+
+
+class SlotConflict(Exception):
+    """Raised when some of the requested hours are already booked"""
+
+    def __init__(self, date, hours):
+        self.date = date
+        self.hours = hours
+        slots = ", ".join(f"{h:02d}:00-{(h+1)%24:02d}:00" for h in hours)
+        super().__init__(f"These hour slots are already booked for {date}: {slots}.")
+
+
+def reserve_booking(form, venue, user):
+    """
+    Claim every hour slot of a valid BookingForm and insert the booking in one
+    transaction. Either the whole range is booked or SlotConflict is raised;
+    nothing is left half-claimed.
+    """
+    start_hour = int(form.cleaned_data['start_hour'])
+    duration = int(form.cleaned_data['duration_hours'])
+    d = form.cleaned_data['date']
+    mask = VenueOccupancy.hours_mask(start_hour, duration)
+
+    try:
+        with transaction.atomic():
+            if not VenueOccupancy.claim(venue.pk, d, mask):
+                raise SlotConflict(d, VenueOccupancy.blocked_hours(venue, d, start_hour, duration))
+            return form.save(venue=venue, user=user, commit=True)
+    except IntegrityError:
+        # rows written outside the occupancy index (e.g. admin) still hit the unique constraint
+        raise SlotConflict(d, VenueOccupancy.blocked_hours(venue, d, start_hour, duration))
@@ -0,0 +1,111 @@
+"""
+Venue search over name, StreetName and CityName.
+
+Matching is case-insensitive substring matching, one term at a time, with
+every term required. It is index-backed on both backends:
+- SQLite: an FTS5 table with the trigram tokenizer (main_venue_fts), kept
+  in sync with main_venue by triggers. FTS5 rows are addressed by integer
+  rowid and main_venue's own rowid is not stable (VACUUM may renumber it),
+  so main_venue_fts_key gives each venue id a rowid of its own;
+- PostgreSQL: pg_trgm GIN indexes, which serve the plain icontains lookups.
+Terms shorter than three characters cannot use a trigram index and fall
+back to icontains.
+"""
+from django.db import connection, connections, transaction, DatabaseError
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_FIELDS = ("name", "StreetName", "CityName")
+MIN_INDEXED_TERM = 3
+
+
+def _fts_phrase(term):
+    return '"%s"' % term.replace('"', '""')
+
+
+def _contains(term):
+    q = Q()
+    for field in SEARCH_FIELDS:
+        q |= Q(**{f"{field}__icontains": term})
+    return q
+
+
+def search_venues(queryset, text):
+    terms = (text or "").split()
+    if not terms:
+        return queryset
+
+    indexed = [t for t in terms if len(t) >= MIN_INDEXED_TERM]
+    if connection.vendor == "sqlite" and indexed:
+        match = " AND ".join(_fts_phrase(t) for t in indexed)
+        queryset = queryset.filter(pk__in=RawSQL(
+            "SELECT venue_id FROM main_venue_fts_key WHERE rowid IN "
+            "(SELECT rowid FROM main_venue_fts WHERE main_venue_fts MATCH %s)",
+            [match],
+        ))
+        terms = [t for t in terms if len(t) < MIN_INDEXED_TERM]
+
+    for term in terms:
+        queryset = queryset.filter(_contains(term))
+    return queryset
+
+
+_KEY = "(SELECT rowid FROM main_venue_fts_key WHERE venue_id = %s.id)"
+
+SQLITE_INDEX = [
+    # INTEGER PRIMARY KEY: an alias for rowid, which VACUUM keeps
+    "CREATE TABLE IF NOT EXISTS main_venue_fts_key (rowid INTEGER PRIMARY KEY, venue_id char(32) NOT NULL UNIQUE)",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS main_venue_fts USING fts5(name, StreetName, CityName, tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS main_venue_fts_ai AFTER INSERT ON main_venue BEGIN "
+    "INSERT INTO main_venue_fts_key(venue_id) VALUES (new.id); "
+    "INSERT INTO main_venue_fts(rowid, name, StreetName, CityName) "
+    f"VALUES ({_KEY % 'new'}, new.name, new.StreetName, new.CityName); END",
+    "CREATE TRIGGER IF NOT EXISTS main_venue_fts_ad AFTER DELETE ON main_venue BEGIN "
+    f"DELETE FROM main_venue_fts WHERE rowid = {_KEY % 'old'}; "
+    "DELETE FROM main_venue_fts_key WHERE venue_id = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS main_venue_fts_au AFTER UPDATE OF name, StreetName, CityName ON main_venue BEGIN "
+    "UPDATE main_venue_fts SET name = new.name, StreetName = new.StreetName, CityName = new.CityName "
+    f"WHERE rowid = {_KEY % 'old'}; END",
+    # rebuild: rows may have changed while the triggers were missing
+    "DELETE FROM main_venue_fts",
+    "DELETE FROM main_venue_fts_key",
+    "INSERT INTO main_venue_fts_key(venue_id) SELECT id FROM main_venue",
+    "INSERT INTO main_venue_fts(rowid, name, StreetName, CityName) "
+    "SELECT k.rowid, v.name, v.StreetName, v.CityName "
+    "FROM main_venue v JOIN main_venue_fts_key k ON k.venue_id = v.id",
+]
+
+POSTGRES_INDEX = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+] + [
+    f'CREATE INDEX IF NOT EXISTS main_venue_{field.lower()}_trgm ON main_venue USING gin ("{field}" gin_trgm_ops)'
+    for field in SEARCH_FIELDS
+]
+
+
+def install_search_index(using="default", **kwargs):
+    """
+    post_migrate hook. SQLite drops triggers whenever a migration rebuilds
+    main_venue, so the index is (re)installed and rebuilt after every migrate.
+    """
+    conn = connections[using]
+    with conn.cursor() as cursor:
+        if "main_venue" not in conn.introspection.table_names(cursor):
+            return  # main not migrated yet, or migrated back to zero
+        if conn.vendor == "sqlite":
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'main_venue_fts_%'"
+            )
+            if cursor.fetchone()[0] == 3:
+                return
+            with transaction.atomic(using=using):
+                for statement in SQLITE_INDEX:
+                    cursor.execute(statement)
+        elif conn.vendor == "postgresql":
+            try:
+                with transaction.atomic(using=using):
+                    for statement in POSTGRES_INDEX:
+                        cursor.execute(statement)
+            except DatabaseError:
+                # no privilege to create the extension: icontains still works, unindexed
+                pass
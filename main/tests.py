@@ -1,3 +1,781 @@
-from django.test import TestCase
+import datetime
+import json
+import io
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import skipIf
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core import serializers
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from main.exports import stream_serialized
+from main.forms import BookingForm
+from main.geo import cell_for, cell_ranges, haversine_km
+from main import image_cache
+from main.image_cache import Image
+from main.models import Venue, Booking, VenueOccupancy
+from main.reservations import reserve_booking, SlotConflict
+from main.search import search_venues
+from review.models import Review
+from velp.cache import LocalLRU, tiered, value_size
+from velp.pagination import encode_cursor
+
+
+def booking_form(d, start_hour, duration):
+    form = BookingForm({
+        "date": d.isoformat(),
+        "start_hour": str(start_hour),
+        "duration_hours": duration,
+        "payment_method": "CASH",
+    })
+    assert form.is_valid(), form.errors
+    return form
+
+
+class BookingOccupancyTests(TestCase):
+    """Booking.save and the post_delete receiver keep VenueOccupancy in step"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="booker", password="pw")
+        self.venue = Venue.objects.create(name="Lapangan A", CityName="DKI Jakarta", StreetName="Jalan A")
+        self.day = datetime.date.today() + datetime.timedelta(days=7)
+
+    def book(self, start_hour, duration, day=None):
+        return Booking.objects.create(
+            user=self.user, venue=self.venue, date=day or self.day,
+            start_time=datetime.time(start_hour), duration_hours=duration,
+        )
+
+    def test_save_sets_the_hour_bits(self):
+        self.book(9, 2)
+        self.book(14, 1)
+        self.assertEqual(VenueOccupancy.mask_hours(VenueOccupancy.busy_mask(self.venue, self.day)), [9, 10, 14])
+
+    def test_moving_a_booking_moves_its_bits(self):
+        booking = self.book(9, 2)
+        booking.start_time = datetime.time(16)
+        booking.save()
+        self.assertEqual(VenueOccupancy.mask_hours(VenueOccupancy.busy_mask(self.venue, self.day)), [16, 17])
+
+        later = self.day + datetime.timedelta(days=1)
+        booking = Booking.objects.get(pk=booking.pk)
+        booking.date = later
+        booking.save()
+        self.assertEqual(VenueOccupancy.busy_mask(self.venue, self.day), 0)
+        self.assertEqual(VenueOccupancy.mask_hours(VenueOccupancy.busy_mask(self.venue, later)), [16, 17])
+
+    def test_cancel_and_delete_release_only_their_own_bits(self):
+        keep = self.book(8, 1)
+        cancelled = self.book(10, 2)
+        cancelled.status = "CANCELLED"
+        cancelled.save()
+        self.assertEqual(VenueOccupancy.busy_mask(self.venue, self.day), keep.occupancy_mask())
+
+        gone = self.book(12, 1)
+        Booking.objects.filter(pk=gone.pk).delete()
+        self.assertEqual(VenueOccupancy.busy_mask(self.venue, self.day), keep.occupancy_mask())
+
+
+class AvailabilityTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="booker", password="pw")
+        self.venue = Venue.objects.create(name="Lapangan A", CityName="DKI Jakarta", StreetName="Jalan A")
+        self.day = datetime.date.today() + datetime.timedelta(days=2)
+        self.url = reverse("main:venue_availability")
+
+    def test_matrix_and_etag(self):
+        reserve_booking(booking_form(self.day, 10, 2), self.venue, self.user)
+        resp = self.client.get(self.url, {"venue": str(self.venue.pk), "days": 3})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json()["venues"][str(self.venue.pk)], [0, 0, 0b11 << 10])
+        again = self.client.get(self.url, {"venue": str(self.venue.pk), "days": 3}, HTTP_IF_NONE_MATCH=resp["ETag"])
+        self.assertEqual(again.status_code, 304)
+
+    def test_bad_and_unknown_venues(self):
+        self.assertEqual(self.client.get(self.url, {"venue": "nope"}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {"venue": str(self.venue.pk), "days": 0}).status_code, 400)
+        unknown = "00000000-0000-4000-8000-000000000000"
+        resp = self.client.get(self.url, {"venue": f"{self.venue.pk},{unknown}"})
+        self.assertEqual(resp.status_code, 404)
+
+
+class VenueListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="lister", password="pw")
+        self.names = [f"Lapangan {c}" for c in "ABCDE"]
+        for i, name in enumerate(self.names):
+            Venue.objects.create(name=name, CityName="DKI Jakarta", StreetName=f"Jalan {i}", price_per_hour=i * 10)
+        Venue.objects.create(name=None, CityName="Bandung", StreetName="Jalan Tanpa Nama")
+        self.url = reverse("main:api_venue_list")
+
+    def walk(self, **params):
+        seen, cursor = [], None
+        while True:
+            resp = self.client.get(self.url, {**params, "size": 2, **({"cursor": cursor} if cursor else {})})
+            self.assertEqual(resp.status_code, 200)
+            body = resp.json()
+            seen += [v["name"] for v in body["venues"]]
+            cursor = body["next"]
+            if not cursor:
+                return seen
+
+    def test_pages_cover_every_venue_once(self):
+        by_name = self.walk()
+        self.assertEqual([n for n in by_name if n], self.names)
+        self.assertEqual(len(by_name), 6)
+        self.assertIn(None, by_name)
+        self.assertEqual(self.walk(sort="price")[:3], ["Lapangan A", "Lapangan B", "Lapangan C"])
+
+    def test_prev_cursor_returns_the_previous_page(self):
+        first = self.client.get(self.url, {"size": 2, "sort": "price"}).json()
+        second = self.client.get(self.url, {"size": 2, "sort": "price", "cursor": first["next"]}).json()
+        back = self.client.get(self.url, {"size": 2, "sort": "price", "cursor": second["prev"]}).json()
+        self.assertEqual(back["venues"], first["venues"])
+
+    def test_malformed_cursors_are_400(self):
+        for values in (["zzz", "not-a-uuid"], ["a", {"x": 1}], ["a"], [None, None]):
+            resp = self.client.get(self.url, {"cursor": encode_cursor(values)})
+            self.assertEqual(resp.status_code, 400, values)
+        resp = self.client.get(self.url, {"sort": "price", "cursor": encode_cursor(["cheap", str(Venue.objects.first().pk)])})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_html_list_pages(self):
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse("main:show_main"), {"q": "lapangan"})
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual([v.name for v in resp.context["venue_list"]], self.names)
+        resp = self.client.get(reverse("main:show_main"), {"cursor": encode_cursor(["zzz", "not-a-uuid"])})
+        self.assertRedirects(resp, reverse("main:show_main"), fetch_redirect_response=False)
+
+    def test_search_follows_inserts_updates_and_deletes(self):
+        def found(text):
+            return sorted(filter(None, search_venues(Venue.objects.all(), text).values_list("name", flat=True)))
+
+        self.assertEqual(found("pangan c"), ["Lapangan C"])
+        self.assertEqual(found("jakarta jalan 4"), ["Lapangan E"])
+        venue = Venue.objects.get(name="Lapangan C")
+        venue.name = "Stadion Utama"
+        venue.save()
+        self.assertEqual(found("pangan c"), [])
+        self.assertEqual(found("utama"), ["Stadion Utama"])
+        venue.delete()
+        self.assertEqual(found("utama"), [])
+        self.assertEqual(len(self.walk(q="lapangan")), 4)
+
+
+class VenueRankingTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username="ranker", password="pw")
+        profiles = {
+            "Crowd favourite": [(5, 4, 5), (4, 5, 4)] * 10,
+            "Two perfect": [(5, 5, 5)] * 2,
+            "Unreviewed": [],
+            "One bad": [(1, 1, 1)],
+        }
+        for name, reviews in profiles.items():
+            venue = Venue.objects.create(name=name, CityName="DKI Jakarta", StreetName=name)
+            for a, f, v in reviews:
+                Review.objects.create(user=user, venue=venue, accessibility=a, facility=f, value_for_money=v)
+
+    def ranking(self, sort):
+        resp = self.client.get(reverse("main:api_venue_list"), {"sort": sort})
+        self.assertEqual(resp.status_code, 200)
+        return [(v["name"], v["rating_score"]) for v in resp.json()["venues"]]
+
+    def test_bayesian_score_order(self):
+        # (5 * 3.0 + n * mean) / (5 + n)
+        self.assertEqual(self.ranking("top"), [
+            ("Crowd favourite", round((15 + 20 * 4.5) / 25, 3)),
+            ("Two perfect", round((15 + 10) / 7, 3)),
+            ("Unreviewed", 3.0),
+            ("One bad", round(16 / 6, 3)),
+        ])
+        self.assertEqual([name for name, _ in self.ranking("rating")][:2], ["Two perfect", "Crowd favourite"])
+        self.assertEqual([name for name, _ in self.ranking("reviews")][:2], ["Crowd favourite", "Two perfect"])
+
+    @override_settings(VENUE_RATING_PRIOR_WEIGHT=0.5)
+    def test_rebuild_follows_the_prior_settings(self):
+        call_command("rebuild_venue_ratings", stdout=io.StringIO())
+        # a weak prior lets two perfect reviews win
+        self.assertEqual(self.ranking("top")[0], ("Two perfect", round((1.5 + 10) / 2.5, 3)))
+
+
+class VenueRatingMigrationTests(TransactionTestCase):
+    before = [("main", "0004_venue_rating_aggregates"), ("review", "0001_initial")]
+
+    def test_existing_reviews_are_scored(self):
+        executor = MigrationExecutor(connection)
+        executor.migrate(self.before)
+        old_apps = executor.loader.project_state(self.before).apps
+        OldVenue = old_apps.get_model("main", "Venue")
+        OldReview = old_apps.get_model("review", "Review")
+        user = old_apps.get_model("auth", "User").objects.create(username="old-reviewer")
+        reviewed = OldVenue.objects.create(name="Old", CityName="x", StreetName="x")
+        OldVenue.objects.create(name="Empty", CityName="x", StreetName="x")
+        for _ in range(4):
+            OldReview.objects.create(user=user, venue=reviewed, accessibility=5, facility=4, value_for_money=3)
+
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+        scores = dict(Venue.objects.values_list("name", "rating_score"))
+        self.assertAlmostEqual(scores["Old"], (5 * 3.0 + 48 / 3) / 9)
+        self.assertAlmostEqual(scores["Empty"], 3.0)
+
+
+class PopulateVenuesTests(TestCase):
+    header = "@id,CityName,StreetName,leisure,name,@lat,@lon\n"
+
+    def setUp(self):
+        User.objects.create_user(username="ADMIN", password="pw")
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+
+    def csv(self, *rows):
+        path = f"{self.dir}/venues.csv"
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.header + "".join(row + "\n" for row in rows))
+        return path
+
+    def populate(self, path, *args):
+        out = io.StringIO()
+        call_command("populate_venues", f"--file={path}", *args, stdout=out)
+        return out.getvalue()
+
+    def test_second_run_changes_nothing(self):
+        path = self.csv(
+            "node/1,DKI Jakarta,Jalan A,pitch,Lapangan A,-6.2,106.8",
+            "node/2,DKI Jakarta,Jalan B,golf,Lapangan B,,",
+            ",DKI Jakarta,Jalan C,pitch,No id,-6.2,106.8",
+        )
+        self.assertIn("Inserted 2, updated 0, unchanged 0, skipped 1.", self.populate(path))
+        venue = Venue.objects.get(osm_id="node/2")
+        self.assertEqual((venue.leisure, venue.latitude, venue.geo_cell), ("pitch", None, None))
+        self.assertIsNotNone(Venue.objects.get(osm_id="node/1").geo_cell)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.assertIn("Inserted 0, updated 0, unchanged 2, skipped 1.", self.populate(path))
+        self.assertFalse([q for q in queries if q["sql"].startswith(("INSERT", "UPDATE"))])
+        self.assertEqual(Venue.objects.count(), 2)
+
+    def test_update_keeps_the_venue_and_its_reviews(self):
+        self.populate(self.csv("node/1,DKI Jakarta,Jalan A,pitch,Lapangan A,-6.2,106.8"))
+        venue = Venue.objects.get(osm_id="node/1")
+        Review.objects.create(user=User.objects.get(), venue=venue, accessibility=5, facility=5, value_for_money=5)
+
+        out = self.populate(self.csv("node/1,Bandung,Jalan A,stadium,Lapangan A,-6.9,107.6"))
+        self.assertIn("updated 1", out)
+        venue.refresh_from_db()
+        self.assertEqual((venue.CityName, venue.leisure, venue.review_count), ("Bandung", "stadium", 1))
+        self.assertEqual(search_venues(Venue.objects.all(), "bandung").get(), venue)
+
+    def test_orphans_are_adopted_by_name(self):
+        orphan = Venue.objects.create(name="Lapangan A", CityName="DKI Jakarta", StreetName="Jalan Lama")
+        self.populate(self.csv(
+            "node/1,DKI Jakarta,Jalan A,pitch,Lapangan A,-6.2,106.8",
+            "node/2,DKI Jakarta,Jalan A2,pitch,Lapangan A,-6.2,106.8",
+        ))
+        orphan.refresh_from_db()
+        self.assertEqual((orphan.osm_id, orphan.StreetName), ("node/1", "Jalan A"))
+        self.assertEqual(Venue.objects.count(), 2)
+
+    def test_dry_run_and_diff(self):
+        self.populate(self.csv("node/1,DKI Jakarta,Jalan A,pitch,Lapangan A,-6.2,106.8"))
+        path = self.csv(
+            "node/1,DKI Jakarta,Jalan Baru,pitch,Lapangan A,-6.2,106.8",
+            "node/2,DKI Jakarta,Jalan B,pitch,Lapangan B,-6.2,106.8",
+        )
+        out = self.populate(path, "--dry-run", "--diff")
+        self.assertIn("[dry run] Inserted 1, updated 1, unchanged 0, skipped 0.", out)
+        self.assertIn("+ node/2 Lapangan B", out)
+        self.assertIn("~ node/1 Lapangan A\n    StreetName: 'Jalan A' -> 'Jalan Baru'", out)
+        self.assertEqual(list(Venue.objects.values_list("osm_id", "StreetName")), [("node/1", "Jalan A")])
+
+    def test_missing_file(self):
+        with self.assertRaises(CommandError):
+            self.populate(f"{self.dir}/nope.csv")
+
+
+class GeoTests(TestCase):
+    def test_cell_ranges_cover_the_circle(self):
+        for lat, lon in [(-6.2, 106.8), (0.0, 179.995), (89.99, 10.0)]:
+            ranges = cell_ranges(lat, lon, 2)
+            for dlat, dlon in [(0, 0), (0.015, 0), (-0.015, 0.005), (0, 0.0149)]:
+                cell = cell_for(lat + dlat, (lon + dlon + 180) % 360 - 180)
+                self.assertTrue(any(first <= cell <= last for first, last in ranges), (lat, lon, dlat, dlon))
+
+    def test_strings_are_coerced(self):
+        self.assertEqual(cell_for("-6.2", "106.8"), cell_for(-6.2, 106.8))
+        self.assertIsNone(cell_for(None, 106.8))
+        venue = Venue(latitude="-6.2", longitude="106.8", CityName="x", StreetName="x")
+        venue.save()
+        self.assertEqual(venue.geo_cell, cell_for(-6.2, 106.8))
+        self.assertAlmostEqual(haversine_km(-6.2, 106.8, -6.2, 106.9), 11.05, places=2)
+
+    def test_flutter_views_check_coordinates(self):
+        self.client.force_login(User.objects.create_user(username="mapper", password="pw"))
+        resp = self.client.post("/create-venue-flutter/", {"name": "A", "CityName": "x", "StreetName": "x",
+                                                           "latitude": "-6.2", "longitude": "106.8"},
+                                content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        venue = Venue.objects.get(name="A")
+        self.assertEqual((venue.latitude, venue.geo_cell), (-6.2, cell_for(-6.2, 106.8)))
+
+        for lat, lon in [("abc", "106.8"), (91, 0), ({"x": 1}, 0)]:
+            resp = self.client.post("/create-venue-flutter/", {"name": "B", "latitude": lat, "longitude": lon},
+                                    content_type="application/json")
+            self.assertEqual(resp.status_code, 400, (lat, lon))
+        resp = self.client.post(f"/update-venue-flutter/{venue.pk}/", {"latitude": "oops"},
+                                content_type="application/json")
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post(f"/update-venue-flutter/{venue.pk}/", {"longitude": "107"},
+                                content_type="application/json")
+        venue.refresh_from_db()
+        self.assertEqual((venue.longitude, venue.geo_cell), (107.0, cell_for(-6.2, 107)))
+
+
+class NearbyTests(TestCase):
+    def setUp(self):
+        self.url = reverse("main:api_venue_nearby")
+        user = User.objects.create_user(username="nearby", password="pw")
+        # about 0.55 km apart on one parallel
+        for i in range(8):
+            Venue.objects.create(name=f"V{i}", CityName="x", StreetName="x", latitude=-6.2,
+                                 longitude=106.8 + i * 0.005, leisure="stadium" if i % 2 else "pitch")
+        Venue.objects.create(name="Far", CityName="x", StreetName="x", latitude=-6.5, longitude=106.8)
+        Venue.objects.create(name="Nowhere", CityName="x", StreetName="x")
+        Review.objects.create(user=user, venue=Venue.objects.get(name="V5"),
+                              accessibility=5, facility=5, value_for_money=5)
+
+    def nearby(self, **params):
+        resp = self.client.get(self.url, {"lat": -6.2, "lon": 106.8, **params})
+        self.assertEqual(resp.status_code, 200)
+        return [v["name"] for v in resp.json()["venues"]]
+
+    def test_nearest_first_within_the_radius(self):
+        self.assertEqual(self.nearby(radius=10), [f"V{i}" for i in range(8)])
+        self.assertEqual(self.nearby(radius=1.2), ["V0", "V1", "V2"])
+        self.assertEqual(self.nearby(k=2), ["V0", "V1"])
+        self.assertEqual(self.nearby(filter="stadium", k=2), ["V1", "V3"])
+        self.assertEqual(self.nearby(radius=50)[-1], "Far")
+
+    def test_top_ranks_by_score_then_distance(self):
+        self.assertEqual(self.nearby(sort="top", k=3), ["V5", "V0", "V1"])
+        self.assertEqual(self.nearby(sort="top", radius=1.2), ["V0", "V1", "V2"])
+
+    def test_reads_are_bounded(self):
+        with self.assertNumQueries(2):
+            self.nearby(k=1)
+        with patch("main.views.NEARBY_MAX_CANDIDATES", 3):
+            self.assertEqual(len(self.nearby(radius=10)), 3)
+
+    def test_bad_parameters_are_400(self):
+        for params in ({}, {"lat": "x", "lon": 1}, {"lat": 91, "lon": 0}, {"lat": 0, "lon": 0, "radius": 51},
+                       {"lat": 0, "lon": 0, "k": 0}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+
+class OccupancyTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="booker", password="pw")
+        self.venue = Venue.objects.create(name="Lapangan A", CityName="DKI Jakarta", StreetName="Jalan A")
+        self.day = datetime.date.today() + datetime.timedelta(days=7)
+
+    def test_multi_hour_booking_blocks_later_hours(self):
+        reserve_booking(booking_form(self.day, 10, 3), self.venue, self.user)
+        with self.assertRaises(SlotConflict) as ctx:
+            reserve_booking(booking_form(self.day, 12, 2), self.venue, self.user)
+        self.assertEqual(ctx.exception.hours, [12])
+        reserve_booking(booking_form(self.day, 13, 1), self.venue, self.user)
+
+    def test_cancel_and_delete_free_the_slot(self):
+        booking = reserve_booking(booking_form(self.day, 18, 2), self.venue, self.user)
+        booking.status = "CANCELLED"
+        booking.save()
+        self.assertEqual(VenueOccupancy.busy_mask(self.venue, self.day), 0)
+
+        again = reserve_booking(booking_form(self.day, 18, 2), self.venue, self.user)
+        again.delete()
+        self.assertEqual(VenueOccupancy.busy_mask(self.venue, self.day), 0)
+
+    def test_ajax_conflict_is_409(self):
+        reserve_booking(booking_form(self.day, 8, 1), self.venue, self.user)
+        self.client.force_login(self.user)
+        resp = self.client.post(
+            reverse("main:create_booking_ajax", args=[self.venue.pk]),
+            {"date": self.day.isoformat(), "start_hour": "8", "duration_hours": 1, "payment_method": "CASH"},
+        )
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.json()["blocked_hours"], [8])
+
+
+class ConcurrentReservationTests(TransactionTestCase):
+    ATTEMPTS = 200
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="booker", password="pw")
+        self.venue = Venue.objects.create(name="Lapangan A", CityName="DKI Jakarta", StreetName="Jalan A")
+        self.day = datetime.date.today() + datetime.timedelta(days=7)
+
+    def _attempt(self, i):
+        try:
+            # overlapping ranges that all contain 20:00
+            reserve_booking(booking_form(self.day, 20 - i % 3, 1 + i % 3), self.venue, self.user)
+            return True
+        except SlotConflict:
+            return False
+        finally:
+            connection.close()
+
+    def test_only_one_reservation_wins(self):
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            results = list(pool.map(self._attempt, range(self.ATTEMPTS)))
+
+        self.assertEqual(results.count(True), 1)
+        booking = Booking.objects.get(venue=self.venue, date=self.day)
+        self.assertEqual(VenueOccupancy.busy_mask(self.venue, self.day), booking.occupancy_mask())
+
+
+class ImageStubHandler(BaseHTTPRequestHandler):
+    """Serves a PNG (tagged with the request path) and counts full and conditional GETs"""
+    body = b""
+    hits = {"full": 0, "conditional": 0}
+
+    def do_GET(self):
+        if self.path == "/missing.png":
+            self.send_response(404)
+            self.end_headers()
+            return
+        if self.path == "/drip.png":
+            self.send_response(200)
+            self.end_headers()
+            try:
+                for _ in range(5):
+                    self.wfile.write(b"x" * 70000)
+                    self.wfile.flush()
+                    time.sleep(0.1)
+            except ConnectionError:  # the proxy gave up, as it should
+                pass
+            return
+        if self.headers.get("If-None-Match") == '"v1"':
+            self.hits["conditional"] += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.hits["full"] += 1
+        body = self.body + self.path.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("ETag", '"v1"')
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def png_bytes(size=64):
+    if Image is None:
+        return b"\x89PNG fake image bytes"
+    out = io.BytesIO()
+    Image.new("RGB", (size, size), "green").save(out, format="PNG")
+    return out.getvalue()
+
+
+class ImageProxyTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        ImageStubHandler.body = png_bytes()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), ImageStubHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        cls.url = cls.base_url + "/pic.png"
+        cls.image = ImageStubHandler.body + b"/pic.png"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir, ignore_errors=True)
+        ImageStubHandler.hits.update(full=0, conditional=0)
+
+    def get(self, url=None, **params):
+        with self.settings(IMAGE_CACHE_DIR=self.cache_dir):
+            resp = self.client.get(reverse("main:proxy_image"), {"url": url or self.url, **params})
+        body = b"".join(resp.streaming_content) if resp.streaming else resp.content
+        return resp, body
+
+    def test_second_request_is_served_from_disk(self):
+        first, body = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(body, self.image)
+        second, body = self.get()
+        self.assertEqual(body, self.image)
+        self.assertEqual(ImageStubHandler.hits, {"full": 1, "conditional": 0})
+
+    def test_stale_entry_is_revalidated_with_etag(self):
+        self.get()
+        with self.settings(IMAGE_CACHE_MAX_AGE=0):
+            resp, body = self.get()
+        self.assertEqual(body, self.image)
+        self.assertEqual(ImageStubHandler.hits, {"full": 1, "conditional": 1})
+
+    def test_client_etag_gets_304(self):
+        first, _ = self.get()
+        with self.settings(IMAGE_CACHE_DIR=self.cache_dir):
+            resp = self.client.get(reverse("main:proxy_image"), {"url": self.url},
+                                   HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(resp.status_code, 304)
+
+    def test_least_recently_used_image_is_evicted(self):
+        with self.settings(IMAGE_CACHE_MAX_BYTES=len(self.image) + 1):
+            self.get(self.base_url + "/a.png")
+            self.get(self.base_url + "/b.png")
+            self.get(self.base_url + "/b.png")
+            self.assertEqual(ImageStubHandler.hits["full"], 2)
+            self.get(self.base_url + "/a.png")
+        self.assertEqual(ImageStubHandler.hits["full"], 3)
+
+    @skipIf(Image is None, "Pillow is not installed")
+    def test_width_variant(self):
+        resp, body = self.get(w=16)
+        with Image.open(io.BytesIO(body)) as img:
+            self.assertEqual(img.size, (16, 16))
+        self.assertEqual(ImageStubHandler.hits["full"], 1)
+
+    @skipIf(Image is None, "Pillow is not installed")
+    def test_oversized_images_are_not_resized(self):
+        for limit in (1000, 100):  # over the limit, and over twice it (DecompressionBombError)
+            with patch.object(Image, "MAX_IMAGE_PIXELS", limit):
+                resp, body = self.get(self.base_url + f"/bomb{limit}.png", w=16)
+            self.assertEqual(resp.status_code, 200)
+            self.assertEqual(body, ImageStubHandler.body + f"/bomb{limit}.png".encode())
+
+    def test_upstream_failures_are_502(self):
+        resp, _ = self.get(self.base_url + "/missing.png")
+        self.assertEqual(resp.status_code, 502)
+        with self.settings(IMAGE_PROXY_DEADLINE=0.15):
+            start = time.monotonic()
+            resp, _ = self.get(self.base_url + "/drip.png")
+        self.assertEqual(resp.status_code, 502)
+        self.assertLess(time.monotonic() - start, 0.45)
+
+    def test_blob_evicted_under_a_request_is_a_miss(self):
+        self.get()
+        real_utime = os.utime
+        calls = []
+
+        def utime_once_missing(path, *args, **kwargs):
+            calls.append(path)
+            if len(calls) == 1:
+                raise FileNotFoundError(path)
+            return real_utime(path, *args, **kwargs)
+
+        with patch("main.image_cache.os.utime", utime_once_missing):
+            resp, body = self.get()
+        self.assertEqual((resp.status_code, body), (200, self.image))
+
+    def files(self, *parts):
+        return [name for _, _, names in os.walk(os.path.join(self.cache_dir, *parts)) for name in names]
+
+    def test_records_of_evicted_images_are_deleted(self):
+        with self.settings(IMAGE_CACHE_MAX_BYTES=len(self.image) + 1):
+            self.get(self.base_url + "/a.png")
+            self.get(self.base_url + "/b.png")
+        self.assertEqual(len(self.files("meta")), 1)
+        self.assertEqual(len(self.files("refs")), 1)
+        with open(os.path.join(self.cache_dir, "size")) as f:
+            self.assertEqual(int(f.read()), len(ImageStubHandler.body + b"/b.png"))
+
+    def test_stores_under_the_limit_do_not_walk_the_store(self):
+        self.get(self.base_url + "/a.png")
+        with patch("main.image_cache._walk_blobs", wraps=image_cache._walk_blobs) as walk:
+            self.get(self.base_url + "/b.png")
+        walk.assert_not_called()
+        with open(os.path.join(self.cache_dir, "size")) as f:
+            self.assertEqual(int(f.read()), 2 * len(ImageStubHandler.body + b"/a.png"))
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tiered.clear()
+        for i in range(5):
+            Venue.objects.create(name=f"Lapangan {i}", CityName="Depok", StreetName=f"Jl. {i}")
+        self.url = reverse("main:show_json")
+
+    def test_stream_matches_serializers_byte_for_byte(self):
+        venues = Venue.objects.order_by("pk")
+        for fmt in ("json", "xml"):
+            for qs in (venues, venues.none()):
+                streamed = "".join(stream_serialized(fmt, qs, chunk_size=2))
+                self.assertEqual(streamed, serializers.serialize(fmt, qs))
+        streamed = "".join(stream_serialized("json", venues, fields=["name"], chunk_size=2))
+        self.assertEqual(streamed, serializers.serialize("json", venues, fields=["name"]))
+
+    def body(self, resp):
+        return b"".join(resp.streaming_content) if resp.streaming else resp.content
+
+    def test_fields_and_cursor(self):
+        resp = self.client.get(self.url, {"fields": "name"})
+        self.assertEqual(set(json.loads(self.body(resp))[0]["fields"]), {"name"})
+
+        pks = sorted(str(pk) for pk in Venue.objects.values_list("pk", flat=True))
+        resp = self.client.get(self.url, {"limit": 2})
+        self.assertEqual([o["pk"] for o in json.loads(self.body(resp))], pks[:2])
+        self.assertEqual(resp["X-Next-Cursor"], pks[1])
+        resp = self.client.get(self.url, {"after": pks[3], "limit": 2})
+        self.assertEqual([o["pk"] for o in json.loads(self.body(resp))], pks[4:])
+        self.assertNotIn("X-Next-Cursor", resp)
+
+    def test_bad_parameters_are_400(self):
+        for params in ({"fields": "name,nope"}, {"limit": "0"}, {"limit": "x"}, {"after": "not-a-uuid"}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+
+
+class ExportCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tiered.clear()
+        Venue.objects.create(name="Lapangan A", CityName="Depok", StreetName="Jl. Margonda")
+
+    def test_export_served_from_cache_until_venue_changes(self):
+        url = reverse("main:show_json")
+        first = b"".join(self.client.get(url).streaming_content)
+        with self.assertNumQueries(0):
+            cached = self.client.get(url)
+        self.assertEqual(cached.content, first)
+
+        Venue.objects.create(name="Lapangan B", CityName="Depok", StreetName="Jl. Juanda")
+        self.assertIn(b"Lapangan B", b"".join(self.client.get(url).streaming_content))
+
+    def test_key_is_the_normalized_parameters(self):
+        url = reverse("main:show_json")
+        b"".join(self.client.get(url, {"fields": "name,CityName"}).streaming_content)
+        with self.assertNumQueries(0):
+            self.client.get(url, {"fields": "CityName,name,", "utm_source": "x"})
+        resp = self.client.get(url, {"fields": "name"})
+        self.assertNotIn(b"CityName", b"".join(resp.streaming_content))
+
+    def test_local_tier_is_bounded_by_bytes(self):
+        local = LocalLRU(100, 60, size=value_size)
+        local.set("a", "x" * 60)
+        local.set("b", "y" * 30)
+        local.set("c", "z" * 30)
+        self.assertIsNone(local.get("a"))
+        self.assertEqual(local.get("b"), "y" * 30)
+        local.set("huge", "x" * 101)
+        self.assertIsNone(local.get("huge"))
+        self.assertEqual(local.get("c"), "z" * 30)
+
+
+class RequestMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        tiered.clear()
+
+    def record(self, logs):
+        self.assertEqual(len(logs.records), 1)
+        return json.loads(logs.records[0].getMessage())
+
+    def test_header_and_log_line(self):
+        url = reverse("community:group_list")
+        with self.assertLogs("velp.requests", "INFO") as logs:
+            resp = self.client.get(url)
+        record = self.record(logs)
+        self.assertEqual(logs.records[0].levelname, "INFO")
+        self.assertEqual(record["view"], "community:group_list")
+        self.assertEqual(record["bytes"], len(resp.content))
+        self.assertGreater(record["template_ms"], 0)
+        self.assertNotIn("Server-Timing", resp)
+
+    def test_server_timing_for_staff_or_debug(self):
+        url = reverse("community:group_list")
+        self.client.force_login(User.objects.create_user(username="dev", password="pw", is_staff=True))
+        with self.assertLogs("velp.requests", "INFO") as logs:
+            resp = self.client.get(url)
+        self.assertIn(f'desc="{self.record(logs)["queries"]} queries"', resp["Server-Timing"])
+        self.assertTrue(resp["Server-Timing"].startswith("app;dur="))
+
+        self.client.logout()
+        self.assertNotIn("Server-Timing", self.client.get(url))
+        with override_settings(DEBUG=True):
+            self.assertIn("Server-Timing", self.client.get(url))
+
+    def test_cache_hits_are_counted(self):
+        url = reverse("community:api_group_list")
+        self.client.get(url)
+        with self.assertLogs("velp.requests", "INFO") as logs:
+            self.client.get(url)
+        self.assertEqual(self.record(logs)["cache"]["local_hits"], 1)
+
+    @override_settings(REQUEST_QUERY_BUDGET=0)
+    def test_over_budget_is_a_warning(self):
+        Venue.objects.create(name="Lapangan A", CityName="Depok", StreetName="Jl. Margonda")
+        with self.assertLogs("velp.requests", "INFO") as logs:
+            body = b"".join(self.client.get(reverse("main:show_json")).streaming_content)
+        record = self.record(logs)
+        self.assertEqual(logs.records[0].levelname, "WARNING")
+        self.assertEqual(record["over_budget"], ["queries"])
+        self.assertEqual(record["bytes"], len(body))
+
+
+class GenerateDatasetTests(TestCase):
+    def generate(self, *args):
+        out = io.StringIO()
+        call_command("generate_dataset", "--users=40", "--seed=7", "--end-date=2026-01-31", *args, stdout=out)
+        return out.getvalue()
+
+    def test_denormalized_columns_match_the_rows(self):
+        self.generate()
+        self.assertEqual(User.objects.filter(username__startswith="seed_").count(), 40)
+        out = io.StringIO()
+        call_command("reconcile_post_counters", "--verify", stdout=out)
+        call_command("rebuild_venue_ratings", "--verify", stdout=out)
+
+        from community.models import Group
+        from reports.models import ReportTarget
+        for group in Group.objects.all():
+            self.assertEqual(group.member_count, group.memberships.count())
+            self.assertEqual(group.post_count, group.posts.count())
+        for target in ReportTarget.objects.all():
+            stored = (target.open_count, target.reporter_count, target.severity, target.reason_counts)
+            fresh = ReportTarget.refresh(target.content_type_id, target.object_id)
+            self.assertEqual(stored, (fresh.open_count, fresh.reporter_count, fresh.severity, fresh.reason_counts))
+
+        for occupancy in VenueOccupancy.objects.all()[:50]:
+            held = 0
+            for booking in Booking.objects.filter(venue_id=occupancy.venue_id, date=occupancy.date):
+                held |= booking.occupancy_mask()
+            self.assertEqual(occupancy.mask, held)
+
+    def test_same_seed_same_data_and_prefix_guard(self):
+        self.generate("--skip-search-index")
+        first = list(Venue.objects.order_by("id").values_list("id", "name", "review_count"))
+        with self.assertRaises(CommandError):
+            self.generate()
+        User.objects.filter(username__startswith="seed_").delete()
+        Venue.objects.all().delete()
+        self.generate("--skip-search-index")
+        self.assertEqual(first, list(Venue.objects.order_by("id").values_list("id", "name", "review_count")))
 
-# Create your tests here.
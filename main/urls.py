@@ -8,6 +8,7 @@ from main.views import create_booking, booking_list, booking_confirm, booking_ca
 from main.views import get_reviews_html
 from main.views import create_booking, booking_list, booking_confirm, booking_cancel, create_booking_ajax, show_my_bookings_json, delete_booking_flutter, update_booking_payment_flutter
 from main.views import create_venue_ajax, create_venue_flutter, update_venue_flutter, delete_venue_flutter
+from main.views import venue_availability, api_venue_list, api_venue_nearby
 
 
 app_name = 'main'
@@ -17,6 +18,9 @@ urlpatterns = [
     path('', show_main, name='show_main'),
     path('venue/create/', create_venue, name='create_venue'),
     path('venue/create/ajax/', create_venue_ajax, name='create_venue_ajax'),
+    path('api/venues/', api_venue_list, name='api_venue_list'),
+    path('api/venues/nearby/', api_venue_nearby, name='api_venue_nearby'),
+    path('venue/availability/', venue_availability, name='venue_availability'),
     path('venue/<str:id>/', show_venue, name='show_venue'),
     path('venue/<str:id>/reviews_html/', get_reviews_html, name='get_reviews_html'),
     path('xml/', show_xml, name='show_xml'),
@@ -1,8 +1,16 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from main.forms import VenueForm, BookingForm
 from review.forms import ReviewForm 
-from main.models import Venue, Booking
-from django.http import HttpResponse, JsonResponse
+from main.models import Venue, Booking, VenueOccupancy
+from main.reservations import reserve_booking, SlotConflict
+from main.exports import stream_export
+from main.search import search_venues
+from main.geo import cell_ranges, haversine_km
+from main.image_cache import get_image, ImageFetchError
+from velp.pagination import keyset_page
+from django.http import HttpResponse, JsonResponse, FileResponse
+from django.conf import settings
+from urllib.parse import urlparse
 from django.core import serializers
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib import messages
@@ -19,37 +27,126 @@ from django.core.exceptions import ValidationError
 from django.template.loader import render_to_string
 from django.http import JsonResponse
 import requests
+from django.db.models import Q
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.html import strip_tags
 import json
+import hashlib
+import uuid
 from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods, require_POST
+from django.views.decorators.http import require_http_methods, require_POST, require_GET
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.contrib.auth.decorators import login_required
 
+VENUE_PAGE_SIZE = 20
+VENUE_API_MAX_PAGE_SIZE = 100
+# ?sort= value -> keyset keys; every order has a matching (field, id) index
+VENUE_SORTS = {
+    "name": [("name", False), ("id", False)],
+    "top": [("rating_score", True), ("id", True)],
+    "rating": [("rating_avg", True), ("id", True)],
+    "reviews": [("review_count", True), ("id", True)],
+    "price": [("price_per_hour", False), ("id", False)],
+    "-price": [("price_per_hour", True), ("id", True)],
+}
+
+
+def _venue_list_keys(request):
+    return VENUE_SORTS.get(request.GET.get("sort"), VENUE_SORTS["name"])
+
+
+def _venue_list_queryset(request):
+    """
+    Venues narrowed by the ?filter= leisure type, the ?q= search text and the
+    optional ?min_rating=, ?min_reviews= and ?max_price= bounds.
+    Raises ValueError for a malformed bound.
+    """
+    venue_list = Venue.objects.all()
+
+    filter_type = request.GET.get("filter", "all")
+    valid_filters = ['pitch', 'stadium', 'sports_centre']
+    if filter_type in valid_filters:
+        venue_list = venue_list.filter(leisure=filter_type)
+
+    if request.GET.get("min_rating"):
+        venue_list = venue_list.filter(rating_avg__gte=float(request.GET["min_rating"]))
+    if request.GET.get("min_reviews"):
+        venue_list = venue_list.filter(review_count__gte=int(request.GET["min_reviews"]))
+    if request.GET.get("max_price"):
+        venue_list = venue_list.filter(price_per_hour__lte=int(request.GET["max_price"]))
+
+    return search_venues(venue_list, request.GET.get("q"))
+
+
+def _serialize_venue(venue):
+    return {
+        "id": str(venue.id),
+        "name": venue.name,
+        "CityName": venue.CityName,
+        "StreetName": venue.StreetName,
+        "leisure": venue.leisure,
+        "price_per_hour": venue.price_per_hour,
+        "review_count": venue.review_count,
+        "rating_avg": round(venue.rating_avg, 2),
+        "rating_score": round(venue.rating_score, 3),
+        "latitude": venue.latitude,
+        "longitude": venue.longitude,
+    }
+
+
 # Create your views here.
 @login_required(login_url='/login')
 def show_main(request):
+    # keyset pagination on (sort key, id): ?cursor= comes from the next/prev links
+    try:
+        page = keyset_page(_venue_list_queryset(request), _venue_list_keys(request),
+                           request.GET.get("cursor"), VENUE_PAGE_SIZE)
+    except ValueError:
+        return redirect('main:show_main')
 
-    venue_list = Venue.objects.all() 
-    
-    # Get filter, default is 'all'
-    filter_type = request.GET.get("filter", "all") 
-    
-    valid_filters = ['pitch', 'stadium', 'sports_centre']
-    if filter_type in valid_filters:
-        venue_list = venue_list.filter(leisure=filter_type) 
-    
-    venue_list = venue_list.order_by('name')
+    list_query = request.GET.copy()
+    list_query.pop("cursor", None)
 
     context = {
         'name': request.user.username,
-        'venue_list': venue_list,
+        'venue_list': page.items,
+        'next_cursor': page.next_cursor,
+        'prev_cursor': page.prev_cursor,
+        'list_query': list_query.urlencode(),
+        'filter': request.GET.get("filter", "all"),
+        'sort': request.GET.get("sort", "name"),
+        'q': request.GET.get("q", ""),
         'last_login': request.COOKIES.get('last_login', 'Never')
     }
 
     return render(request, "main.html", context)
 
 
+@require_GET
+def api_venue_list(request):
+    """
+    JSON venue list and rankings:
+    ?q=&filter=&sort=&min_rating=&min_reviews=&max_price=&cursor=&size=
+
+    sort is one of name (default), top (Bayesian score), rating, reviews,
+    price or -price. Results are read off the precomputed, indexed rating
+    columns and paginated by opaque next/prev cursors.
+    """
+    try:
+        size = min(max(int(request.GET.get("size", VENUE_PAGE_SIZE)), 1), VENUE_API_MAX_PAGE_SIZE)
+        page = keyset_page(_venue_list_queryset(request), _venue_list_keys(request),
+                           request.GET.get("cursor"), size)
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Invalid filter, cursor or size."}, status=400)
+
+    return JsonResponse({
+        "ok": True,
+        "venues": [_serialize_venue(v) for v in page.items],
+        "next": page.next_cursor,
+        "prev": page.prev_cursor,
+    })
+
+
 def create_venue(request):
     form = VenueForm(request.POST or None)
 
@@ -85,15 +182,11 @@ def show_venue(request, id):
 
 
 def show_xml(request):
-    venue_list = Venue.objects.all()
-    xml_data = serializers.serialize("xml", venue_list)
-    return HttpResponse(xml_data, content_type="application/xml")
+    return stream_export(request, Venue.objects.all(), "xml", cache_namespace="venue")
 
 
 def show_json(request):
-    venue_list = Venue.objects.all()
-    json_data = serializers.serialize("json", venue_list)
-    return HttpResponse(json_data, content_type="application/json")
+    return stream_export(request, Venue.objects.all(), "json", cache_namespace="venue")
 
 
 def show_xml_by_id(request, venue_id):
@@ -262,28 +355,12 @@ def create_booking(request, id):
     if request.method == 'POST':
         form = BookingForm(request.POST)
         if form.is_valid():
-            # extract form cleaned data
-            start_hour = int(form.cleaned_data['start_hour'])
-            duration = int(form.cleaned_data['duration_hours'])
-            d = form.cleaned_data['date']
-
-            # check collisions for each hour: start_hour .. start_hour+duration-1
-            blocked = []
-            for h in range(start_hour, start_hour + duration):
-                hh = h % 24
-                t = time(hour=hh, minute=0)
-                if Booking.objects.filter(venue=venue, date=d, start_time=t).exists():
-                    blocked.append(hh)
-
-            if blocked:
-                slots = ", ".join(f"{h:02d}:00-{(h+1)%24:02d}:00" for h in blocked)
-                form.add_error(None, f"These hour slots are already booked for {d}: {slots}. Pick other hours.")
+            # claims every hour start_hour .. start_hour+duration-1 atomically
+            try:
+                reserve_booking(form, venue, request.user)
+            except SlotConflict as e:
+                form.add_error(None, f"{e} Pick other hours.")
             else:
-                # create booking
-                booking = form.save(venue=venue, user=request.user, commit=True)
-                # compute and ensure total_price saved (save() of Booking handles it)
-                booking.total_price = booking.compute_total_price()
-                booking.save()
                 messages.success(request, "Booking created successfully.")
                 return redirect(reverse('main:booking_list'))
     else:
@@ -322,29 +399,208 @@ def booking_cancel(request, pk):
     return render(request, "booking/booking_cancel_confirm.html", {"booking": booking})
 
 
+NEARBY_MAX_RADIUS_KM = 50
+NEARBY_MAX_RESULTS = 100
+# rows read per request, however dense the area
+NEARBY_MAX_CANDIDATES = 5000
+NEARBY_FIRST_RING_KM = 1
+
+
+def _in_cells(lat, lon, radius):
+    in_cells = Q()
+    for first, last in cell_ranges(lat, lon, radius):
+        in_cells |= Q(geo_cell__range=(first, last))
+    return in_cells
+
+
+def _nearest(candidates, lat, lon, radius, k):
+    """
+    (distance, pk) of the k nearest candidates within ``radius``. Searches a
+    small circle first and doubles it until k venues are inside, so a dense
+    area is not read out to the full radius.
+    """
+    ring = min(NEARBY_FIRST_RING_KM, radius)
+    while True:
+        rows = list(candidates.filter(_in_cells(lat, lon, ring))
+                    .values_list("pk", "latitude", "longitude")[:NEARBY_MAX_CANDIDATES])
+        found = sorted(
+            (distance, pk) for distance, pk in
+            ((haversine_km(lat, lon, v_lat, v_lon), pk) for pk, v_lat, v_lon in rows)
+            if distance <= ring
+        )
+        if len(found) >= k or ring >= radius or len(rows) == NEARBY_MAX_CANDIDATES:
+            return found[:k]
+        ring = min(ring * 2, radius)
+
+
+def _best_rated(candidates, lat, lon, radius, k):
+    """
+    (distance, pk) of the k best-scored candidates within ``radius``, nearer
+    first on equal scores. Rows arrive best score first and reading stops
+    once k are inside the circle and the k-th score is passed.
+    """
+    rows = (candidates.filter(_in_cells(lat, lon, radius)).order_by("-rating_score")
+            .values_list("pk", "latitude", "longitude", "rating_score")[:NEARBY_MAX_CANDIDATES])
+    found = []
+    for pk, v_lat, v_lon, score in rows.iterator(chunk_size=4 * k):
+        if len(found) >= k and score < found[k - 1][0]:
+            break
+        distance = haversine_km(lat, lon, v_lat, v_lon)
+        if distance <= radius:
+            found.append((score, distance, pk))
+    found.sort(key=lambda row: (-row[0], row[1]))
+    return [(distance, pk) for _, distance, pk in found[:k]]
+
+
+@require_GET
+def api_venue_nearby(request):
+    """
+    The k nearest venues within a radius: ?lat=&lon=&radius=5&k=20&filter=&sort=
+
+    Candidates come from the grid cells covering the circle (one indexed
+    range per cell row), exact distances are computed here on (id, lat, lon)
+    rows and only the k results are loaded in full. sort=top ranks the
+    venues inside the radius by their Bayesian rating score instead of by
+    distance ("best pitches near me").
+    """
+    try:
+        lat = float(request.GET["lat"])
+        lon = float(request.GET["lon"])
+        radius = float(request.GET.get("radius", 5))
+        k = int(request.GET.get("k", 20))
+        if not (-90 <= lat <= 90 and -180 <= lon <= 180 and 0 < radius <= NEARBY_MAX_RADIUS_KM
+                and 1 <= k <= NEARBY_MAX_RESULTS):
+            raise ValueError
+    except (KeyError, ValueError):
+        return JsonResponse({
+            "ok": False,
+            "error": f"Give lat, lon, radius (at most {NEARBY_MAX_RADIUS_KM} km) and k (1-{NEARBY_MAX_RESULTS}).",
+        }, status=400)
+
+    candidates = Venue.objects.all()
+    filter_type = request.GET.get("filter")
+    if filter_type in dict(Venue.LEISURE_CHOICES):
+        candidates = candidates.filter(leisure=filter_type)
+
+    rank = _best_rated if request.GET.get("sort") == "top" else _nearest
+    found = rank(candidates, lat, lon, radius, k)
+    venues = Venue.objects.in_bulk([pk for _, pk in found])
+
+    return JsonResponse({
+        "ok": True,
+        "venues": [
+            {**_serialize_venue(venues[pk]), "distance_km": round(distance, 3)}
+            for distance, pk in found
+        ],
+    })
+
+
+AVAILABILITY_MAX_DAYS = 62
+AVAILABILITY_MAX_VENUES = 50
+
+
+@require_GET
+def venue_availability(request):
+    """
+    Free/busy calendar for one or many venues:
+    ?venue=<id>&venue=<id>&start=YYYY-MM-DD&days=14
+
+    Each venue maps to one 24-bit busy mask per day (bit h set = hour h booked),
+    read from the occupancy table in a single query. Supports If-None-Match.
+    """
+    venue_ids = []
+    for raw in request.GET.getlist("venue"):
+        venue_ids.extend(v for v in raw.split(",") if v)
+    try:
+        venue_ids = [str(uuid.UUID(v)) for v in dict.fromkeys(venue_ids)]
+        start = date.fromisoformat(request.GET["start"]) if request.GET.get("start") else date.today()
+        days = int(request.GET.get("days", 14))
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Invalid venue, start or days parameter."}, status=400)
+
+    if not venue_ids or len(venue_ids) > AVAILABILITY_MAX_VENUES:
+        return JsonResponse({"ok": False, "error": f"Give between 1 and {AVAILABILITY_MAX_VENUES} venues."}, status=400)
+    if not 1 <= days <= AVAILABILITY_MAX_DAYS:
+        return JsonResponse({"ok": False, "error": f"days must be between 1 and {AVAILABILITY_MAX_DAYS}."}, status=400)
+    # an unknown id would otherwise read as a venue with no bookings
+    found = {str(pk) for pk in Venue.objects.filter(pk__in=venue_ids).values_list("pk", flat=True)}
+    missing = [vid for vid in venue_ids if vid not in found]
+    if missing:
+        return JsonResponse({"ok": False, "error": f"Unknown venue: {', '.join(missing)}"}, status=404)
+
+    end = start + timedelta(days=days - 1)
+    matrix = {vid: [0] * days for vid in venue_ids}
+    rows = VenueOccupancy.objects.filter(
+        venue_id__in=venue_ids, date__range=(start, end), mask__gt=0
+    ).values_list("venue_id", "date", "mask")
+    for venue_id, d, mask in rows:
+        matrix[str(venue_id)][(d - start).days] = mask
+
+    body = json.dumps({
+        "ok": True,
+        "start": start.isoformat(),
+        "days": days,
+        "venues": matrix,
+    }, separators=(",", ":"))
+    etag = '"%s"' % hashlib.md5(body.encode()).hexdigest()
+
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 def get_reviews_html(request, id):
     venue = Venue.objects.get(pk=id)
     html = render_to_string("venue_detail.html", {"venue": venue, "user": request.user}, request=request)
     return JsonResponse({"html": html})
 
 
+IMAGE_MIN_WIDTH = 16
+IMAGE_MAX_WIDTH = 2048
+
+
 def proxy_image(request):
+    """
+    Serve an external image through the disk cache in main/image_cache.py.
+    ?w=<pixels> returns a scaled-down variant (when Pillow is installed).
+    """
     image_url = request.GET.get('url')
     if not image_url:
         return HttpResponse('No URL provided', status=400)
-    
+    if urlparse(image_url).scheme not in ('http', 'https'):
+        return HttpResponse('Only http(s) image URLs can be proxied', status=400)
+
     try:
-        # Fetch image from external source
-        response = requests.get(image_url, timeout=10)
-        response.raise_for_status()
-        
-        # Return the image with proper content type
-        return HttpResponse(
-            response.content,
-            content_type=response.headers.get('Content-Type', 'image/jpeg')
-        )
-    except requests.RequestException as e:
-        return HttpResponse(f'Error fetching image: {str(e)}', status=500)
+        width = int(request.GET['w']) if request.GET.get('w') else None
+    except ValueError:
+        return HttpResponse('Invalid width', status=400)
+    if width is not None:
+        width = min(max(width, IMAGE_MIN_WIDTH), IMAGE_MAX_WIDTH)
+
+    try:
+        image = get_image(image_url, width)
+        etag = f'"{image.digest}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            try:
+                f = open(image.path, 'rb')
+            except FileNotFoundError:
+                # evicted between lookup and open: fetch it again
+                image = get_image(image_url, width)
+                f = open(image.path, 'rb')
+            response = FileResponse(f, content_type=image.content_type)
+    except ImageFetchError as e:
+        # upstream failed and nothing usable is cached
+        return HttpResponse(f'Error fetching image: {str(e)}', status=502)
+
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.IMAGE_CACHE_MAX_AGE)
+    return response
+
+
 @csrf_exempt
 @login_required(login_url='/login')
 @require_POST
@@ -357,28 +613,14 @@ def create_booking_ajax(request, id):
         form = BookingForm(request.POST)
 
         if form.is_valid():
-
-            start_hour = int(form.cleaned_data['start_hour'])
-            duration = int(form.cleaned_data['duration_hours'])
-            d = form.cleaned_data['date']
-
-            blocked = []
-            for h in range(start_hour, start_hour + duration):
-                hh = h % 24
-                t = time(hour=hh, minute=0)
-                if Booking.objects.filter(venue=venue, date=d, start_time=t).exists():
-                    blocked.append(hh)
-
-            if blocked:
-                slots = ", ".join(f"{h:02d}:00-{(h+1)%24:02d}:00" for h in blocked)
+            try:
+                reserve_booking(form, venue, request.user)
+            except SlotConflict as e:
                 return JsonResponse({
                     "ok": False,
-                    "error": f"These hour slots are already booked for {d}: {slots}."
-                })
-
-            booking = form.save(venue=venue, user=request.user, commit=True)
-            booking.total_price = booking.compute_total_price()
-            booking.save()
+                    "error": str(e),
+                    "blocked_hours": e.hours,
+                }, status=409)
 
             return JsonResponse({
                 "ok": True,
@@ -432,7 +674,7 @@ def booking_confirm(request, pk):
 def show_my_bookings_json(request):
     # Filter bookings that belong to the current logged-in user
     bookings = Booking.objects.filter(user=request.user)
-    return HttpResponse(serializers.serialize("json", bookings), content_type="application/json")
+    return stream_export(request, bookings, "json")
 
 @csrf_exempt
 @require_POST
@@ -479,10 +721,30 @@ def update_booking_payment_flutter(request, id):
     except Exception as e:
         return JsonResponse({'status': 'error', 'message': str(e)}, status=500)
 
+
+def _flutter_coordinates(data, venue=None):
+    """(latitude, longitude) floats, or Nones, from a Flutter payload; ValueError if invalid"""
+    lat = data.get("latitude", venue.latitude if venue else None)
+    lon = data.get("longitude", venue.longitude if venue else None)
+    if lat in (None, "") or lon in (None, ""):
+        return None, None
+    try:
+        lat, lon = float(lat), float(lon)
+    except TypeError:
+        raise ValueError("Invalid latitude or longitude")
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        raise ValueError("Invalid latitude or longitude")
+    return lat, lon
+
+
 @csrf_exempt
 def create_venue_flutter(request):
     if request.method == 'POST':
         data = json.loads(request.body)
+        try:
+            latitude, longitude = _flutter_coordinates(data)
+        except ValueError:
+            return JsonResponse({"status": "error", "message": "Invalid latitude or longitude"}, status=400)
         name = strip_tags(data.get("name", ""))  # Strip HTML tags
         cityName = strip_tags(data.get("CityName", ""))  # Strip HTML tags
         streetName = data.get("StreetName", "")
@@ -494,6 +756,8 @@ def create_venue_flutter(request):
             CityName=cityName,
             StreetName=streetName,
             leisure=leisure,
+            latitude=latitude,
+            longitude=longitude,
             user=user
         )
         new_venue.save()
@@ -526,6 +790,8 @@ def update_venue_flutter(request, venue_id):
             venue.StreetName = data['StreetName']
         if 'leisure' in data:
             venue.leisure = data['leisure']
+        if 'latitude' in data or 'longitude' in data:
+            venue.latitude, venue.longitude = _flutter_coordinates(data, venue)
         
         venue.save()
         
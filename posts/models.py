@@ -1,5 +1,8 @@
 import uuid
-from django.db import models
+from django.db import IntegrityError, connection, models, transaction
+from django.db.models import F, QuerySet
+from django.db.models.signals import m2m_changed, post_delete, pre_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 
 class Post(models.Model):
@@ -11,12 +14,123 @@ class Post(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     likes = models.ManyToManyField(User, related_name='liked_posts', blank=True)
 
+    # denormalized counters, kept in step by set_like/toggle_like, Comment.save
+    # and the receivers below; reconcile_post_counters repairs any drift
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    COUNTER_FIELDS = ('like_count', 'comment_count')
+
     class Meta:
         ordering = ['-created_at']
 
     def __str__(self):
         return f'{self.author.username}: {self.content[:30]}'
 
+    def save(self, *args, **kwargs):
+        # saving a loaded post (an edit) must not write back counters that a
+        # concurrent like or comment has moved since it was read
+        if kwargs.get('update_fields') is None and not self._state.adding and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.COUNTER_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
+    @staticmethod
+    def bump(post_ids, **deltas):
+        """Add ``deltas`` to counter fields in one UPDATE, e.g. bump([pk], like_count=1)"""
+        Post.objects.filter(pk__in=post_ids).update(
+            **{field: F(field) + delta for field, delta in deltas.items()}
+        )
+
+    @classmethod
+    def _like_sql(cls, sql, post_id, user_id=None, delta=None):
+        """Run ``sql`` with table names and named parameters filled in; returns the cursor"""
+        qn = connection.ops.quote_name
+        cursor = connection.cursor()
+        cursor.execute(
+            sql.format(likes=qn(cls.likes.through._meta.db_table), posts=qn(cls._meta.db_table)),
+            {'post': cls._meta.pk.get_db_prep_value(post_id, connection), 'user': user_id, 'delta': delta},
+        )
+        return cursor
+
+    @classmethod
+    def _write_like(cls, post_id, user_id, liked):
+        """One conditional INSERT or DELETE on the like table; returns rows changed"""
+        if liked:
+            sql = 'INSERT INTO {likes} (post_id, user_id) VALUES (%(post)s, %(user)s) ON CONFLICT DO NOTHING'
+        else:
+            sql = 'DELETE FROM {likes} WHERE post_id = %(post)s AND user_id = %(user)s'
+        with cls._like_sql(sql, post_id, user_id=user_id) as cursor:
+            return cursor.rowcount
+
+    @classmethod
+    def _move_like_count(cls, post_id, delta):
+        """Apply ``delta`` and read the counter back in the same UPDATE; None if no such post"""
+        sql = 'UPDATE {posts} SET like_count = like_count + %(delta)s WHERE id = %(post)s RETURNING like_count'
+        with cls._like_sql(sql, post_id, delta=delta) as cursor:
+            row = cursor.fetchone()
+        return row and row[0]
+
+    @classmethod
+    def set_like(cls, post_id, user, liked):
+        """
+        Idempotently like (or unlike) a post as ``user``; returns (liked, like_count).
+
+        A repeated like or unlike changes nothing, so a double tap can't skew
+        the count. Returns None when the post doesn't exist.
+        """
+        try:
+            with transaction.atomic():
+                changed = cls._write_like(post_id, user.pk, liked)
+                count = cls._move_like_count(post_id, changed if liked else -changed)
+                if count is None:
+                    raise IntegrityError('post does not exist')
+        except IntegrityError:
+            return None
+        return liked, count
+
+    # PostgreSQL: the whole toggle in one statement, with data-modifying CTEs
+    TOGGLE_LIKE_SQL = (
+        'WITH removed AS ('
+        'DELETE FROM {likes} WHERE post_id = %(post)s AND user_id = %(user)s RETURNING 1'
+        '), added AS ('
+        'INSERT INTO {likes} (post_id, user_id) SELECT %(post)s, %(user)s '
+        'WHERE NOT EXISTS (SELECT 1 FROM removed) ON CONFLICT DO NOTHING RETURNING 1'
+        ') UPDATE {posts} SET like_count = like_count '
+        '+ (SELECT count(*) FROM added) - (SELECT count(*) FROM removed) '
+        'WHERE id = %(post)s RETURNING NOT EXISTS (SELECT 1 FROM removed), like_count'
+    )
+
+    @classmethod
+    def toggle_like(cls, post_id, user):
+        """
+        Flip ``user``'s like on a post; returns (liked, like_count) or None.
+
+        One statement on PostgreSQL. SQLite has no data-modifying CTEs, so
+        there it takes the DELETE, the INSERT when the DELETE missed, and the
+        counter UPDATE .. RETURNING, in one transaction.
+        """
+        try:
+            if connection.vendor == 'postgresql':
+                with cls._like_sql(cls.TOGGLE_LIKE_SQL, post_id, user_id=user.pk) as cursor:
+                    row = cursor.fetchone()
+                if row is None:
+                    raise IntegrityError('post does not exist')
+                return tuple(row)
+            with transaction.atomic():
+                if cls._write_like(post_id, user.pk, False):
+                    liked, delta = False, -1
+                else:
+                    # zero rows here means a concurrent tap already liked it
+                    liked, delta = True, cls._write_like(post_id, user.pk, True)
+                count = cls._move_like_count(post_id, delta)
+                if count is None:
+                    raise IntegrityError('post does not exist')
+        except IntegrityError:
+            return None
+        return liked, count
+
 
 class Comment(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
@@ -30,3 +144,48 @@ class Comment(models.Model):
 
     def __str__(self):
         return f'{self.author.username} on {self.post_id}'
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            adding = self._state.adding
+            super().save(*args, **kwargs)
+            if adding:
+                Post.bump([self.post_id], comment_count=1)
+
+
+def _deleting_posts(origin):
+    # rows cascading from a post delete don't need to touch the dying post
+    return isinstance(origin, Post) or (isinstance(origin, QuerySet) and origin.model is Post)
+
+
+@receiver(post_delete, sender=Comment)
+def remove_comment_from_post(sender, instance, origin=None, **kwargs):
+    if not _deleting_posts(origin):
+        Post.bump([instance.post_id], comment_count=-1)
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def count_manager_likes(sender, instance, action, reverse, pk_set, **kwargs):
+    """likes.add/remove/clear from either side; set_like/toggle_like count in SQL"""
+    post_field, user_field = ('user_id', 'post_id') if reverse else ('post_id', 'user_id')
+    if action == 'post_add' and pk_set:
+        # add() only reports the rows it actually inserted
+        if reverse:
+            Post.bump(pk_set, like_count=1)
+        else:
+            Post.bump([instance.pk], like_count=len(pk_set))
+    elif action in ('pre_remove', 'pre_clear'):
+        # remove() reports whatever it was asked to remove, so count real rows
+        rows = sender.objects.filter(**{post_field: instance.pk})
+        if action == 'pre_remove':
+            rows = rows.filter(**{f'{user_field}__in': pk_set})
+        if reverse:
+            Post.bump(rows.values('post_id'), like_count=-1)
+        else:
+            Post.bump([instance.pk], like_count=-rows.count())
+
+
+@receiver(pre_delete, sender=User)
+def drop_likes_of_deleted_user(sender, instance, **kwargs):
+    # the like rows cascade without signals of their own
+    Post.bump(Post.likes.through.objects.filter(user_id=instance.pk).values('post_id'), like_count=-1)
@@ -1,3 +1,255 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+import uuid
+from unittest.mock import patch
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from velp.pagination import encode_cursor
+
+from .management.commands import reconcile_post_counters
+from .models import Post, Comment
+
+
+class FeedQueryCountTests(TestCase):
+    """The feed and detail endpoints must not issue one query per post or comment"""
+
+    def setUp(self):
+        self.viewer = User.objects.create_user(username="viewer", password="pw")
+        self.others = [User.objects.create_user(username=f"user{i}", password="pw") for i in range(3)]
+        self.client.force_login(self.viewer)
+        # load the cached request user once so every measured request is warm
+        self.client.get(reverse("posts:api_list"))
+
+    def make_posts(self, n):
+        for i in range(n):
+            author = self.others[i % 3]
+            post = Post.objects.create(author=author, content=f"post {i}")
+            post.likes.add(*self.others[: i % 3 + 1])
+            if i % 2:
+                post.likes.add(self.viewer)
+            Comment.objects.create(post=post, author=self.viewer, body="nice")
+            Comment.objects.create(post=post, author=author, body="thanks")
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        return len(ctx.captured_queries), resp
+
+    def test_feed_query_count_does_not_grow_with_posts(self):
+        self.make_posts(2)
+        small, _ = self.count_queries(reverse("posts:api_list"))
+        self.make_posts(30)
+        large, resp = self.count_queries(reverse("posts:api_list"))
+
+        self.assertEqual(small, large)
+        liked = {p["content"]: p["is_liked"] for p in resp.json()}
+        self.assertTrue(liked["post 1"])
+        self.assertFalse(liked["post 2"])
+
+    def test_html_feed_query_count_does_not_grow_with_posts(self):
+        self.make_posts(2)
+        small, _ = self.count_queries(reverse("posts:list"))
+        self.make_posts(8)
+        large, _ = self.count_queries(reverse("posts:list"))
+        self.assertEqual(small, large)
+
+    def test_detail_query_count_does_not_grow_with_comments(self):
+        self.make_posts(1)
+        post = Post.objects.get()
+        small, _ = self.count_queries(reverse("posts:api_detail", args=[post.pk]))
+        for i in range(20):
+            Comment.objects.create(post=post, author=self.others[i % 3], body=f"c{i}")
+        large, resp = self.count_queries(reverse("posts:api_detail", args=[post.pk]))
+
+        self.assertEqual(small, large)
+        self.assertEqual(resp.json()["comment_count"], 22)
+        self.assertEqual(resp.json()["like_count"], 1)
+
+
+class FeedCursorTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reader", password="pw")
+        self.client.force_login(self.user)
+        self.posts = [Post.objects.create(author=self.user, content=f"post {i}") for i in range(7)]
+
+    def feed(self, **params):
+        resp = self.client.get(reverse("posts:api_feed"), params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def contents(self, page):
+        return [p["content"] for p in page["results"]]
+
+    def test_pages_walk_every_post_once_newest_first(self):
+        seen, cursor = [], None
+        while True:
+            page = self.feed(size=3, **({"cursor": cursor} if cursor else {}))
+            seen += self.contents(page)
+            cursor = page["next"]
+            if not cursor:
+                break
+        self.assertEqual(seen, [f"post {i}" for i in reversed(range(7))])
+
+        back = self.feed(cursor=page["prev"], size=3)
+        self.assertEqual(self.contents(back), ["post 3", "post 2", "post 1"])
+
+    def test_since_returns_only_newer_posts(self):
+        latest = self.feed(size=3)["latest"]
+        self.assertEqual(self.feed(since=latest)["results"], [])
+
+        for i in range(7, 12):
+            Post.objects.create(author=self.user, content=f"post {i}")
+
+        page = self.feed(since=latest, size=3)
+        self.assertEqual(self.contents(page), ["post 9", "post 8", "post 7"])
+        self.assertIsNotNone(page["prev"])
+        rest = self.feed(since=page["latest"])
+        self.assertEqual(self.contents(rest), ["post 11", "post 10"])
+
+    def test_bad_cursor_is_rejected(self):
+        resp = self.client.get(reverse("posts:api_feed"), {"cursor": "nope"})
+        self.assertEqual(resp.status_code, 400)
+        for values in (["zzz", "not-a-uuid"], [{"x": 1}, 1], [None, 1]):
+            resp = self.client.get(reverse("posts:api_feed"), {"cursor": encode_cursor(values)})
+            self.assertEqual(resp.status_code, 400, values)
+
+
+class PostCounterTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username="author", password="pw")
+        self.fans = [User.objects.create_user(username=f"fan{i}", password="pw") for i in range(3)]
+        self.post = Post.objects.create(author=self.author, content="hello")
+
+    def counts(self):
+        self.post.refresh_from_db()
+        return self.post.like_count, self.post.comment_count
+
+    def test_counters_follow_every_write_path(self):
+        self.client.force_login(self.fans[0])
+        toggle = reverse("posts:api_like_toggle", args=[self.post.pk])
+        self.assertEqual(self.client.post(toggle).json(), {"liked": True, "count": 1})
+        self.post.likes.add(*self.fans)
+        self.fans[2].liked_posts.remove(self.post)
+        self.assertEqual(self.counts(), (2, 0))
+        self.assertEqual(self.client.post(toggle).json(), {"liked": False, "count": 1})
+
+        resp = self.client.post(reverse("posts:api_comment_create", args=[self.post.pk]), {"body": "hi"})
+        self.assertEqual(resp.json()["count"], 1)
+        Comment.objects.create(post=self.post, author=self.fans[1], body="yo")
+        self.assertEqual(self.counts(), (1, 2))
+
+        # a user delete cascades to their likes and comments
+        self.fans[1].delete()
+        self.assertEqual(self.counts(), (0, 1))
+
+        cid = self.post.comments.get().pk
+        resp = self.client.post(reverse("posts:api_comment_delete", args=[cid]))
+        self.assertEqual(resp.json()["count"], 0)
+
+    def test_edits_keep_concurrent_counters(self):
+        stale = Post.objects.get(pk=self.post.pk)
+        self.post.likes.add(*self.fans)
+        Comment.objects.create(post=self.post, author=self.fans[0], body="first")
+        stale.content = "edited"
+        stale.save()
+        self.assertEqual(self.counts(), (3, 1))
+        self.assertEqual(self.post.content, "edited")
+
+        self.client.force_login(self.author)
+        resp = self.client.post(reverse("posts:api_update", args=[self.post.pk]), {"content": "again"})
+        self.assertEqual(resp.status_code, 200)
+        resp = self.client.post(reverse("posts:update", args=[self.post.pk]), {"content": "third"})
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(self.counts(), (3, 1))
+        self.assertEqual(self.post.content, "third")
+
+    def test_reconcile_repairs_drift(self):
+        self.post.likes.add(*self.fans)
+        Post.objects.update(like_count=0, comment_count=5)
+
+        with self.assertRaises(CommandError):
+            call_command("reconcile_post_counters", "--verify", stdout=StringIO())
+        call_command("reconcile_post_counters", stdout=StringIO())
+        self.assertEqual(self.counts(), (3, 0))
+        call_command("reconcile_post_counters", "--verify", stdout=StringIO())
+
+    def test_reconcile_keeps_a_comment_landing_mid_run(self):
+        Post.objects.update(like_count=7)
+        recount = reconcile_post_counters._recount
+
+        def comment_then_recount(model):
+            # lands after the drift was read, before the repair writes
+            if model is Comment:
+                Comment.objects.create(post=self.post, author=self.author, body="late")
+            return recount(model)
+
+        with patch.object(reconcile_post_counters, "_recount", comment_then_recount):
+            call_command("reconcile_post_counters", stdout=StringIO())
+        self.assertEqual(self.counts(), (0, 1))
+
+
+class LikeEndpointTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="liker", password="pw")
+        self.post = Post.objects.create(author=self.user, content="hi")
+        self.client.force_login(self.user)
+
+    def hit(self, name, pk=None):
+        return self.client.post(reverse(f"posts:{name}", args=[pk or self.post.pk]))
+
+    def test_like_and_unlike_are_idempotent(self):
+        self.assertEqual(self.hit("api_like").json(), {"liked": True, "count": 1})
+        self.assertEqual(self.hit("api_like").json(), {"liked": True, "count": 1})
+        self.assertEqual(self.hit("api_unlike").json(), {"liked": False, "count": 0})
+        self.assertEqual(self.hit("api_unlike").json(), {"liked": False, "count": 0})
+        self.assertFalse(self.post.likes.exists())
+
+    def test_toggle_statements(self):
+        def toggle():
+            with CaptureQueriesContext(connection) as ctx:
+                result = Post.toggle_like(self.post.pk, self.user)
+            statements = [q["sql"] for q in ctx.captured_queries if not q["sql"].startswith(("SAVEPOINT", "RELEASE"))]
+            return result, len(statements)
+
+        if connection.vendor == "postgresql":
+            self.assertEqual(toggle(), ((True, 1), 1))
+            self.assertEqual(toggle(), ((False, 0), 1))
+        else:
+            # the DELETE miss, the INSERT and the UPDATE .. RETURNING; then the DELETE hit and the UPDATE
+            self.assertEqual(toggle(), ((True, 1), 3))
+            self.assertEqual(toggle(), ((False, 0), 2))
+
+    def test_missing_post_is_404(self):
+        for name in ("api_like", "api_unlike", "api_like_toggle"):
+            self.assertEqual(self.hit(name, uuid.uuid4()).status_code, 404)
+
+
+class ConcurrentLikeTests(TransactionTestCase):
+    TAPS = 120
+
+    def setUp(self):
+        self.users = [User.objects.create_user(username=f"tapper{i}", password="pw") for i in range(6)]
+        self.post = Post.objects.create(author=self.users[0], content="hot take")
+
+    def _tap(self, i):
+        try:
+            return Post.toggle_like(self.post.pk, self.users[i % len(self.users)])
+        finally:
+            connection.close()
+
+    def test_parallel_toggles_keep_count_consistent(self):
+        with ThreadPoolExecutor(max_workers=12) as pool:
+            results = list(pool.map(self._tap, range(self.TAPS)))
+
+        self.assertNotIn(None, results)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, self.post.likes.count())
+        # each response saw a count that some serial order of toggles could produce
+        self.assertTrue(all(0 <= count <= len(self.users) for _, count in results))
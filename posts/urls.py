@@ -12,11 +12,14 @@ urlpatterns = [
 
     # APIs
     path("api/", views.api_post_list, name="api_list"),
+    path("api/feed/", views.api_feed, name="api_feed"),
     path("api/create/", views.api_create, name="api_create"),
     path("api/<uuid:pk>/", views.api_post_detail, name="api_detail"),
     path("api/<uuid:pk>/update/", views.api_post_update, name="api_update"),
     path("api/<uuid:pk>/delete/", views.api_post_delete, name="api_delete"),
     path("api/<uuid:pk>/like-toggle/", views.api_like_toggle, name="api_like_toggle"),
+    path("api/<uuid:pk>/like/", views.api_like, name="api_like"),
+    path("api/<uuid:pk>/unlike/", views.api_unlike, name="api_unlike"),
     path("api/<uuid:pk>/comment/", views.api_comment_create, name="api_comment_create"),
     path("api/comment/<uuid:cid>/delete/", views.api_comment_delete, name="api_comment_delete"),
 ]
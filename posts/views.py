@@ -3,36 +3,74 @@ from django.http import JsonResponse, HttpResponseForbidden, HttpResponseRedirec
 from django.shortcuts import get_object_or_404, render, redirect
 from django.views.decorators.http import require_POST
 from django.views.decorators.csrf import csrf_exempt
-from django.core.paginator import Paginator
-from django.db.models import Count, Q
+from django.db.models import Exists, OuterRef
 from django.template.loader import render_to_string
 
+from search.index import filter_queryset
+from velp.pagination import keyset_page, encode_cursor
+
 from .models import Post, Comment
 from .forms import PostForm, CommentForm
 
 
+def _liked_by(user_id):
+    """EXISTS subquery: has ``user_id`` liked the outer post?"""
+    return Exists(Post.likes.through.objects.filter(post_id=OuterRef("pk"), user_id=user_id))
+
+
+def _feed_queryset(user_id):
+    """Posts with author and the viewer's like state in a single query"""
+    return Post.objects.select_related("author").annotate(is_liked=_liked_by(user_id))
+
+
+# newest first; id breaks ties between posts created in the same instant
+FEED_KEYS = [("created_at", True), ("id", True)]
+FEED_PAGE_SIZE = 10
+FEED_API_PAGE_SIZE = 20
+FEED_API_MAX_PAGE_SIZE = 100
+
+
+def _search(qs, q):
+    return filter_queryset(qs, q) if q else qs
+
+
+def _serialize_post(p, uid):
+    return {
+        "id": str(p.id),
+        "author": p.author.username,
+        "content": p.content,
+        "venue_hint": p.venue_hint,
+        "created_at": p.created_at.strftime("%Y-%m-%d %H:%M"),
+        "updated_at": p.updated_at.strftime("%Y-%m-%d %H:%M"),
+        "like_count": p.like_count,
+        "comment_count": p.comment_count,
+        "is_liked": p.is_liked,
+        "is_owner": p.author_id == uid,
+    }
+
+
 @login_required
 def post_list(request):
     q = (request.GET.get("q") or "").strip()
 
-    qs = Post.objects.select_related("author").order_by("-created_at")
+    qs = _search(_feed_queryset(request.user.id), q)
 
-    if q:
-        qs = qs.filter(Q(content__icontains=q) | Q(venue_hint__icontains=q))
-
-    page_str = request.GET.get("page") or "1"
     try:
-        page_num = int(page_str)
+        page = keyset_page(qs, FEED_KEYS, request.GET.get("cursor"), FEED_PAGE_SIZE)
     except ValueError:
-        page_num = 1
+        return redirect("posts:list")
 
-    page_obj = Paginator(qs, 10).get_page(page_num)
-    return render(request, "list.html", {"page_obj": page_obj, "q": q})
+    return render(request, "list.html", {
+        "posts": page.items,
+        "next_cursor": page.next_cursor,
+        "prev_cursor": page.prev_cursor,
+        "q": q,
+    })
 
 
 @login_required
 def post_detail(request, pk):
-    post = get_object_or_404(Post, pk=pk)
+    post = get_object_or_404(_feed_queryset(request.user.id).prefetch_related("comments__author"), pk=pk)
     return render(request, "detail.html", {"post": post, "comment_form": CommentForm()})
 
 
@@ -66,48 +104,57 @@ def post_delete(request, pk):
 def api_post_list(request):
     q = (request.GET.get("q") or "").strip()
 
-    qs = (
-        Post.objects.select_related("author")
-        .annotate(
-            like_count=Count("likes", distinct=True),
-            comment_count=Count("comments", distinct=True),
-        )
-        .order_by("-created_at")
-    )
-
-    if q:
-        qs = qs.filter(Q(content__icontains=q) | Q(venue_hint__icontains=q))
+    qs = _search(_feed_queryset(request.user.id), q).order_by("-created_at")
 
-    data = []
     uid = request.user.id
-    for p in qs[:50]:
-        data.append(
-            {
-                "id": str(p.id),
-                "author": p.author.username,
-                "content": p.content,
-                "venue_hint": p.venue_hint,
-                "created_at": p.created_at.strftime("%Y-%m-%d %H:%M"),
-                "updated_at": p.updated_at.strftime("%Y-%m-%d %H:%M"),
-                "like_count": p.like_count,
-                "comment_count": p.comment_count,
-                "is_liked": p.likes.filter(id=uid).exists(),
-                "is_owner": p.author_id == uid,
-            }
-        )
+    data = [_serialize_post(p, uid) for p in qs[:50]]
     return JsonResponse(data, safe=False)
 
 
+@login_required
+def api_feed(request):
+    """
+    Infinite feed, newest first: ?q=&size=&cursor=  or  ?since=
+
+    Keyset-paginated on (created_at, id), so a deep page costs the same as
+    the first one. ``next`` pages to older posts, ``prev`` back to newer
+    ones. ``latest`` marks the newest post returned; polling with
+    ?since=<latest> returns only posts created after it, the oldest ``size``
+    of them first, with ``prev`` set while newer ones are still waiting.
+    """
+    q = (request.GET.get("q") or "").strip()
+    since = request.GET.get("since")
+    try:
+        size = min(max(int(request.GET.get("size", FEED_API_PAGE_SIZE)), 1), FEED_API_MAX_PAGE_SIZE)
+        page = keyset_page(_search(_feed_queryset(request.user.id), q), FEED_KEYS,
+                           since or request.GET.get("cursor"), size)
+    except ValueError:
+        return JsonResponse({"detail": "Invalid cursor or size"}, status=400)
+
+    uid = request.user.id
+    items = page.items
+    if items:
+        latest = encode_cursor([items[0].created_at, items[0].id], backwards=True)
+    else:
+        latest = since
+    return JsonResponse({
+        "results": [_serialize_post(p, uid) for p in items],
+        "next": page.next_cursor,
+        "prev": page.prev_cursor,
+        "latest": latest,
+    })
+
+
 @login_required
 def api_post_detail(request, pk):
-    post = get_object_or_404(Post.objects.select_related("author"), pk=pk)
+    uid = request.user.id
+    post = get_object_or_404(_feed_queryset(uid), pk=pk)
 
     comments_qs = (
         post.comments.select_related("author")
         .order_by("created_at")
     )
 
-    uid = request.user.id
     comments = []
     for c in comments_qs:
         comments.append(
@@ -128,9 +175,9 @@ def api_post_detail(request, pk):
             "venue_hint": post.venue_hint,
             "created_at": post.created_at.strftime("%Y-%m-%d %H:%M"),
             "updated_at": post.updated_at.strftime("%Y-%m-%d %H:%M"),
-            "like_count": post.likes.count(),
-            "comment_count": post.comments.count(),
-            "is_liked": post.likes.filter(id=uid).exists(),
+            "like_count": post.like_count,
+            "comment_count": post.comment_count,
+            "is_liked": post.is_liked,
             "is_owner": post.author_id == uid,
             "comments": comments,
         }
@@ -183,21 +230,32 @@ def api_post_delete(request, pk):
     return JsonResponse({"detail": "DELETED"})
 
 
+def _like_response(result):
+    if result is None:
+        return JsonResponse({"detail": "NOT_FOUND"}, status=404)
+    liked, count = result
+    return JsonResponse({"liked": liked, "count": count})
+
+
 @csrf_exempt
 @login_required
 @require_POST
 def api_like_toggle(request, pk):
-    post = get_object_or_404(Post, pk=pk)
-    user = request.user
+    return _like_response(Post.toggle_like(pk, request.user))
+
+
+@csrf_exempt
+@login_required
+@require_POST
+def api_like(request, pk):
+    return _like_response(Post.set_like(pk, request.user, True))
 
-    if post.likes.filter(id=user.id).exists():
-        post.likes.remove(user)
-        liked = False
-    else:
-        post.likes.add(user)
-        liked = True
 
-    return JsonResponse({"liked": liked, "count": post.likes.count()})
+@csrf_exempt
+@login_required
+@require_POST
+def api_unlike(request, pk):
+    return _like_response(Post.set_like(pk, request.user, False))
 
 
 @csrf_exempt
@@ -212,6 +270,7 @@ def api_comment_create(request, pk):
         c.post = post
         c.author = request.user
         c.save()
+        post.refresh_from_db(fields=["comment_count"])
 
         return JsonResponse(
             {
@@ -220,7 +279,7 @@ def api_comment_create(request, pk):
                 "author": request.user.username,
                 "body": c.body,
                 "created_at": c.created_at.strftime("%Y-%m-%d %H:%M"),
-                "count": post.comments.count(),
+                "count": post.comment_count,
             },
             status=201,
         )
@@ -239,4 +298,5 @@ def api_comment_delete(request, cid):
 
     post = c.post
     c.delete()
-    return JsonResponse({"detail": "DELETED", "count": post.comments.count()})
+    post.refresh_from_db(fields=["comment_count"])
+    return JsonResponse({"detail": "DELETED", "count": post.comment_count})
@@ -1,7 +1,13 @@
 from django.contrib import admin
-from .models import Report # Import your model
+from .models import Report, ReportTarget # Import your model
 
 @admin.register(Report)
 class ReportAdmin(admin.ModelAdmin):
     # This makes the UUID (id) and other fields visible in the list
-    list_display = ('id', 'target_type', 'target_name', 'reason', 'status')
\ No newline at end of file
+    list_display = ('id', 'target_type', 'target_name', 'reason', 'status')
+
+
+@admin.register(ReportTarget)
+class ReportTargetAdmin(admin.ModelAdmin):
+    list_display = ('id', 'target_type', 'target_name', 'open_count', 'reporter_count', 'severity', 'escalated_at')
+    ordering = ('-severity', '-id')
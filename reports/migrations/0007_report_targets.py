@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_rollups(apps, schema_editor):
+    from reports.models import rebuild_rollup
+
+    Report = apps.get_model('reports', 'Report')
+    ReportTarget = apps.get_model('reports', 'ReportTarget')
+    targets = Report.objects.order_by().values_list('content_type_id', 'object_id').distinct()
+    for content_type_id, object_id in targets.iterator():
+        rebuild_rollup(Report, ReportTarget, content_type_id, object_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('reports', '0006_report_queue_index'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='report',
+            unique_together=set(),
+        ),
+        migrations.CreateModel(
+            name='ReportTarget',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.CharField(max_length=64)),
+                ('target_type', models.CharField(choices=[('venue', 'Venue'), ('review', 'Review'), ('post', 'Post'), ('comment', 'Comment'), ('community', 'Community')], max_length=20)),
+                ('open_count', models.PositiveIntegerField(default=0)),
+                ('reporter_count', models.PositiveIntegerField(default=0)),
+                ('reason_counts', models.JSONField(default=dict)),
+                ('severity', models.PositiveIntegerField(default=0)),
+                ('first_reported_at', models.DateTimeField(null=True)),
+                ('last_reported_at', models.DateTimeField(null=True)),
+                ('escalated_at', models.DateTimeField(blank=True, null=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'db_table': 'report_targets',
+                'indexes': [models.Index(fields=['severity', 'id'], name='report_targets_severity_idx')],
+                'constraints': [models.UniqueConstraint(fields=('content_type', 'object_id'), name='uq_report_target')],
+            },
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
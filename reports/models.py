@@ -1,10 +1,26 @@
 # reports/models.py
 from django.conf import settings
-from django.db import models
+from django.db import models, transaction
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.utils import timezone
-from django.db.models import Q, UniqueConstraint
+from django.db.models import Count, Max, Min, Q, UniqueConstraint
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+def target_display_name(obj) -> str:
+    """
+    Try common name-like attributes across apps; fall back to __str__.
+    Works for Venue (name), Post (title), User (username), etc.
+    """
+    if not obj:
+        return "-"
+    for attr in ("name", "title", "username"):
+        val = getattr(obj, attr, None)
+        if val:
+            return str(val)
+    return str(obj)  # fallback to __str__
+
 
 class Report(models.Model):
     class TargetType(models.TextChoices):
@@ -58,20 +74,14 @@ class Report(models.Model):
             self.resolved_at = timezone.now()
         self.save(update_fields=["status", "handled_by", "resolved_at"])
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            ReportTarget.refresh(self.content_type_id, self.object_id)
+
     @property
     def target_name(self) -> str:
-        """
-        Try common name-like attributes across apps; fall back to __str__.
-        Works for Venue (name), Post (title), User (username), etc.
-        """
-        obj = self.target
-        if not obj:
-            return "-"
-        for attr in ("name", "title", "username"):
-            val = getattr(obj, attr, None)
-            if val:
-                return str(val)
-        return str(obj)  # fallback to __str__
+        return target_display_name(self.target)
 
     def __str__(self):
         return f"Report #{self.pk} - {self.get_reason_display()} on {self.get_target_type_display()} by {self.reporter.username}"
@@ -80,10 +90,8 @@ class Report(models.Model):
         db_table = "reports"
         indexes = [
             models.Index(fields=["content_type", "object_id", "status"]),
-        ]
-
-        unique_together = [
-            ['reporter', 'content_type', 'object_id', 'status']
+            # moderation queue pages, newest or oldest first within a status
+            models.Index(fields=["status", "created_at", "id"], name="reports_queue_idx"),
         ]
 
         constraints = [
@@ -93,4 +101,108 @@ class Report(models.Model):
                 condition=Q(status="open"),
                 name="uq_open_report_per_user_target",
             ),
-        ]
\ No newline at end of file
+        ]
+
+
+class ReportTarget(models.Model):
+    """
+    Rollup of every report filed against one target, so staff can triage a
+    post reported 200 times as one row. Rebuilt from that target's reports
+    (one aggregate over the (content_type, object_id, status) index) whenever
+    one of them is saved or deleted.
+    """
+    # how much an open report of each reason adds to a target's severity
+    REASON_WEIGHTS = {
+        Report.Reason.SCAM: 3,
+        Report.Reason.INAPPROPRIATE: 3,
+        Report.Reason.FALSE_INFO: 2,
+        Report.Reason.SPAM: 1,
+        Report.Reason.OTHER: 1,
+    }
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.CharField(max_length=64)
+    target = GenericForeignKey("content_type", "object_id")
+    target_type = models.CharField(max_length=20, choices=Report.TargetType.choices)
+
+    open_count = models.PositiveIntegerField(default=0)
+    reporter_count = models.PositiveIntegerField(default=0)
+    reason_counts = models.JSONField(default=dict)  # open reports per reason
+    severity = models.PositiveIntegerField(default=0)
+    first_reported_at = models.DateTimeField(null=True)
+    last_reported_at = models.DateTimeField(null=True)
+    # stamped the first time severity reaches REPORT_ESCALATION_SEVERITY
+    escalated_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = "report_targets"
+        constraints = [
+            UniqueConstraint(fields=["content_type", "object_id"], name="uq_report_target"),
+        ]
+        indexes = [
+            models.Index(fields=["severity", "id"], name="report_targets_severity_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_target_type_display()} {self.object_id}: {self.open_count} open"
+
+    @property
+    def target_name(self) -> str:
+        return target_display_name(self.target)
+
+    @property
+    def is_escalated(self):
+        return self.escalated_at is not None
+
+    @classmethod
+    def refresh(cls, content_type_id, object_id):
+        """Recompute the rollup of one target from its reports; returns it (or None if none are left)"""
+        return rebuild_rollup(Report, cls, content_type_id, object_id)
+
+
+def rebuild_rollup(report_model, target_model, content_type_id, object_id):
+    # takes the models as arguments so migrations can run it on historical models
+    reports = report_model.objects.filter(content_type_id=content_type_id, object_id=object_id)
+    target_type = reports.values_list("target_type", flat=True).first()
+    rollups = target_model.objects.filter(content_type_id=content_type_id, object_id=object_id)
+    if target_type is None:
+        rollups.delete()
+        return None
+
+    # lock the rollup row before counting, so a concurrent rebuild of the same
+    # target waits and then counts this transaction's reports too
+    rollup, _ = rollups.select_for_update().get_or_create(
+        content_type_id=content_type_id,
+        object_id=object_id,
+        defaults={"target_type": target_type},
+    )
+    is_open = Q(status=Report.Status.OPEN)
+    stats = reports.aggregate(
+        total=Count("id"),
+        open_count=Count("id", filter=is_open),
+        reporter_count=Count("reporter", distinct=True),
+        first_reported_at=Min("created_at"),
+        last_reported_at=Max("created_at"),
+        **{reason: Count("id", filter=is_open & Q(reason=reason)) for reason in Report.Reason.values},
+    )
+    if not stats.pop("total"):
+        rollup.delete()
+        return None
+
+    reason_counts = {reason: stats.pop(reason) for reason in Report.Reason.values}
+    reason_counts = {reason: n for reason, n in reason_counts.items() if n}
+    severity = sum(ReportTarget.REASON_WEIGHTS[reason] * n for reason, n in reason_counts.items())
+
+    for field, value in stats.items():
+        setattr(rollup, field, value)
+    rollup.reason_counts = reason_counts
+    rollup.severity = severity
+    if rollup.escalated_at is None and severity >= settings.REPORT_ESCALATION_SEVERITY:
+        rollup.escalated_at = timezone.now()
+    rollup.save()
+    return rollup
+
+
+@receiver(post_delete, sender=Report)
+def refresh_report_target(sender, instance, **kwargs):
+    ReportTarget.refresh(instance.content_type_id, instance.object_id)
@@ -1,3 +1,156 @@
-from django.test import TestCase
+import datetime
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from community.models import Group
+from main.models import Venue
+from posts.models import Comment, Post
+from review.models import Review
+
+from .models import Report, ReportTarget
+
+
+class ModerationQueueTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username="mod", password="pw", is_staff=True)
+        self.client.force_login(self.staff)
+        self.client.get(reverse("reports:mod_list"))  # warm the cached request user
+        self.n = 0
+
+    def make_targets(self):
+        self.n += 1
+        author = User.objects.create_user(username=f"author{self.n}", password="pw")
+        venue = Venue.objects.create(name=f"Venue {self.n}", CityName="Jakarta", StreetName="Jalan")
+        post = Post.objects.create(author=author, content="spam spam")
+        return [
+            ("venue", venue),
+            ("review", Review.objects.create(
+                user=author, venue=venue, accessibility=1, facility=1, value_for_money=1)),
+            ("post", post),
+            ("comment", Comment.objects.create(post=post, author=author, body="buy now")),
+            ("community", Group.objects.create(name=f"Group {self.n}", owner=author)),
+        ]
+
+    def report_all(self, reason="spam"):
+        reporter = User.objects.create_user(username=f"reporter{self.n}", password="pw")
+        for target_type, obj in self.make_targets():
+            Report.objects.create(
+                reporter=reporter,
+                content_type=ContentType.objects.get_for_model(obj),
+                object_id=str(obj.pk),
+                target_type=target_type,
+                reason=reason,
+            )
+
+    def queue(self, **params):
+        resp = self.client.get(reverse("reports:mod_list"), params)
+        self.assertEqual(resp.status_code, 200)
+        return resp.json()
+
+    def test_queue_query_count_is_flat(self):
+        self.report_all()
+        with CaptureQueriesContext(connection) as small:
+            self.queue()
+        for _ in range(6):
+            self.report_all()
+        with CaptureQueriesContext(connection) as large:
+            data = self.queue()
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(len(data["reports"]), 25)
+        self.assertNotIn("-", [r["target_name"] for r in data["reports"]])
+
+    def test_filters_and_paging(self):
+        self.report_all(reason="spam")
+        self.report_all(reason="scam")
+        Report.objects.filter(target_type="venue").update(status="resolved")
+        Report.objects.filter(target_type="post").update(created_at=timezone.now() - datetime.timedelta(days=3))
+
+        open_scams = self.queue(status="open", reason="scam")["reports"]
+        self.assertEqual(sorted(r["target_type"] for r in open_scams), ["comment", "community", "post", "review"])
+        old = self.queue(older_than=48)["reports"]
+        self.assertEqual([r["target_type"] for r in old], ["post", "post"])
+
+        seen, cursor = [], None
+        while True:
+            page = self.queue(size=3, order="oldest", **({"cursor": cursor} if cursor else {}))
+            seen += [r["id"] for r in page["reports"]]
+            if not (cursor := page["next"]):
+                break
+        self.assertEqual(len(seen), 10)
+        self.assertEqual(len(set(seen)), 10)
+
+        resp = self.client.get(reverse("reports:mod_list"), {"status": "bogus"})
+        self.assertEqual(resp.status_code, 400)
+
+
+@override_settings(REPORT_ESCALATION_SEVERITY=6)
+class ReportRollupTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user(username="mod", password="pw", is_staff=True)
+        author = User.objects.create_user(username="spammer", password="pw")
+        self.spam = Post.objects.create(author=author, content="promo")
+        self.other = Post.objects.create(author=author, content="hello")
+        self.reporters = [User.objects.create_user(username=f"r{i}", password="pw") for i in range(4)]
+
+    def report(self, user, post, reason):
+        self.client.force_login(user)
+        resp = self.client.post(reverse("reports:create"), {
+            "target_type": "post", "object_id": str(post.pk), "reason": reason,
+        })
+        self.assertEqual(resp.status_code, 201)
+
+    def targets(self, **params):
+        self.client.force_login(self.staff)
+        return self.client.get(reverse("reports:mod_targets"), params).json()["targets"]
+
+    def test_rollup_severity_and_bulk_resolution(self):
+        for user in self.reporters[:3]:
+            self.report(user, self.spam, "spam")
+        self.report(self.reporters[3], self.spam, "scam")
+        self.report(self.reporters[0], self.other, "other")
+
+        top, second = self.targets()
+        self.assertEqual(top["object_id"], str(self.spam.pk))
+        self.assertEqual((top["open_count"], top["reporter_count"], top["severity"]), (4, 4, 6))
+        self.assertEqual(top["reasons"], {"spam": 3, "scam": 1})
+        self.assertTrue(top["escalated"])
+        self.assertFalse(second["escalated"])
+
+        with CaptureQueriesContext(connection) as ctx:
+            resp = self.client.post(reverse("reports:mod_target_status", args=[top["id"]]), {"status": "resolved"})
+        self.assertEqual(resp.json()["updated"], 4)
+        self.assertLess(len(ctx), 15)
+        self.assertEqual(Report.objects.filter(object_id=str(self.spam.pk), status="resolved").count(), 4)
+        self.assertEqual([t["object_id"] for t in self.targets()], [str(self.other.pk)])
+
+        # the same users can report the target again once their reports are closed
+        self.report(self.reporters[0], self.spam, "spam")
+        rollup = ReportTarget.objects.get(object_id=str(self.spam.pk))
+        self.assertEqual((rollup.open_count, rollup.reporter_count), (1, 4))
+
+    def test_bad_target_type_is_400_on_both_queues(self):
+        self.client.force_login(self.staff)
+        for name in ("reports:mod_list", "reports:mod_targets"):
+            self.assertEqual(self.client.get(reverse(name), {"target_type": "post,nope"}).status_code, 400, name)
+            self.assertEqual(self.client.get(reverse(name), {"target_type": "post"}).status_code, 200, name)
+
+    def test_deleting_reports_updates_rollup(self):
+        self.report(self.reporters[0], self.other, "spam")
+        self.client.post(reverse("reports:delete", args=[Report.objects.get().pk]))
+        self.assertFalse(ReportTarget.objects.exists())
+
+    def test_target_status_allows_superusers_like_the_queue(self):
+        self.report(self.reporters[0], self.spam, "spam")
+        target = ReportTarget.objects.get()
+        url = reverse("reports:mod_target_status", args=[target.pk])
+        self.client.force_login(self.reporters[1])
+        self.assertEqual(self.client.post(url, {"status": "resolved"}).status_code, 403)
+        admin = User.objects.create_user(username="admin", password="pw", is_superuser=True)
+        self.client.force_login(admin)
+        self.assertEqual(self.client.post(url, {"status": "resolved"}).json()["updated"], 1)
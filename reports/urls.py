@@ -1,7 +1,8 @@
 from django.urls import path
 from reports.views import (
     create_report, mod_list, my_reports, update_report, 
-    update_report_status, delete_report, mod_detail, get_report_options
+    update_report_status, delete_report, mod_detail, get_report_options,
+    mod_targets, mod_target_status,
 )
 app_name = "reports"
 
@@ -14,4 +15,6 @@ urlpatterns = [
     path("update/<int:pk>/status/", update_report_status, name="update_status"),
     path("delete/<int:pk>/", delete_report, name="delete"),
     path("mod/<int:pk>/", mod_detail, name="mod_detail"),
+    path("mod/targets/", mod_targets, name="mod_targets"),
+    path("mod/targets/<int:pk>/status/", mod_target_status, name="mod_target_status"),
 ]
\ No newline at end of file
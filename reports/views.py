@@ -3,12 +3,15 @@ from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_POST
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
+from datetime import timedelta
 from django.db.models import Q
-from django.core.paginator import Paginator
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.contenttypes.prefetch import GenericPrefetch
+from django.utils import timezone
 from django.db import transaction
 from django.views.decorators.csrf import csrf_exempt
-from .models import Report
+from velp.pagination import keyset_page
+from .models import Report, ReportTarget
 from .forms import ReportUpdateForm, ReportCreateForm
 
 # Model imports
@@ -26,6 +29,60 @@ TARGET_MODEL = {
     "comment": Comment,
 }
 
+REPORT_PAGE_SIZE = 25
+REPORT_MAX_PAGE_SIZE = 100
+QUEUE_ORDERS = {
+    "newest": [("created_at", True), ("id", True)],
+    "oldest": [("created_at", False), ("id", False)],
+}
+
+
+def with_targets(queryset):
+    """
+    Prefetch every report's target with one query per target type, including
+    whatever the target's name or __str__ reads (Review -> user and venue...).
+    """
+    return queryset.prefetch_related(GenericPrefetch("target", [
+        Venue.objects.all(),
+        Review.objects.select_related("user", "venue"),
+        Post.objects.select_related("author"),
+        Group.objects.all(),
+        Comment.objects.select_related("author"),
+    ]))
+
+
+def _filter_reports(request, qs):
+    """
+    ?status=, ?target_type= and ?reason= (each may be comma separated) and
+    ?older_than= / ?newer_than= in hours. Raises ValueError on bad input.
+    """
+    for param, choices in (
+        ("status", Report.Status.values),
+        ("target_type", Report.TargetType.values),
+        ("reason", Report.Reason.values),
+    ):
+        values = [v for v in (request.GET.get(param) or "").split(",") if v]
+        if any(v not in choices for v in values):
+            raise ValueError(f"Invalid {param}")
+        if values:
+            qs = qs.filter(**{f"{param}__in": values})
+
+    now = timezone.now()
+    for param, lookup in (("older_than", "created_at__lte"), ("newer_than", "created_at__gte")):
+        if request.GET.get(param):
+            try:
+                age = timedelta(hours=float(request.GET[param]))
+            except OverflowError:
+                raise ValueError(f"Invalid {param}")
+            qs = qs.filter(**{lookup: now - age})
+    return qs
+
+
+def _report_page(request, qs):
+    size = min(max(int(request.GET.get("size", REPORT_PAGE_SIZE)), 1), REPORT_MAX_PAGE_SIZE)
+    keys = QUEUE_ORDERS.get(request.GET.get("order"), QUEUE_ORDERS["newest"])
+    return keyset_page(with_targets(_filter_reports(request, qs)), keys, request.GET.get("cursor"), size)
+
 def get_json_data(request):
     """Helper to get JSON data from request body or POST"""
     if request.content_type == 'application/json':
@@ -89,29 +146,44 @@ def create_report(request):
 @csrf_exempt
 @login_required
 def my_reports(request):
-    """Displays history for the logged-in user"""
-    qs = Report.objects.filter(reporter=request.user).select_related('reporter', 'handled_by', 'content_type').order_by('-created_at')
+    """Displays history for the logged-in user; same paging and filters as mod_list"""
+    qs = Report.objects.filter(reporter=request.user).select_related('handled_by')
+    try:
+        page = _report_page(request, qs)
+    except ValueError:
+        return JsonResponse({"ok": False, "message": "Invalid filter, cursor or size."}, status=400)
     reports_data = [{
         'id': r.pk, 'target_type': r.target_type, 'object_id': r.object_id,
         'reason': r.reason, 'details': r.details, 'status': r.status,
         'is_locked': r.is_locked, 'target_name': r.target_name,
-    } for r in qs]
-    return JsonResponse({"ok": True, "reports": reports_data})
+    } for r in page.items]
+    return JsonResponse({"ok": True, "reports": reports_data, "next": page.next_cursor, "prev": page.prev_cursor})
 
 @csrf_exempt
 @login_required
 def mod_list(request):
-    """Admin dashboard list"""
+    """
+    Moderation queue for staff:
+    ?status=&target_type=&reason=&older_than=&newer_than=&order=newest|oldest&cursor=&size=
+
+    Keyset-paginated, with targets prefetched per content type, so a page
+    costs the same handful of queries however many reports are open.
+    """
     if not (request.user.is_staff or request.user.is_superuser):
         return JsonResponse({"ok": False, "message": "Forbidden"}, status=403)
-    
-    qs = Report.objects.select_related("reporter", "handled_by", "content_type").order_by("-created_at")
+
+    qs = Report.objects.select_related("reporter", "handled_by")
+    try:
+        page = _report_page(request, qs)
+    except ValueError:
+        return JsonResponse({"ok": False, "message": "Invalid filter, cursor or size."}, status=400)
     reports_data = [{
         'id': r.pk, 'reporter': r.reporter.username, 'target_type': r.target_type,
         'reason': r.reason, 'details': r.details, 'status': r.status,
         'target_name': r.target_name, 'is_locked': r.is_locked,
-    } for r in qs]
-    return JsonResponse({"ok": True, "reports": reports_data})
+        'created_at': r.created_at.isoformat(),
+    } for r in page.items]
+    return JsonResponse({"ok": True, "reports": reports_data, "next": page.next_cursor, "prev": page.prev_cursor})
 
 @csrf_exempt
 @require_POST
@@ -183,4 +255,76 @@ def get_report_options(request):
             "reasons": [{"value": c[0], "label": c[1]} for c in Report.Reason.choices],
             "statuses": [{"value": c[0], "label": c[1]} for c in Report.Status.choices],
         }
-    })
\ No newline at end of file
+    })
+
+
+TARGET_ORDER = [("severity", True), ("id", True)]
+
+
+@csrf_exempt
+@login_required
+def mod_targets(request):
+    """
+    Moderation queue grouped by target, most severe first:
+    ?target_type=&escalated=1&all=1&cursor=&size=
+
+    Only targets with open reports are listed unless ?all=1.
+    """
+    if not (request.user.is_staff or request.user.is_superuser):
+        return JsonResponse({"ok": False, "message": "Forbidden"}, status=403)
+
+    qs = ReportTarget.objects.all()
+    if not request.GET.get("all"):
+        qs = qs.filter(open_count__gt=0)
+    if request.GET.get("escalated"):
+        qs = qs.filter(escalated_at__isnull=False)
+    target_types = [v for v in (request.GET.get("target_type") or "").split(",") if v]
+    if target_types:
+        qs = qs.filter(target_type__in=target_types)
+    try:
+        # checked like _filter_reports does for the report queue
+        if any(v not in Report.TargetType.values for v in target_types):
+            raise ValueError("Invalid target_type")
+        size = min(max(int(request.GET.get("size", REPORT_PAGE_SIZE)), 1), REPORT_MAX_PAGE_SIZE)
+        page = keyset_page(with_targets(qs), TARGET_ORDER, request.GET.get("cursor"), size)
+    except ValueError:
+        return JsonResponse({"ok": False, "message": "Invalid filter, cursor or size."}, status=400)
+
+    targets_data = [{
+        'id': t.pk, 'target_type': t.target_type, 'object_id': t.object_id,
+        'target_name': t.target_name, 'severity': t.severity,
+        'open_count': t.open_count, 'reporter_count': t.reporter_count,
+        'reasons': t.reason_counts, 'escalated': t.is_escalated,
+        'first_reported_at': t.first_reported_at.isoformat() if t.first_reported_at else None,
+        'last_reported_at': t.last_reported_at.isoformat() if t.last_reported_at else None,
+    } for t in page.items]
+    return JsonResponse({"ok": True, "targets": targets_data, "next": page.next_cursor, "prev": page.prev_cursor})
+
+
+@csrf_exempt
+@require_POST
+@login_required
+def mod_target_status(request, pk: int):
+    """Resolve or reject every open or under-review report on one target at once"""
+    if not (request.user.is_staff or request.user.is_superuser):
+        return JsonResponse({"ok": False, "message": "Forbidden"}, status=403)
+
+    target = get_object_or_404(ReportTarget, pk=pk)
+    new_status = get_json_data(request).get('status')
+    if new_status not in (Report.Status.RESOLVED, Report.Status.REJECTED):
+        return JsonResponse({"ok": False, "message": "Status must be resolved or rejected."}, status=400)
+
+    now = timezone.now()
+    with transaction.atomic():
+        updated = Report.objects.filter(
+            content_type_id=target.content_type_id,
+            object_id=target.object_id,
+            status__in=[Report.Status.OPEN, Report.Status.UNDER_REVIEW],
+        ).update(
+            status=new_status,
+            handled_by=request.user,
+            resolved_at=now if new_status == Report.Status.RESOLVED else None,
+        )
+        ReportTarget.refresh(target.content_type_id, target.object_id)
+
+    return JsonResponse({"ok": True, "message": f"{updated} reports updated.", "updated": updated})
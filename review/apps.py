@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class ReviewConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'review'
+
+    def ready(self):
+        from velp.cache import invalidate_on
+        # a review moves its venue's rating columns through an UPDATE, which sends no signal
+        invalidate_on(self.get_model('Review'), 'venue')
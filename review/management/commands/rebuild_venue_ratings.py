@@ -0,0 +1,79 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from main.models import Venue
+from review.models import Review
+from velp.cache import tiered
+
+SUM_FIELDS = ['review_count', 'accessibility_sum', 'facility_sum', 'value_for_money_sum']
+
+
+def _total(value):
+    """``value`` over the venue's current reviews, as a correlated subquery"""
+    rows = Review.objects.filter(venue=OuterRef('pk')).order_by().values('venue').annotate(t=value)
+    return Coalesce(Subquery(rows.values('t'), output_field=IntegerField()), 0)
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized venue rating aggregates from the Review table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only report venues whose aggregates drifted; exit with an error if any did',
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        # one grouped query for every venue that has reviews
+        totals = {
+            row['venue']: (row['n'], row['a'], row['f'], row['v'])
+            for row in Review.objects.order_by().values('venue').annotate(
+                n=Count('id'),
+                a=Sum('accessibility'),
+                f=Sum('facility'),
+                v=Sum('value_for_money'),
+            )
+        }
+
+        drifted = []
+        checked = 0
+        for venue in Venue.objects.only('id', 'name', *SUM_FIELDS).iterator(chunk_size=batch_size):
+            checked += 1
+            expected = totals.get(venue.pk, (0, 0, 0, 0))
+            actual = tuple(getattr(venue, f) for f in SUM_FIELDS)
+            if actual != expected:
+                if options['verify']:
+                    self.stdout.write(f'{venue.pk} {venue.name}: stored {actual}, expected {expected}')
+                drifted.append(venue.pk)
+
+        if options['verify']:
+            if drifted:
+                raise CommandError(f'{len(drifted)} of {checked} venues have drifted rating aggregates.')
+            self.stdout.write(self.style.SUCCESS(f'All {checked} venues have correct rating aggregates.'))
+            return
+
+        # as in reconcile_post_counters: lock each batch, then total the
+        # reviews again at write time so none landing meanwhile is lost
+        for start in range(0, len(drifted), batch_size):
+            ids = drifted[start:start + batch_size]
+            with transaction.atomic():
+                list(Venue.objects.select_for_update().filter(pk__in=ids).values_list('pk', flat=True))
+                Venue.objects.filter(pk__in=ids).update(
+                    review_count=_total(Count('id')),
+                    accessibility_sum=_total(Sum('accessibility')),
+                    facility_sum=_total(Sum('facility')),
+                    value_for_money_sum=_total(Sum('value_for_money')),
+                )
+        # the averages follow from the sums within each row's own update
+        Venue.objects.update(**Venue.rating_aggregate_expressions())
+        tiered.invalidate('venue')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Checked {checked} venues, fixed {len(drifted)}.'
+        ))
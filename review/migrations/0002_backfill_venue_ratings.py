@@ -0,0 +1,34 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def backfill(apps, schema_editor):
+    Venue = apps.get_model('main', 'Venue')
+    Review = apps.get_model('review', 'Review')
+    rows = Review.objects.order_by().values('venue').annotate(
+        n=Count('id'), a=Sum('accessibility'), f=Sum('facility'), v=Sum('value_for_money'),
+    )
+    for row in rows:
+        n = row['n']
+        Venue.objects.filter(pk=row['venue']).update(
+            review_count=n,
+            accessibility_sum=row['a'],
+            facility_sum=row['f'],
+            value_for_money_sum=row['v'],
+            accessibility_avg=row['a'] / n,
+            facility_avg=row['f'] / n,
+            value_for_money_avg=row['v'] / n,
+            rating_avg=(row['a'] + row['f'] + row['v']) / (3 * n),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('review', '0001_initial'),
+        ('main', '0004_venue_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,7 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from main.models import Venue
 
@@ -17,10 +19,46 @@ class Review(models.Model):
     comment = models.TextField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # fields that feed the venue rating aggregates
+    AGGREGATE_FIELDS = {"venue_id", "accessibility", "facility", "value_for_money"}
+
+    def _aggregate_row(self):
+        return (self.venue_id, self.accessibility, self.facility, self.value_for_money)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # remember the stored ratings so save()/delete can move the venue aggregates
+        if not instance.get_deferred_fields() & cls.AGGREGATE_FIELDS:
+            instance._stored_row = instance._aggregate_row()
+        return instance
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            old = None
+            if not self._state.adding:
+                old = getattr(self, "_stored_row", None) or Review.objects.only(
+                    "venue", "accessibility", "facility", "value_for_money"
+                ).get(pk=self.pk)._aggregate_row()
+            super().save(*args, **kwargs)
+            new = self._aggregate_row()
+            if old != new:
+                if old:
+                    Venue.apply_review_delta(old[0], -1, *(-x for x in old[1:]))
+                Venue.apply_review_delta(new[0], 1, *new[1:])
+            self._stored_row = new
+
     def average_rating(self):
         """average value of criteria ratings"""
         total = self.accessibility + self.facility + self.value_for_money
         return round(total / 3, 1)
 
     def __str__(self):
-        return f"{self.user.username} - {self.venue.name} ({self.average_rating()}/5)"
\ No newline at end of file
+        return f"{self.user.username} - {self.venue.name} ({self.average_rating()}/5)"
+
+
+@receiver(post_delete, sender=Review)
+def remove_review_from_venue(sender, instance, **kwargs):
+    """Keep venue aggregates right for every delete path, including cascades"""
+    venue_id, *ratings = getattr(instance, "_stored_row", None) or instance._aggregate_row()
+    Venue.apply_review_delta(venue_id, -1, *(-x for x in ratings))
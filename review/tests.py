@@ -1,3 +1,96 @@
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db.models import Count
 from django.test import TestCase
 
-# Create your tests here.
+from main.models import Venue
+from review.management.commands import rebuild_venue_ratings
+from review.models import Review
+
+
+class VenueAggregateTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="reviewer", password="pw")
+        self.venue = Venue.objects.create(name="Lapangan A", CityName="DKI Jakarta", StreetName="Jalan A")
+        self.other = Venue.objects.create(name="Lapangan B", CityName="DKI Jakarta", StreetName="Jalan B")
+
+    def review(self, venue, a, f, v):
+        return Review.objects.create(user=self.user, venue=venue, accessibility=a, facility=f, value_for_money=v)
+
+    def aggregates(self, venue):
+        venue.refresh_from_db()
+        return (venue.review_count, venue.accessibility_sum, venue.facility_sum,
+                venue.value_for_money_sum, round(venue.rating_avg, 4), round(venue.rating_score, 4))
+
+    def test_create_edit_and_move(self):
+        self.review(self.venue, 5, 4, 3)
+        second = self.review(self.venue, 1, 2, 3)
+        self.assertEqual(self.aggregates(self.venue), (2, 6, 6, 6, 3.0, 3.0))
+        self.assertEqual(self.venue.accessibility_avg, 3.0)
+
+        second.accessibility = 5
+        second.save()
+        # (5 * 3.0 + 22 / 3) / (5 + 2)
+        self.assertEqual(self.aggregates(self.venue), (2, 10, 6, 6, round(22 / 6, 4), round(67 / 21, 4)))
+
+        second.venue = self.other
+        second.save()
+        self.assertEqual(self.aggregates(self.venue), (1, 5, 4, 3, 4.0, round(19 / 6, 4)))
+        self.assertEqual(self.aggregates(self.other)[:4], (1, 5, 2, 3))
+
+    def test_deletes_reverse_the_review(self):
+        first = self.review(self.venue, 5, 5, 5)
+        self.review(self.venue, 2, 2, 2)
+        first.delete()
+        self.assertEqual(self.aggregates(self.venue), (1, 2, 2, 2, 2.0, round(17 / 6, 4)))
+
+        # queryset deletes and cascades go through post_delete too
+        Review.objects.filter(venue=self.venue).delete()
+        self.assertEqual(self.aggregates(self.venue), (0, 0, 0, 0, 0.0, 3.0))
+        self.review(self.other, 4, 4, 4)
+        self.user.delete()
+        self.assertEqual(self.aggregates(self.other)[:4], (0, 0, 0, 0))
+
+    def test_venue_save_keeps_concurrent_aggregates(self):
+        stale = Venue.objects.get(pk=self.venue.pk)
+        self.review(self.venue, 5, 5, 5)
+        stale.name = "Lapangan A2"
+        stale.save()
+        self.assertEqual(self.aggregates(self.venue), (1, 5, 5, 5, 5.0, round(20 / 6, 4)))
+        self.assertEqual(self.venue.name, "Lapangan A2")
+
+    def test_edit_views_keep_aggregates(self):
+        self.client.force_login(self.user)
+        stale = Venue.objects.get(pk=self.venue.pk)
+        self.review(self.venue, 4, 4, 4)
+        resp = self.client.post(f"/update-venue-flutter/{self.venue.pk}/", '{"name": "Baru"}',
+                                content_type="application/json")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(self.aggregates(self.venue)[:4], (1, 4, 4, 4))
+        self.assertEqual(self.venue.name, "Baru")
+
+        resp = self.client.post(f"/venue/{self.venue.pk}/edit", {
+            "CityName": "Bandung", "StreetName": "Jalan A", "leisure": "pitch", "name": "Baru",
+        })
+        self.assertEqual(resp.status_code, 302)
+        stale.save()
+        self.assertEqual(self.aggregates(self.venue)[:4], (1, 4, 4, 4))
+
+    def test_rebuild_keeps_a_review_landing_mid_run(self):
+        self.review(self.venue, 3, 3, 3)
+        Venue.objects.update(review_count=9)
+        total = rebuild_venue_ratings._total
+
+        def review_then_total(value):
+            # lands after the drift was read, before the repair writes
+            if isinstance(value, Count):
+                self.review(self.venue, 5, 5, 5)
+            return total(value)
+
+        with patch.object(rebuild_venue_ratings, "_total", review_then_total):
+            call_command("rebuild_venue_ratings", stdout=StringIO())
+        self.assertEqual(self.aggregates(self.venue)[:4], (2, 8, 8, 8))
+        self.assertEqual(self.venue.rating_avg, 4.0)
@@ -0,0 +1,243 @@
+"""
+Full-text search over feed posts and community posts. Venues have their own
+substring index in main.search; api_search uses it for venue results.
+
+Every indexed object is mirrored into a SearchDocument row (title + body) by
+post_save/post_delete receivers, and that table is full-text indexed:
+- SQLite: an FTS5 table (search_document_fts) with the unicode61 tokenizer,
+  diacritics folded and prefix indexes, kept in sync by triggers;
+- PostgreSQL: a GIN index over a weighted 'simple' tsvector expression.
+Neither side stems, so names such as "Jl. Kebon Jeruk" match as written.
+Every query term is a prefix ("keb jer" finds "Kebon Jeruk"), all terms are
+required, and hits are ranked with title matches weighted above body matches
+(bm25 on SQLite, ts_rank_cd on PostgreSQL).
+"""
+import re
+from collections import namedtuple
+
+from django.apps import apps as global_apps
+from django.db import connection, connections, transaction
+from django.db.models import Q, UUIDField
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+
+from search.models import SearchDocument
+
+# kind -> (model label, function returning the (title, body) to index)
+SOURCES = {
+    "post": ("posts.Post", lambda p: (p.venue_hint, p.content)),
+    "community": ("community.Post", lambda p: (p.headline, p.content)),
+}
+
+TERM_RE = re.compile(r"\w+")
+MAX_TERMS = 8
+
+Hit = namedtuple("Hit", ["kind", "object_id", "title", "body", "rank"])
+
+# the expression the PostgreSQL GIN index is built on; queries must repeat it verbatim
+PG_VECTOR = (
+    "(setweight(to_tsvector('simple'::regconfig, coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('simple'::regconfig, coalesce(body, '')), 'B'))"
+)
+
+
+def _terms(text):
+    return TERM_RE.findall(text or "")[:MAX_TERMS]
+
+
+def _kind_clause(kinds, column):
+    if not kinds:
+        return "", []
+    return f" AND {column} IN ({', '.join(['%s'] * len(kinds))})", list(kinds)
+
+
+def _sqlite_match(terms):
+    return " ".join('"%s"*' % t for t in terms)
+
+
+def _pg_match(terms):
+    return " & ".join(f"{t}:*" for t in terms)
+
+
+def search(text, kinds=None, limit=20):
+    """Ranked hits for ``text``, best first, optionally restricted to some kinds"""
+    terms = _terms(text)
+    if not terms:
+        return []
+
+    if connection.vendor == "sqlite":
+        kind_sql, kind_params = _kind_clause(kinds, "d.kind")
+        sql = (
+            "SELECT d.kind, d.object_id, d.title, d.body, -bm25(search_document_fts, 4.0, 1.0) AS rank "
+            "FROM search_document_fts JOIN search_searchdocument d ON d.id = search_document_fts.rowid "
+            f"WHERE search_document_fts MATCH %s{kind_sql} ORDER BY rank DESC LIMIT %s"
+        )
+        params = [_sqlite_match(terms), *kind_params, limit]
+    elif connection.vendor == "postgresql":
+        kind_sql, kind_params = _kind_clause(kinds, "kind")
+        sql = (
+            f"SELECT kind, object_id, title, body, ts_rank_cd({PG_VECTOR}, query) AS rank "
+            "FROM search_searchdocument, to_tsquery('simple'::regconfig, %s) query "
+            f"WHERE {PG_VECTOR} @@ query{kind_sql} ORDER BY rank DESC LIMIT %s"
+        )
+        params = [_pg_match(terms), *kind_params, limit]
+    else:
+        return _search_unindexed(terms, kinds, limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [Hit(*row) for row in cursor.fetchall()]
+
+
+def _search_unindexed(terms, kinds, limit):
+    # other backends: substring matching, unranked
+    qs = SearchDocument.objects.all()
+    if kinds:
+        qs = qs.filter(kind__in=kinds)
+    for term in terms:
+        qs = qs.filter(Q(title__icontains=term) | Q(body__icontains=term))
+    return [Hit(d.kind, d.object_id, d.title, d.body, 0.0) for d in qs[:limit]]
+
+
+def _object_id_column(model):
+    """d.object_id (str(pk)) in the form of ``model``'s pk column, to compare the two in SQL"""
+    pk = model._meta.pk
+    if connection.vendor == "postgresql":
+        return f"CAST(d.object_id AS {pk.cast_db_type(connection)})"
+    if connection.vendor == "sqlite" and isinstance(pk, UUIDField):
+        return "REPLACE(d.object_id, '-', '')"  # stored as 32 hex digits
+    return "d.object_id"
+
+
+def filter_queryset(queryset, text):
+    """
+    Narrow ``queryset`` (of an indexed model) to the objects matching
+    ``text``. The match is a subquery, so every match is kept and the
+    caller's own ordering and keyset pagination run over all of them.
+    """
+    terms = _terms(text)
+    if not terms:
+        return queryset
+    kind = kind_for(queryset.model)
+    if connection.vendor == "sqlite":
+        match, param = (
+            "d.id IN (SELECT rowid FROM search_document_fts WHERE search_document_fts MATCH %s)",
+            _sqlite_match(terms),
+        )
+    elif connection.vendor == "postgresql":
+        match, param = f"{PG_VECTOR} @@ to_tsquery('simple'::regconfig, %s)", _pg_match(terms)
+    else:
+        ids = [h.object_id for h in _search_unindexed(terms, [kind], None)]
+        return queryset.filter(pk__in=ids)
+    return queryset.filter(pk__in=RawSQL(
+        f"SELECT {_object_id_column(queryset.model)} FROM search_searchdocument d "
+        f"WHERE d.kind = %s AND {match}",
+        [kind, param],
+    ))
+
+
+def kind_for(model):
+    label = model._meta.label
+    for kind, (source, _) in SOURCES.items():
+        if source == label:
+            return kind
+    return None
+
+
+def _document(model, kind, obj):
+    title, body = SOURCES[kind][1](obj)
+    return model(kind=kind, object_id=str(obj.pk), title=(title or "")[:255], body=body or "")
+
+
+def index_objects(kind, objects, using="default", document_model=SearchDocument, upsert=True):
+    """Insert or refresh the documents of ``objects``; one upsert (or plain insert) per call"""
+    docs = [_document(document_model, kind, obj) for obj in objects]
+    if docs:
+        options = {}
+        if upsert:
+            options = {"update_conflicts": True, "unique_fields": ["kind", "object_id"],
+                       "update_fields": ["title", "body"]}
+        document_model.objects.using(using).bulk_create(docs, **options)
+
+
+def unindex_object(kind, pk):
+    SearchDocument.objects.filter(kind=kind, object_id=str(pk)).delete()
+
+
+def rebuild(apps=global_apps, using="default", batch_size=500, upsert=True):
+    """
+    Re-index every source object from scratch; returns {kind: documents
+    written}. ``upsert=False`` writes plain inserts, for a table no one else
+    writes to yet.
+    """
+    document_model = apps.get_model("search", "SearchDocument")
+    counts = {}
+    with transaction.atomic(using=using):
+        document_model.objects.using(using).all().delete()
+        for kind, (label, _) in SOURCES.items():
+            batch, counts[kind] = [], 0
+            for obj in apps.get_model(label).objects.using(using).iterator(chunk_size=batch_size):
+                batch.append(obj)
+                if len(batch) == batch_size:
+                    index_objects(kind, batch, using, document_model, upsert)
+                    counts[kind] += len(batch)
+                    batch = []
+            index_objects(kind, batch, using, document_model, upsert)
+            counts[kind] += len(batch)
+    return counts
+
+
+def _on_save(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_objects(kind_for(sender), [instance])
+
+
+def _on_delete(sender, instance, **kwargs):
+    unindex_object(kind_for(sender), instance.pk)
+
+
+def connect_signals():
+    for kind, (label, _) in SOURCES.items():
+        model = global_apps.get_model(label)
+        post_save.connect(_on_save, sender=model, dispatch_uid=f"search-index-{kind}")
+        post_delete.connect(_on_delete, sender=model, dispatch_uid=f"search-unindex-{kind}")
+
+
+SQLITE_INDEX = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS search_document_fts USING fts5("
+    "title, body, content='search_searchdocument', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    "CREATE TRIGGER IF NOT EXISTS search_document_fts_ai AFTER INSERT ON search_searchdocument BEGIN "
+    "INSERT INTO search_document_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS search_document_fts_ad AFTER DELETE ON search_searchdocument BEGIN "
+    "INSERT INTO search_document_fts(search_document_fts, rowid, title, body) "
+    "VALUES ('delete', old.id, old.title, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS search_document_fts_au AFTER UPDATE ON search_searchdocument BEGIN "
+    "INSERT INTO search_document_fts(search_document_fts, rowid, title, body) "
+    "VALUES ('delete', old.id, old.title, old.body); "
+    "INSERT INTO search_document_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END",
+]
+
+POSTGRES_INDEX = [
+    f"CREATE INDEX IF NOT EXISTS search_document_tsv ON search_searchdocument USING gin ({PG_VECTOR})",
+]
+
+
+def install_search_index(using="default", **kwargs):
+    """post_migrate hook; like main.search, reinstalls the SQLite triggers if a rebuild dropped them"""
+    conn = connections[using]
+    with conn.cursor() as cursor:
+        if SearchDocument._meta.db_table not in conn.introspection.table_names(cursor):
+            return  # migrated back to zero
+        if conn.vendor == "sqlite":
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'search_document_fts_%'"
+            )
+            if cursor.fetchone()[0] == 3:
+                return
+            for statement in SQLITE_INDEX:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO search_document_fts(search_document_fts) VALUES ('rebuild')")
+        elif conn.vendor == "postgresql":
+            for statement in POSTGRES_INDEX:
+                cursor.execute(statement)
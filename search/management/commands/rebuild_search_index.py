@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from search.index import install_search_index, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the full-text search documents for posts and community posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        install_search_index()
+        counts = rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            'Indexed ' + ', '.join(f'{n} {kind}' for kind, n in counts.items()) + '.'
+        ))
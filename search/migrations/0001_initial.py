@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:10
+
+from django.db import migrations, models
+
+
+def index_existing(apps, schema_editor):
+    # the table is new, so plain inserts: the (kind, object_id) unique index
+    # an upsert needs is only created once this migration's operations ran
+    from search.index import rebuild
+    rebuild(apps, using=schema_editor.connection.alias, upsert=False)
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('community', '0001_initial'),
+        ('posts', '0002_post_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=16)),
+                ('object_id', models.CharField(max_length=64)),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('body', models.TextField(blank=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'object_id')},
+            },
+        ),
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+from django.db import models
+
+
+class SearchDocument(models.Model):
+    """
+    One searchable row per indexed object, written by search.index on save and
+    delete. The full-text index itself lives outside the ORM (an FTS5 table on
+    SQLite, a tsvector GIN expression index on PostgreSQL), see search.index.
+    """
+    kind = models.CharField(max_length=16)
+    object_id = models.CharField(max_length=64)
+    title = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = ('kind', 'object_id')
+
+    def __str__(self):
+        return f'{self.kind}:{self.object_id} {self.title[:30]}'
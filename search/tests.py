@@ -0,0 +1,77 @@
+from django.contrib.auth.models import User
+from django.test import TestCase
+from django.urls import reverse
+
+from community.models import Group, Post as CommunityPost
+from main.models import Venue
+from posts.models import Post
+
+from .index import search
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="searcher", password="pw")
+        self.client.force_login(self.user)
+        self.venue = Venue.objects.create(
+            name="Lapangan Kebon Jeruk", StreetName="Jalan Kebon Jeruk Raya", CityName="Jakarta Barat"
+        )
+        self.other_venue = Venue.objects.create(
+            name="GOR Cempaka", StreetName="Jl. Kebon Sirih", CityName="Jakarta Pusat"
+        )
+        self.post = Post.objects.create(author=self.user, content="Sparring di kebon jeruk, ada yang ikut?")
+        self.group = Group.objects.create(name="Futsal Barat", owner=self.user)
+        self.thread = CommunityPost.objects.create(
+            group=self.group, author=self.user, headline="Turnamen Kebon Jeruk", content="Daftar sebelum Jumat"
+        )
+
+    def kinds(self, text, **kwargs):
+        return [(h.kind, h.object_id) for h in search(text, **kwargs)]
+
+    def test_prefix_terms_match_across_kinds(self):
+        hits = self.kinds("keb jer")
+        self.assertCountEqual(hits, [("post", str(self.post.pk)), ("community", str(self.thread.pk))])
+        self.assertEqual(self.kinds("keb jer", kinds=["post"]), [("post", str(self.post.pk))])
+
+    def test_title_matches_rank_above_body_matches(self):
+        hint = Post.objects.create(author=self.user, content="Main sore", venue_hint="Kebon Sirih")
+        self.assertEqual(self.kinds("kebon", kinds=["post"]), [("post", str(hint.pk)), ("post", str(self.post.pk))])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.post.content = "Sparring di Meruya"
+        self.post.save()
+        self.assertEqual(self.kinds("meruya"), [("post", str(self.post.pk))])
+        self.assertNotIn(("post", str(self.post.pk)), self.kinds("jeruk"))
+
+        self.group.delete()
+        self.assertEqual(self.kinds("turnamen"), [])
+
+    def test_feed_and_search_api_use_the_index(self):
+        Post.objects.create(author=self.user, content="Cari lawan main di Senayan")
+        resp = self.client.get(reverse("posts:api_list"), {"q": "sena"})
+        self.assertEqual([p["content"] for p in resp.json()], ["Cari lawan main di Senayan"])
+
+        resp = self.client.get(reverse("search:api_search"), {"q": "turnamen", "type": "community"})
+        [result] = resp.json()["results"]
+        self.assertEqual(result["url"], reverse("community:post_detail", args=[self.group.slug, self.thread.pk]))
+
+    def test_feed_search_pages_through_every_match(self):
+        for i in range(12):
+            Post.objects.create(author=self.user, content=f"Senayan sesi {i}")
+        seen, cursor = [], None
+        while True:
+            resp = self.client.get(reverse("posts:api_feed"), {"q": "senayan", "size": 5, **({"cursor": cursor} if cursor else {})})
+            seen += [p["content"] for p in resp.json()["results"]]
+            cursor = resp.json()["next"]
+            if not cursor:
+                break
+        self.assertEqual(seen, [f"Senayan sesi {i}" for i in reversed(range(12))])
+
+    def test_venues_come_from_the_venue_search(self):
+        resp = self.client.get(reverse("search:api_search"), {"q": "kebon jer"})
+        venues = [r for r in resp.json()["results"] if r["type"] == "venue"]
+        self.assertEqual([r["id"] for r in venues], [str(self.venue.pk)])
+        self.assertEqual(venues[0]["url"], reverse("main:show_venue", args=[self.venue.pk]))
+
+        resp = self.client.get(reverse("search:api_search"), {"q": "kebon", "type": "venue"})
+        self.assertCountEqual([r["title"] for r in resp.json()["results"]], ["Lapangan Kebon Jeruk", "GOR Cempaka"])
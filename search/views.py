@@ -0,0 +1,77 @@
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.urls import reverse
+
+from community.models import Post as CommunityPost
+from main.models import Venue
+from main.search import search_venues
+
+from .index import SOURCES, search
+
+KINDS = [*SOURCES, "venue"]
+
+SNIPPET_LENGTH = 160
+MAX_RESULTS = 50
+
+
+def _links(hits):
+    """URL of every hit; community posts need their group slug, fetched in one query"""
+    community_ids = [int(h.object_id) for h in hits if h.kind == "community"]
+    slugs = dict(
+        CommunityPost.objects.filter(pk__in=community_ids).values_list("pk", "group__slug")
+    ) if community_ids else {}
+
+    links = []
+    for h in hits:
+        if h.kind == "post":
+            links.append(reverse("posts:detail", args=[h.object_id]))
+        else:
+            slug = slugs.get(int(h.object_id))
+            links.append(reverse("community:post_detail", args=[slug, h.object_id]) if slug else None)
+    return links
+
+
+@login_required
+def api_search(request):
+    """
+    Search across feed posts, community posts and venues:
+    ?q=&type=post,community,venue&limit=
+
+    Posts come first, ranked by the full-text index. Venue matches come from
+    the venue list's own search (main.search), best rated first, after
+    them. ``limit`` caps the posts and the venues separately.
+    """
+    q = (request.GET.get("q") or "").strip()
+    kinds = [k for k in (request.GET.get("type") or "").split(",") if k in KINDS] or KINDS
+    try:
+        limit = min(max(int(request.GET.get("limit", 20)), 1), MAX_RESULTS)
+    except ValueError:
+        return JsonResponse({"detail": "Invalid limit"}, status=400)
+
+    post_kinds = [k for k in kinds if k in SOURCES]
+    hits = search(q, kinds=post_kinds, limit=limit) if post_kinds else []
+    results = [
+        {
+            "type": h.kind,
+            "id": h.object_id,
+            "title": h.title,
+            "snippet": h.body[:SNIPPET_LENGTH],
+            "rank": round(h.rank, 4),
+            "url": url,
+        }
+        for h, url in zip(hits, _links(hits))
+    ]
+    if "venue" in kinds and q:
+        venues = search_venues(Venue.objects.all(), q).order_by("-rating_score", "id")[:limit]
+        results += [
+            {
+                "type": "venue",
+                "id": str(v.pk),
+                "title": v.name,
+                "snippet": f"{v.StreetName} {v.CityName}"[:SNIPPET_LENGTH],
+                "rank": None,
+                "url": reverse("main:show_venue", args=[v.pk]),
+            }
+            for v in venues
+        ]
+    return JsonResponse({"q": q, "results": results})
@@ -0,0 +1,198 @@
+"""
+Two-tier cache for read-mostly data.
+
+Tier 1 is an in-process LRU with a short TTL, bounded by the bytes it holds
+(TIERED_CACHE_LOCAL_MAX_BYTES); tier 2 is the shared Django cache
+(CACHES["default"]: Redis in production, local memory in development and
+tests). Values live under namespaces whose version number is
+kept in the shared tier: invalidating a namespace just increments its
+version and the old entries age out of both tiers on their own. The process
+that invalidates sees the new version at once; other processes hold their
+local copy of a version (and values) for at most the local TTL. Model
+receivers registered with invalidate_on() do the bump on post_save and
+post_delete.
+
+Hit and miss counts per tier are kept process-wide (stats()) and per thread
+(thread_stats()) so request instrumentation can report what one request did.
+"""
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+_MISSING = object()
+COUNTERS = ("local_hits", "local_misses", "shared_hits", "shared_misses")
+# namespace versions held locally; there are only a handful of namespaces
+MAX_NAMESPACES = 64
+
+
+def value_size(value):
+    """Approximate size in bytes of a cached value"""
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+
+class LocalLRU:
+    """
+    Thread-safe LRU whose entries are kept for ``timeout`` seconds and add up
+    to at most ``max_size``, each entry weighing ``size(value)`` (1 by
+    default: a plain entry count). An entry heavier than the whole budget is
+    not kept.
+    """
+
+    def __init__(self, max_size, timeout, size=lambda value: 1):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.size = size
+        self._data = OrderedDict()
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def _drop(self, key):
+        _, _, weight = self._data.pop(key)
+        self._total -= weight
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            expires, value, _ = entry
+            if expires <= time.monotonic():
+                self._drop(key)
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        weight = self.size(value)
+        with self._lock:
+            if key in self._data:
+                self._drop(key)
+            if weight > self.max_size:
+                return
+            self._data[key] = (time.monotonic() + self.timeout, value, weight)
+            self._total += weight
+            while self._total > self.max_size:
+                self._drop(next(iter(self._data)))
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._total = 0
+
+
+class TieredCache:
+    def __init__(self, alias="default", local_timeout=5, local_max_bytes=32 * 1024 * 1024, timeout=300):
+        self.alias = alias
+        self.local = LocalLRU(local_max_bytes, local_timeout, size=value_size)
+        self.versions = LocalLRU(MAX_NAMESPACES, local_timeout)
+        self.timeout = timeout
+        self._totals = dict.fromkeys(COUNTERS, 0)
+        self._totals_lock = threading.Lock()
+        self._thread = threading.local()
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def _count(self, counter):
+        with self._totals_lock:
+            self._totals[counter] += 1
+        counts = getattr(self._thread, "counts", None)
+        if counts is None:
+            counts = self._thread.counts = dict.fromkeys(COUNTERS, 0)
+        counts[counter] += 1
+
+    def stats(self):
+        with self._totals_lock:
+            return dict(self._totals)
+
+    def thread_stats(self):
+        return dict(getattr(self._thread, "counts", None) or dict.fromkeys(COUNTERS, 0))
+
+    def _version_key(self, namespace):
+        return f"tiered:ns:{namespace}"
+
+    def version(self, namespace):
+        version = self.versions.get(namespace)
+        if version is None:
+            key = self._version_key(namespace)
+            version = self.shared.get(key)
+            if version is None:
+                self.shared.add(key, 1, timeout=None)
+                version = self.shared.get(key, 1)
+            self.versions.set(namespace, version)
+        return version
+
+    def invalidate(self, *namespaces):
+        for namespace in namespaces:
+            key = self._version_key(namespace)
+            try:
+                version = self.shared.incr(key)
+            except ValueError:
+                # unknown (never read or evicted): any fresh number retires old entries
+                version = int(time.time() * 1000)
+                self.shared.set(key, version, timeout=None)
+            self.versions.set(namespace, version)
+
+    def key(self, namespace, key):
+        return f"tiered:{namespace}:{self.version(namespace)}:{key}"
+
+    def get(self, full_key, default=None):
+        value = self.local.get(full_key, _MISSING)
+        if value is not _MISSING:
+            self._count("local_hits")
+            return value
+        self._count("local_misses")
+        value = self.shared.get(full_key, _MISSING)
+        if value is _MISSING:
+            self._count("shared_misses")
+            return default
+        self._count("shared_hits")
+        self.local.set(full_key, value)
+        return value
+
+    def set(self, full_key, value, timeout=None):
+        self.shared.set(full_key, value, self.timeout if timeout is None else timeout)
+        self.local.set(full_key, value)
+
+    def get_or_set(self, namespace, key, build, timeout=None):
+        """Return the cached value for ``key`` in ``namespace``, calling ``build()`` on a miss"""
+        full_key = self.key(namespace, key)
+        value = self.get(full_key, _MISSING)
+        if value is _MISSING:
+            value = build()
+            self.set(full_key, value, timeout)
+        return value
+
+    def clear(self):
+        """Forget this process's tier-1 values and versions"""
+        self.local.clear()
+        self.versions.clear()
+
+
+tiered = TieredCache(
+    local_timeout=settings.TIERED_CACHE_LOCAL_TIMEOUT,
+    local_max_bytes=settings.TIERED_CACHE_LOCAL_MAX_BYTES,
+    timeout=settings.TIERED_CACHE_TIMEOUT,
+)
+
+
+def invalidate_on(model, *namespaces):
+    """Bump ``namespaces`` whenever an instance of ``model`` is saved or deleted"""
+    def receiver(sender, using=None, **kwargs):
+        # now, so this request reads its own write, and again at commit, so a
+        # page another process built from pre-commit rows is retired too
+        tiered.invalidate(*namespaces)
+        transaction.on_commit(lambda: tiered.invalidate(*namespaces), using=using)
+
+    uid = f"tiered-cache:{model._meta.label}:{','.join(namespaces)}"
+    post_save.connect(receiver, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(receiver, sender=model, weak=False, dispatch_uid=uid)
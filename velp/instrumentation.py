@@ -0,0 +1,151 @@
+"""
+Per-request timing: wall time, database queries, template rendering, response
+size and velp.cache hits for every request.
+
+RequestMetricsMiddleware wraps the request in connection.execute_wrapper to
+count and time queries. TimedDjangoTemplates (the template backend in
+settings.TEMPLATES) times top-level template renders. The totals go out three
+ways:
+- a Server-Timing header, which browser dev tools show next to the request,
+  sent only with DEBUG on or to staff (it tells how the server is doing);
+- one JSON line on the "velp.requests" logger;
+- the same line at WARNING when the request is over REQUEST_QUERY_BUDGET
+  queries or REQUEST_TIME_BUDGET_MS milliseconds.
+
+The bookkeeping is a few perf_counter() calls and additions per query and
+per render, cheap enough to leave on in production.
+"""
+import json
+import logging
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connection
+from django.template.backends.django import DjangoTemplates, Template
+
+from velp.cache import tiered
+
+logger = logging.getLogger("velp.requests")
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class RequestMetrics:
+    __slots__ = ("queries", "db_time", "template_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        metrics = _current.get()
+        if metrics is None:
+            return super().render(context, request)
+        start = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            metrics.template_time += time.perf_counter() - start
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """DjangoTemplates whose templates add their render time to the current request's metrics"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 1)
+
+
+class RequestMetricsMiddleware:
+    """
+    Streamed responses (the venue exports) run most of their queries while
+    the body is being sent, after this middleware has returned. Their
+    Server-Timing header covers the work up to the first byte; the log line
+    is written once the stream ends and covers all of it.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = _current.set(metrics)
+        cache_before = tiered.thread_stats()
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(metrics):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        if settings.DEBUG or getattr(getattr(request, "user", None), "is_staff", False):
+            response["Server-Timing"] = ", ".join([
+                f"app;dur={_ms(time.perf_counter() - start)}",
+                f'db;dur={_ms(metrics.db_time)};desc="{metrics.queries} queries"',
+                f"tpl;dur={_ms(metrics.template_time)}",
+            ])
+        if response.streaming:
+            response.streaming_content = self._stream(
+                response.streaming_content, request, response, metrics, start, cache_before
+            )
+        else:
+            self._log(request, response, metrics, start, cache_before, len(response.content))
+        return response
+
+    def _stream(self, chunks, request, response, metrics, start, cache_before):
+        size = 0
+        try:
+            with connection.execute_wrapper(metrics):
+                for chunk in chunks:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            self._log(request, response, metrics, start, cache_before, size)
+
+    def _log(self, request, response, metrics, start, cache_before, size):
+        elapsed = time.perf_counter() - start
+        cache_after = tiered.thread_stats()
+        match = request.resolver_match
+        record = {
+            "method": request.method,
+            "path": request.path,
+            "view": match.view_name if match else None,
+            "status": response.status_code,
+            "ms": _ms(elapsed),
+            "queries": metrics.queries,
+            "db_ms": _ms(metrics.db_time),
+            "template_ms": _ms(metrics.template_time),
+            "bytes": size,
+            "cache": {k: cache_after[k] - cache_before[k] for k in cache_after},
+        }
+
+        over = []
+        if metrics.queries > settings.REQUEST_QUERY_BUDGET:
+            over.append("queries")
+        if record["ms"] > settings.REQUEST_TIME_BUDGET_MS:
+            over.append("time")
+        if over:
+            record["over_budget"] = over
+            logger.warning(json.dumps(record))
+        else:
+            logger.info(json.dumps(record))
@@ -0,0 +1,121 @@
+"""
+Keyset (cursor) pagination shared by the list endpoints.
+
+Pages are selected with a WHERE on the sort key of the last row seen instead
+of an OFFSET, so every page costs the same index range scan no matter how
+deep the client has scrolled. Cursors are opaque url-safe strings.
+"""
+import base64
+import json
+from collections import namedtuple
+
+from django.core.exceptions import ValidationError
+from django.db import connections
+from django.db.models import F, Q
+
+KeysetPage = namedtuple("KeysetPage", ["items", "next_cursor", "prev_cursor"])
+
+
+def encode_cursor(values, backwards=False):
+    payload = json.dumps({"v": values, "b": backwards}, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Return (values, backwards); raises ValueError on anything malformed."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return list(data["v"]), bool(data.get("b"))
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def _key_field(queryset, name):
+    annotation = queryset.query.annotations.get(name)
+    if annotation is not None:
+        return annotation.output_field
+    meta = queryset.model._meta
+    return meta.pk if name == "pk" else meta.get_field(name)
+
+
+def _to_python(field, value):
+    if value is None:
+        if not field.null:
+            raise ValueError("Invalid cursor")
+        return None
+    try:
+        return field.to_python(value)
+    except (ValidationError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def _equal(field, value):
+    return Q(**{f"{field}__isnull": True}) if value is None else Q(**{field: value})
+
+
+def _strictly_after(name, value, descending, nullable, nulls_largest):
+    # Plain asc()/desc() ordering, so NULLs sit where the backend puts them:
+    # above every value on PostgreSQL, below on SQLite.
+    cmp = f"{name}__lt" if descending else f"{name}__gt"
+    if not nullable:
+        return Q(**{cmp: value})
+    nulls_come_after = nulls_largest != descending
+    if value is None:
+        return None if nulls_come_after else Q(**{f"{name}__isnull": False})
+    step = Q(**{cmp: value})
+    return step | Q(**{f"{name}__isnull": True}) if nulls_come_after else step
+
+
+def _after(keys, values, nullable, nulls_largest):
+    """Rows sorted after ``values`` under ``keys``: OR of (k1..ki-1 equal, ki after)."""
+    condition = Q(pk__in=[])
+    prefix = Q()
+    for (name, descending), value, null in zip(keys, values, nullable):
+        step = _strictly_after(name, value, descending, null, nulls_largest)
+        if step is not None:
+            condition |= prefix & step
+        prefix &= _equal(name, value)
+
+    # the OR alone hides the range from the planner; bound the leading key too
+    (name, descending), value = keys[0], values[0]
+    if not nullable[0]:
+        condition &= Q(**{f"{name}__lte" if descending else f"{name}__gte": value})
+    return condition
+
+
+def keyset_page(queryset, keys, cursor=None, size=20):
+    """
+    Return one KeysetPage of ``queryset``.
+
+    ``keys`` is a sequence of (field, descending) pairs whose last field is
+    unique, e.g. [("name", False), ("id", False)]. The order is the plain
+    ascending/descending one a default (field, id) index serves. Raises
+    ValueError for a cursor that does not decode or does not match ``keys``.
+    """
+    values, backwards = decode_cursor(cursor) if cursor else (None, False)
+    walk = [(field, descending != backwards) for field, descending in keys]
+    fields = [_key_field(queryset, name) for name, _ in keys]
+
+    qs = queryset.order_by(*[F(name).desc() if descending else F(name).asc() for name, descending in walk])
+    if values is not None:
+        if len(values) != len(keys):
+            raise ValueError("Invalid cursor")
+        values = [_to_python(field, value) for field, value in zip(fields, values)]
+        nulls_largest = connections[queryset.db].features.nulls_order_largest
+        qs = qs.filter(_after(walk, values, [field.null for field in fields], nulls_largest))
+
+    items = list(qs[:size + 1])
+    more = len(items) > size
+    items = items[:size]
+    if backwards:
+        items.reverse()
+
+    has_next = values is not None if backwards else more
+    has_prev = more if backwards else values is not None
+
+    def key(obj):
+        return [getattr(obj, field) for field, _ in keys]
+
+    next_cursor = encode_cursor(key(items[-1])) if items and has_next else None
+    prev_cursor = encode_cursor(key(items[0]), backwards=True) if items and has_prev else None
+    return KeysetPage(items, next_cursor, prev_cursor)
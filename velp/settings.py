@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+from django.core.exceptions import ImproperlyConfigured
 from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
@@ -25,6 +26,15 @@ SECRET_KEY = 'django-insecure-n)g&#*a+lhojq-vj!yml+k463wi*if33o8gcah1rt@_)1zo!*z
 
 PRODUCTION = os.getenv('PRODUCTION', 'False').lower() == 'true'
 
+# Cached sessions, users, memberships and revoked tokens have to be seen by
+# every worker process, so production needs the shared cache (see CACHES and
+# "Deployment notes" in README.md). In development without it SHARED_CACHE is
+# False and that data is read from the database.
+REDIS_URL = os.getenv('REDIS_URL')
+SHARED_CACHE = bool(REDIS_URL)
+if PRODUCTION and not SHARED_CACHE:
+    raise ImproperlyConfigured('PRODUCTION needs a shared cache: set REDIS_URL (see README.md).')
+
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = True
 
@@ -38,6 +48,15 @@ CSRF_TRUSTED_ORIGINS = [
 
 LOGIN_URL = '/auth/login/'
 
+# Bayesian venue ranking: every venue starts as if it had
+# VENUE_RATING_PRIOR_WEIGHT reviews averaging VENUE_RATING_PRIOR_MEAN.
+VENUE_RATING_PRIOR_MEAN = 3.0
+VENUE_RATING_PRIOR_WEIGHT = 5
+
+# a reported target is escalated once the weighted severity of its open
+# reports (see reports.models.ReportTarget.REASON_WEIGHTS) reaches this
+REPORT_ESCALATION_SEVERITY = 10
+
 CORS_ALLOW_ALL_ORIGINS = True
 CORS_ALLOW_CREDENTIALS = True
 CSRF_COOKIE_SAMESITE = 'Lax'
@@ -45,6 +64,24 @@ SESSION_COOKIE_SAMESITE = 'Lax'
 CSRF_COOKIE_SECURE = False
 SESSION_COOKIE_SECURE = False
 
+# With a shared cache sessions are read from it and written through to the
+# database, and users are loaded from it too (authentication/backends.py).
+# New logins go through CachedModelBackend; ModelBackend stays listed so
+# sessions created before it keep working (it never checks a password itself,
+# see CachedModelBackend.authenticate).
+SESSION_ENGINE = (
+    'django.contrib.sessions.backends.cached_db' if SHARED_CACHE
+    else 'django.contrib.sessions.backends.db'
+)
+AUTHENTICATION_BACKENDS = [
+    'authentication.backends.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# Lifetimes (seconds) of the Flutter bearer tokens, see authentication/tokens.py
+AUTH_TOKEN_ACCESS_TTL = 15 * 60
+AUTH_TOKEN_REFRESH_TTL = 14 * 24 * 60 * 60
+
 
 # Application definition
 
@@ -64,9 +101,11 @@ INSTALLED_APPS = [
     'main',
     'posts',
     'review', 
+    'search',
 ]
 
 MIDDLEWARE = [
+    'velp.instrumentation.RequestMetricsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -74,6 +113,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     #'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'authentication.middleware.BearerTokenMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -82,7 +122,8 @@ ROOT_URLCONF = 'velp.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates plus render timing for velp.instrumentation
+        'BACKEND': 'velp.instrumentation.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -123,10 +164,72 @@ else:
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            # take the write lock at BEGIN so concurrent bookings queue up
+            # instead of failing with "database is locked"
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'timeout': 20,
+            },
+            # on-disk test database so threaded tests share one database
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
         }
     }
 
 
+# Request instrumentation (velp/instrumentation.py): requests over either
+# budget are logged at WARNING instead of INFO
+REQUEST_QUERY_BUDGET = int(os.getenv('REQUEST_QUERY_BUDGET', 30))
+REQUEST_TIME_BUDGET_MS = int(os.getenv('REQUEST_TIME_BUDGET_MS', 500))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(message)s'},
+    },
+    'handlers': {
+        'requests': {'class': 'logging.StreamHandler', 'formatter': 'message'},
+    },
+    'loggers': {
+        'velp.requests': {
+            'handlers': ['requests'],
+            # one line per request in production; only over-budget ones locally
+            'level': os.getenv('REQUEST_LOG_LEVEL', 'INFO' if PRODUCTION else 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
+
+
+# Cache
+# The shared tier of velp.cache. Redis when REDIS_URL is set (needs the redis
+# package, required in production); otherwise a per-process local-memory
+# stand-in for development and tests.
+if SHARED_CACHE:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'velp',
+            'OPTIONS': {'MAX_ENTRIES': 5000},
+        }
+    }
+
+# velp.cache tiers: seconds a value (or namespace version) stays in the
+# in-process LRU, that LRU's size in bytes, and the default shared-tier timeout
+TIERED_CACHE_LOCAL_TIMEOUT = 5
+TIERED_CACHE_LOCAL_MAX_BYTES = 32 * 1024 * 1024
+TIERED_CACHE_TIMEOUT = 5 * 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -168,6 +271,14 @@ STATICFILES_DIRS = [
 # In production you may collectstatic to STATIC_ROOT
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 
+# Image proxy disk cache (main/image_cache.py)
+IMAGE_CACHE_DIR = Path(os.getenv('IMAGE_CACHE_DIR', BASE_DIR / 'image_cache'))
+IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+IMAGE_CACHE_MAX_AGE = 60 * 60  # seconds before a cached image is revalidated upstream
+IMAGE_PROXY_TIMEOUT = (3.05, 10)  # connect, read
+IMAGE_PROXY_DEADLINE = 15  # seconds for a whole download
+IMAGE_PROXY_MAX_BYTES = 10 * 1024 * 1024
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -25,4 +25,5 @@ urlpatterns = [
     path('review/', include('review.urls')),
     path('posts/', include(('posts.urls', 'posts'), namespace='posts')),
     path('auth/', include(('authentication.urls', 'authentication'), namespace='authentication')),
+    path('search/', include(('search.urls', 'search'), namespace='search')),
 ]